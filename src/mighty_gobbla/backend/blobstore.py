@@ -0,0 +1,122 @@
+import os
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import quote
+
+logger = logging.getLogger("MightyGobbla.Blobs")
+
+# Uploaded receipts, stored once per distinct content under their SHA-256:
+#   ~/.mighty_gobbla_blobs/ab/cd/abcd...ef.jpg
+# The readable name (YYMMDD-Store-Payment.jpg) is only metadata, so naming never has to
+# probe the filesystem for collisions, identical uploads share one file, and the URL of a
+# receipt (/uploads/<sha256>/<name>) never points at different bytes.
+BLOBS_DIR = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_blobs")
+BLOBS_DB = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_blobs.db")
+# Uploads are written here first; same filesystem as the store, so moving them in is a rename
+INCOMING_DIR = os.path.join(BLOBS_DIR, "incoming")
+
+_lock = threading.Lock()
+_conn = None
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(BLOBS_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        # Every name a blob was gobbled under (the same receipt can be uploaded twice)
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS names (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT NOT NULL,
+                name TEXT NOT NULL,
+                original TEXT,
+                created_at TEXT NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_names_sha256 ON names(sha256)")
+        _conn.commit()
+    return _conn
+
+def blob_path(sha256, ext):
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+def incoming_path(filename):
+    """A unique scratch path for a file on its way into the store."""
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    return os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+def is_blob(path):
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(path)))) == os.path.abspath(BLOBS_DIR)
+
+def blob_hash(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def put(src_path, sha256=None):
+    """
+    Moves src_path into the store and returns its blob path. If those bytes are
+    stored already, src_path is just deleted.
+    """
+    if sha256 is None:
+        hasher = hashlib.sha256()
+        with open(src_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+
+    ext = os.path.splitext(src_path)[1].lower()
+    dest = blob_path(sha256, ext)
+    if os.path.exists(dest):
+        os.remove(src_path)
+        logger.info(f"Already stored {sha256[:12]}, dropped the duplicate")
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(src_path, dest)
+
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR IGNORE INTO blobs (sha256, ext, size, created_at) VALUES (?, ?, ?, ?)",
+            (sha256, ext, os.path.getsize(dest), datetime.now().isoformat())
+        )
+        conn.commit()
+    return dest
+
+def add_name(path, base_name, original=None):
+    """Records the readable name a blob was gobbled under. Returns the name (with extension)."""
+    name = f"{base_name}{os.path.splitext(path)[1]}"
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT INTO names (sha256, name, original, created_at) VALUES (?, ?, ?, ?)",
+            (blob_hash(path), name, original, datetime.now().isoformat())
+        )
+        conn.commit()
+    return name
+
+def find(sha256):
+    """The blob path for a hash, or None if it isn't stored."""
+    with _lock:
+        row = _get_conn().execute("SELECT ext FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    if row is None:
+        return None
+    path = blob_path(sha256, row["ext"])
+    return path if os.path.exists(path) else None
+
+def url_path(path, name):
+    """Site-relative URL of a blob; the name is only there for people (and downloads)."""
+    return f"/uploads/{blob_hash(path)}/{quote(name)}"
@@ -0,0 +1,124 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from settings import get_setting
+import metrics
+
+logger = logging.getLogger("MightyGobbla.Executor")
+
+# Gemini calls, Notion requests, renames and history writes all run here,
+# never on the event loop
+DEFAULT_BLOCKING_WORKERS = 8
+# Pages of a split PDF are extracted on their own pool: the file's task already holds
+# a blocking worker while it waits for them, so sharing that pool could deadlock
+DEFAULT_PDF_PAGE_WORKERS = 4
+
+class MeteredExecutor:
+    """ThreadPoolExecutor that keeps queue/active counts and queue wait times."""
+
+    def __init__(self, max_workers, name):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            self._submitted += 1
+
+        def run():
+            waited = time.perf_counter() - enqueued_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        future = self._pool.submit(run)
+        # A task cancelled before it started never runs, so undo its queue count here
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self):
+        with self._lock:
+            started = self._completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "saturation": round(self._active / self.max_workers, 3),
+                "avg_queue_wait_ms": round(self._wait_total / started * 1000, 1) if started else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000, 1)
+            }
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """The shared pool for blocking work, sized by the blocking_workers setting."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(get_setting("blocking_workers", DEFAULT_BLOCKING_WORKERS))
+            _executor = MeteredExecutor(workers, "gobbla-worker")
+            logger.info(f"Started blocking worker pool with {workers} workers")
+        return _executor
+
+_page_executor = None
+
+def get_page_executor():
+    """The pool for per-page PDF extraction, sized by the pdf_page_workers setting."""
+    global _page_executor
+    with _executor_lock:
+        if _page_executor is None:
+            workers = int(get_setting("pdf_page_workers", DEFAULT_PDF_PAGE_WORKERS))
+            _page_executor = MeteredExecutor(workers, "gobbla-page")
+            logger.info(f"Started PDF page pool with {workers} workers")
+        return _page_executor
+
+def _collect_pool_metrics():
+    """Active/queued counts of the pools for /metrics."""
+    pools = [("blocking", _executor), ("pdf_page", _page_executor)]
+    stats = [(name, pool.stats()) for name, pool in pools if pool is not None]
+    return [
+        ("gobbla_executor_active_tasks", "gauge", "Tasks running on each worker pool.",
+         [({"pool": name}, s["active"]) for name, s in stats]),
+        ("gobbla_executor_queued_tasks", "gauge", "Tasks waiting for a worker in each pool.",
+         [({"pool": name}, s["queued"]) for name, s in stats]),
+        ("gobbla_executor_max_workers", "gauge", "Size of each worker pool.",
+         [({"pool": name}, s["max_workers"]) for name, s in stats])
+    ]
+
+metrics.register_collector(_collect_pool_metrics)
+
+async def run_blocking(fn, *args, **kwargs):
+    """Awaitable fn(*args, **kwargs) on the blocking pool."""
+    return await asyncio.wrap_future(get_executor().submit(fn, *args, **kwargs))
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from settings import get_setting
+
+logger = logging.getLogger("MightyGobbla.Cache")
+
+# Lives next to the history/settings files so it survives restarts and redeploys
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_extraction_cache.db")
+
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE_DAYS = 180
+
+# Only the extracted receipt fields are cached, never debug info
+CACHED_FIELDS = ("date", "store", "payment", "amount")
+
+_lock = threading.Lock()
+_conn = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions(last_used_at)")
+        _conn.commit()
+    return _conn
+
+def make_key(content_hash, prompt_version):
+    return f"{prompt_version}:{content_hash}"
+
+def get_cached(content_hash, prompt_version):
+    """Returns the cached fields for this file/prompt, or None on a miss."""
+    key = make_key(content_hash, prompt_version)
+    max_age = float(get_setting("extraction_cache_max_age_days", DEFAULT_MAX_AGE_DAYS)) * 86400
+    now = time.time()
+    try:
+        with _lock:
+            conn = _get_conn()
+            row = conn.execute(
+                "SELECT data, created_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > max_age:
+                _stats["misses"] += 1
+                return None
+
+            conn.execute("UPDATE extractions SET last_used_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            _stats["hits"] += 1
+            return json.loads(row[0])
+    except Exception as e:
+        # A broken cache must never stop a gobble
+        logger.warning(f"Cache lookup failed: {e}")
+        return None
+
+def store(content_hash, prompt_version, data):
+    """Caches the receipt fields from a successful extraction, then evicts."""
+    key = make_key(content_hash, prompt_version)
+    payload = json.dumps({field: data[field] for field in CACHED_FIELDS if field in data})
+    now = time.time()
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, data, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            _stats["stores"] += 1
+            _evict(conn, now)
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Cache store failed: {e}")
+
+def _evict(conn, now):
+    """Drops expired entries, then least recently used ones above the size cap. Caller holds _lock."""
+    max_age = float(get_setting("extraction_cache_max_age_days", DEFAULT_MAX_AGE_DAYS)) * 86400
+    max_entries = int(get_setting("extraction_cache_max_entries", DEFAULT_MAX_ENTRIES))
+
+    evicted = conn.execute("DELETE FROM extractions WHERE created_at < ?", (now - max_age,)).rowcount
+
+    count = conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+    if count > max_entries:
+        evicted += conn.execute("""
+            DELETE FROM extractions WHERE key IN (
+                SELECT key FROM extractions ORDER BY last_used_at ASC LIMIT ?
+            )
+        """, (count - max_entries,)).rowcount
+
+    _stats["evictions"] += evicted
+
+def get_stats():
+    """Hit/miss counters since startup plus the current cache size."""
+    with _lock:
+        stats = dict(_stats)
+        try:
+            stats["entries"] = _get_conn().execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        except Exception:
+            stats["entries"] = None
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
+
+def clear():
+    with _lock:
+        _get_conn().execute("DELETE FROM extractions")
+        _get_conn().commit()
@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+import metrics
+
+# Hit rates and latencies for each way a receipt can get extracted:
+#   cache        - extraction cache lookups (hit = answer reused)
+#   local        - local OCR attempts (hit = confident enough to skip Gemini)
+#   gemini       - single-file Gemini extractions (hit = a model answered)
+#   gemini_batch - batched Gemini requests (counted per receipt; hit = usable answer)
+TIERS = ("cache", "local", "gemini", "gemini_batch")
+
+# Name of each tier in the /metrics stage histogram
+STAGE_NAMES = {"cache": "cache_lookup", "local": "local_ocr", "gemini": "gemini", "gemini_batch": "gemini_batch"}
+
+# Latency percentiles are over the most recent calls only
+WINDOW = 1000
+
+_lock = threading.Lock()
+_stats = {}
+
+def _empty():
+    return {"attempts": 0, "hits": 0, "max_seconds": 0.0, "recent": deque(maxlen=WINDOW)}
+
+def record(tier, hits, seconds, attempts=1):
+    """One call to a tier that took `seconds` and settled `hits` of `attempts` receipts."""
+    metrics.observe_stage(STAGE_NAMES.get(tier, tier), seconds)
+    with _lock:
+        stats = _stats.setdefault(tier, _empty())
+        stats["attempts"] += attempts
+        stats["hits"] += int(hits)
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["recent"].append(seconds)
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _collect_tier_metrics():
+    """Attempts/hits per tier for /metrics (counters since startup)."""
+    with _lock:
+        totals = {tier: (stats["attempts"], stats["hits"]) for tier, stats in _stats.items()}
+    return [
+        ("gobbla_extraction_attempts_total", "counter", "Receipts each extraction tier was tried on.",
+         [({"tier": tier}, attempts) for tier, (attempts, hits) in sorted(totals.items())]),
+        ("gobbla_extraction_hits_total", "counter", "Receipts each extraction tier settled.",
+         [({"tier": tier}, hits) for tier, (attempts, hits) in sorted(totals.items())])
+    ]
+
+metrics.register_collector(_collect_tier_metrics)
+
+def get_stats():
+    with _lock:
+        snapshot = {tier: dict(stats, recent=list(stats["recent"])) for tier, stats in _stats.items()}
+
+    settled = sum(stats["hits"] for stats in snapshot.values())
+    tiers = {}
+    for tier in TIERS:
+        stats = snapshot.get(tier) or _empty()
+        calls = len(stats["recent"]) or 1
+        tiers[tier] = {
+            "attempts": stats["attempts"],
+            "hits": stats["hits"],
+            "hit_rate": round(stats["hits"] / stats["attempts"], 3) if stats["attempts"] else 0.0,
+            # Share of all extracted receipts this tier produced
+            "share": round(stats["hits"] / settled, 3) if settled else 0.0,
+            "avg_ms": round(sum(stats["recent"]) / calls * 1000, 1),
+            "p50_ms": round(_percentile(stats["recent"], 0.5) * 1000, 1),
+            "p95_ms": round(_percentile(stats["recent"], 0.95) * 1000, 1),
+            "max_ms": round(stats["max_seconds"] * 1000, 1)
+        }
+    return {"receipts_extracted": settled, "tiers": tiers}
@@ -0,0 +1,191 @@
+import re
+import time
+import random
+import logging
+import threading
+from settings import get_setting
+import metrics
+
+logger = logging.getLogger("MightyGobbla.Limiter")
+
+# Every Gemini call (single, batch, field follow-ups, from uploads, folders and the watcher
+# alike) goes through one process-wide limiter, so parallel runs share the quota instead of
+# bursting past it and turning the overflow into failures.
+
+# Calls in flight at once
+DEFAULT_MAX_CONCURRENT = 4
+# Gemini free tier for the Flash models; raise it on a paid key. 0 means no rate limit.
+DEFAULT_REQUESTS_PER_MINUTE = 15
+# Times a call that got a 429 is tried again (after the backoff) before it counts as failed
+DEFAULT_RATE_LIMIT_RETRIES = 3
+# Backoff after a 429 that didn't say how long to wait
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 60
+
+RATE_LIMITED = metrics.Counter("gobbla_gemini_rate_limited_total", "Gemini calls answered with 429 (quota exceeded).")
+
+_RETRY_IN = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+def is_rate_limited(error):
+    """True for Gemini's quota errors (google.api_core ResourceExhausted, or anything reporting a 429)."""
+    if getattr(error, "code", None) == 429:
+        return True
+    text = str(error)
+    return text.startswith("429") or "ResourceExhausted" in type(error).__name__ or "RESOURCE_EXHAUSTED" in text
+
+def retry_after_seconds(error):
+    """The wait the API asked for, from RetryInfo details or the message. None if it didn't say."""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+    for pattern in (_RETRY_IN, _RETRY_DELAY):
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+class GeminiLimiter:
+    """
+    Concurrency cap plus a requests-per-minute token bucket. The bucket holds at most
+    max_concurrent tokens, so after an idle spell only a small burst goes out and then
+    calls are spaced evenly at the quota rate. A 429 empties the bucket and pauses every
+    caller until the API's retry hint (or a backoff) has passed.
+    """
+
+    def __init__(self, max_concurrent, requests_per_minute, rate_limit_retries=DEFAULT_RATE_LIMIT_RETRIES):
+        self.max_concurrent = max(1, max_concurrent)
+        self.requests_per_minute = max(0.0, requests_per_minute)
+        self.rate_limit_retries = rate_limit_retries
+        self._cond = threading.Condition()
+        self._capacity = float(self.max_concurrent)
+        self._tokens = self._capacity
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_429 = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._calls = 0
+        self._rate_limited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _refill(self, now):
+        """Caller holds _cond."""
+        if self.requests_per_minute:
+            self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) * self.requests_per_minute / 60.0)
+        self._refilled_at = now
+
+    def _delay(self, now):
+        """Caller holds _cond. Seconds until a call may start, 0 if now, None if waiting on a slot."""
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self._in_flight >= self.max_concurrent:
+            return None
+        if self.requests_per_minute and self._tokens < 1:
+            return (1 - self._tokens) * 60.0 / self.requests_per_minute
+        return 0
+
+    def acquire(self):
+        """Blocks until a call may start. Returns the seconds spent waiting."""
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._delay(now)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+                if self.requests_per_minute:
+                    self._tokens -= 1
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+            waited = time.perf_counter() - start
+            self._calls += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return waited
+
+    def release(self, error=None):
+        """Frees the slot; error is what the call raised, if anything (429s pause everyone)."""
+        with self._cond:
+            self._in_flight -= 1
+            if error is not None and is_rate_limited(error):
+                self._consecutive_429 += 1
+                self._rate_limited += 1
+                hint = retry_after_seconds(error)
+                delay = hint if hint is not None else min(
+                    MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (self._consecutive_429 - 1)) * random.uniform(0.75, 1.25)
+                # Quota is shared: nobody goes until it has passed, and then only at the steady rate
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._tokens = 0.0
+                RATE_LIMITED.inc()
+                logger.warning(f"Gemini rate limited, pausing calls for {delay:.1f}s")
+            elif error is None:
+                self._consecutive_429 = 0
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) under the limits. A 429 is waited out and tried again, up to
+        rate_limit_retries times, before it's raised like any other error.
+        """
+        for attempt in range(self.rate_limit_retries + 1):
+            metrics.observe_stage("gemini_queue", self.acquire())
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.release(e)
+                if not is_rate_limited(e) or attempt == self.rate_limit_retries:
+                    raise
+                continue
+            self.release()
+            return result
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "requests_per_minute": self.requests_per_minute,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "calls": self._calls,
+                "rate_limited": self._rate_limited,
+                "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+                "avg_queue_wait_ms": round(self._wait_total / self._calls * 1000, 1) if self._calls else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000, 1)
+            }
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """The shared limiter, sized by the gemini_max_concurrent and gemini_requests_per_minute settings."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = GeminiLimiter(
+                int(get_setting("gemini_max_concurrent", DEFAULT_MAX_CONCURRENT)),
+                float(get_setting("gemini_requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE)),
+                int(get_setting("gemini_rate_limit_retries", DEFAULT_RATE_LIMIT_RETRIES))
+            )
+            logger.info(f"Gemini limiter: {_limiter.max_concurrent} in flight, "
+                        f"{_limiter.requests_per_minute or 'unlimited'} requests/min")
+        return _limiter
+
+def _collect_limiter_metrics():
+    if _limiter is None:
+        return []
+    s = _limiter.stats()
+    return [
+        ("gobbla_gemini_in_flight", "gauge", "Gemini calls running right now.", [({}, s["in_flight"])]),
+        ("gobbla_gemini_waiting", "gauge", "Gemini calls waiting for the limiter.", [({}, s["waiting"])]),
+        ("gobbla_gemini_paused_seconds", "gauge", "Seconds left of a 429 pause.", [({}, s["paused_for_seconds"])])
+    ]
+
+metrics.register_collector(_collect_limiter_metrics)
@@ -1,65 +1,207 @@
 import json
 import os
-from datetime import datetime
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from settings import get_setting
+import metrics
+
+logger = logging.getLogger("MightyGobbla.History")
 
 # Save history in the user's home directory to ensure persistence across sessions/locations
-HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_history.json")
+HISTORY_DB = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_history.db")
+# Pre-SQLite history, imported once on first start
+LEGACY_HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_history.json")
+
+SCHEMA_VERSION = 2
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# One shared connection; background workers write concurrently so access is serialized
+_lock = threading.Lock()
+_conn = None
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(HISTORY_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _migrate(_conn)
+    return _conn
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                details TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)")
+        _import_legacy_json(conn)
 
-def load_history():
-    if not os.path.exists(HISTORY_FILE):
-        return []
+    if version < 2:
+        # Receipt fields as real columns so filters hit an index instead of parsing JSON
+        conn.execute("ALTER TABLE history ADD COLUMN store TEXT COLLATE NOCASE")
+        conn.execute("ALTER TABLE history ADD COLUMN receipt_date TEXT")
+        conn.execute("ALTER TABLE history ADD COLUMN amount REAL")
+        conn.execute("ALTER TABLE history ADD COLUMN payment TEXT COLLATE NOCASE")
+        for row in conn.execute("SELECT id, details FROM history").fetchall():
+            conn.execute(
+                "UPDATE history SET store = ?, receipt_date = ?, amount = ?, payment = ? WHERE id = ?",
+                _indexed_values(json.loads(row["details"])) + (row["id"],)
+            )
+        # Every index ends in id so keyset pagination (id < cursor) stays on the index
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_store ON history(store, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_receipt_date ON history(receipt_date, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_amount ON history(amount, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_payment ON history(payment, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_directory ON history(directory COLLATE NOCASE, id)")
+
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+
+def _indexed_values(details):
+    """(store, receipt_date, amount, payment) for the indexed columns."""
+    raw_date = str(details.get("date") or "")
+    # YYMMDD -> YYYY-MM-DD so ranges compare correctly as text
+    receipt_date = f"20{raw_date[0:2]}-{raw_date[2:4]}-{raw_date[4:6]}" if len(raw_date) == 6 and raw_date.isdigit() else None
+    try:
+        amount = float(details.get("amount"))
+    except (TypeError, ValueError):
+        amount = None
+    return (details.get("store"), receipt_date, amount, details.get("payment"))
+
+def _import_legacy_json(conn):
+    """One-time import of ~/.mighty_gobbla_history.json, keeping the old ids."""
+    if not os.path.exists(LEGACY_HISTORY_FILE):
+        return
     try:
-        with open(HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+        with open(LEGACY_HISTORY_FILE, 'r') as f:
+            legacy = json.load(f)
+    except Exception as e:
+        logger.error(f"Could not read legacy history, skipping import: {e}")
+        return
 
-def save_history(history):
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
+    # Oldest first so AUTOINCREMENT continues after the highest imported id
+    for item in sorted(legacy, key=lambda h: h.get("id", 0)):
+        conn.execute(
+            "INSERT OR IGNORE INTO history (id, timestamp, filename, directory, details) VALUES (?, ?, ?, ?, ?)",
+            (item.get("id"), item.get("timestamp") or datetime.now().isoformat(),
+             item.get("filename") or "", item.get("directory") or "Upload",
+             json.dumps(item.get("details") or {}))
+        )
+    os.replace(LEGACY_HISTORY_FILE, LEGACY_HISTORY_FILE + ".migrated")
+    logger.info(f"Imported {len(legacy)} history entries from {LEGACY_HISTORY_FILE}")
 
-def add_history_entry(filename, details, directory=None):
-    history = load_history()
-    
-    # Generate ID based on max existing ID + 1 to avoid collisions after deletion
-    max_id = 0
-    if history:
-        max_id = max(item.get("id", 0) for item in history)
-    
-    entry = {
-        "id": max_id + 1,
-        "timestamp": datetime.now().isoformat(),
-        "filename": filename,
-        "directory": directory or "Upload",
-        "details": details
-    }
-    
-    # Add to beginning
-    history.insert(0, entry)
-    
-    # Keep last 200
-    if len(history) > 200:
-        history = history[:200]
-        
-    save_history(history)
-
-def get_history(page=1, limit=10):
-    history = load_history()
-    start = (page - 1) * limit
-    end = start + limit
-    
+def _row_to_entry(row):
     return {
-        "total": len(history),
-        "page": page,
-        "limit": limit,
-        "items": history[start:end]
+        "id": row["id"],
+        "timestamp": row["timestamp"],
+        "filename": row["filename"],
+        "directory": row["directory"],
+        "details": json.loads(row["details"])
     }
 
+def add_history_entry(filename, details, directory=None):
+    retention_days = get_setting("history_retention_days")
+    with metrics.stage("history_write"), _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT INTO history (timestamp, filename, directory, details, store, receipt_date, amount, payment) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(), filename, directory or "Upload", json.dumps(details))
+            + _indexed_values(details)
+        )
+
+        # Optional retention policy; history is kept forever unless configured
+        if retention_days:
+            cutoff = (datetime.now() - timedelta(days=float(retention_days))).isoformat()
+            conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,))
+
+        conn.commit()
+
+def query_history(store=None, date_from=None, date_to=None, amount_min=None, amount_max=None,
+                  payment=None, directory=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Newest-first history with optional filters and keyset pagination.
+
+    store matches exactly (case-insensitive); payment and directory are case-insensitive
+    prefix matches, so "Card" finds every card. Dates are YYYY-MM-DD (inclusive). Pass the returned next_cursor back as cursor for the next
+    page; next_cursor is None on the last page. Every page costs the same, however deep.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    clauses, params = [], []
+
+    if store:
+        clauses.append("store = ?")
+        params.append(store)
+    if payment:
+        clauses.append("payment LIKE ? ESCAPE '\\'")
+        params.append(_prefix_pattern(payment))
+    if directory:
+        clauses.append("directory LIKE ? ESCAPE '\\'")
+        params.append(_prefix_pattern(directory))
+    if date_from:
+        clauses.append("receipt_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("receipt_date <= ?")
+        params.append(date_to)
+    if amount_min is not None:
+        clauses.append("amount >= ?")
+        params.append(amount_min)
+    if amount_max is not None:
+        clauses.append("amount <= ?")
+        params.append(amount_max)
+    if cursor is not None:
+        clauses.append("id < ?")
+        params.append(cursor)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # Fetch one extra row to know whether there's another page
+    sql = f"SELECT * FROM history {where} ORDER BY id DESC LIMIT ?"
+
+    with _lock:
+        rows = _get_conn().execute(sql, params + [limit + 1]).fetchall()
+
+    items = [_row_to_entry(row) for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+def _prefix_pattern(value):
+    """LIKE pattern for a literal prefix."""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+def get_known_stores(limit=500):
+    """Store names already in history, most frequent first."""
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT store, COUNT(*) AS uses FROM history "
+            "WHERE store IS NOT NULL AND store NOT IN ('Unknown', 'Error', 'FileError') "
+            "GROUP BY store ORDER BY uses DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    return [row["store"] for row in rows]
+
 def delete_entry(entry_id):
-    history = load_history()
-    # Filter out entry with matching ID
-    new_history = [h for h in history if h.get("id") != entry_id]
-    save_history(new_history)
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM history WHERE id = ?", (entry_id,))
+        conn.commit()
 
 def clear_history():
-    save_history([])
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM history")
+        conn.commit()
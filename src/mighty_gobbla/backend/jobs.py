@@ -0,0 +1,69 @@
+import time
+import uuid
+import logging
+import threading
+from executor import get_executor
+
+logger = logging.getLogger("MightyGobbla.Jobs")
+
+# Finished jobs are kept this long so phones can come back and poll them
+JOB_TTL_SECONDS = 60 * 60
+
+_jobs = {}
+_lock = threading.Lock()
+
+def _prune_finished():
+    """Drop finished jobs older than the TTL. Caller holds _lock."""
+    cutoff = time.time() - JOB_TTL_SECONDS
+    expired = [job_id for job_id, job in _jobs.items()
+               if job["finished_at"] and job["finished_at"] < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def _run_job(job_id, func, args, kwargs):
+    with _lock:
+        job = _jobs[job_id]
+        job["status"] = "running"
+        job["started_at"] = time.time()
+
+    try:
+        result = func(*args, **kwargs)
+        status = "error" if result.get("status") == "error" else "done"
+    except Exception as e:
+        logger.error(f"Job {job_id} crashed: {e}")
+        result = {"original": job["original"], "status": "error", "message": str(e)}
+        status = "error"
+
+    with _lock:
+        job["status"] = status
+        job["result"] = result
+        job["finished_at"] = time.time()
+
+def submit_job(label, func, *args, **kwargs):
+    """
+    Queues func(*args, **kwargs) on the shared blocking pool.
+    label is the user-facing file name the job is reported under.
+    func must return a result dict (see pipeline.gobble_file).
+    Returns the new job id.
+    """
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _prune_finished()
+        _jobs[job_id] = {
+            "id": job_id,
+            "original": label,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None
+        }
+
+    get_executor().submit(_run_job, job_id, func, args, kwargs)
+    return job_id
+
+def get_job(job_id):
+    """Returns a snapshot of the job, or None if unknown/expired."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
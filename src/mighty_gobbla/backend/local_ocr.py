@@ -0,0 +1,302 @@
+import io
+import re
+import time
+import logging
+from datetime import datetime, timedelta
+from PIL import Image, ImageOps
+from preprocess import find_receipt_box, rasterize_pdf
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+logger = logging.getLogger("MightyGobbla.LocalOCR")
+
+# Below this overall confidence (0-1) the receipt goes to Gemini instead
+DEFAULT_MIN_CONFIDENCE = 0.8
+# Tesseract: assume a single column of text of variable sizes (suits receipts)
+TESSERACT_CONFIG = "--psm 4"
+# Tesseract reads best around 300 dpi; small phone crops get scaled up to this height
+MIN_OCR_HEIGHT = 1500
+
+# How much each field counts towards the confidence score
+FIELD_WEIGHTS = {"amount": 0.4, "date": 0.25, "store": 0.2, "payment": 0.15}
+
+# Matched in the header, on top of every store already in history
+KNOWN_STORES = [
+    "Kroger", "Walmart", "Target", "Costco", "Sam's Club", "Shell", "Exxon", "Chevron", "BP",
+    "Speedway", "Marathon", "Circle K", "7-Eleven", "Home Depot", "Lowe's", "Walgreens", "CVS",
+    "Publix", "Aldi", "Meijer", "Safeway", "Whole Foods", "Trader Joe's", "Dollar General",
+    "Best Buy", "Starbucks", "McDonald's", "Amazon"
+]
+KNOWN_STORES_TTL_SECONDS = 300
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+MONTH_PATTERN = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+
+DATE_PATTERNS = [
+    # 11/09/2024, 11-09-24 (US month first, unless the first number can't be a month)
+    (re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})\b"), "mdy"),
+    # 2024-11-09
+    (re.compile(r"\b(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})\b"), "ymd"),
+    # Nov 9, 2024
+    (re.compile(MONTH_PATTERN + r"\s+(\d{1,2}),?\s+(\d{4}|\d{2})\b", re.IGNORECASE), "Mdy"),
+    # 9 Nov 2024
+    (re.compile(r"\b(\d{1,2})\s+" + MONTH_PATTERN + r",?\s+(\d{4}|\d{2})\b", re.IGNORECASE), "dMy"),
+]
+
+# 1,234.56 / 12.34 / 12,34 (OCR often turns the point into a comma)
+AMOUNT_PATTERN = re.compile(r"(?<![\d.,])\$?\s?(\d{1,3}(?:,\d{3})+|\d+)[.,](\d{2})(?![\d%])")
+TOTAL_WORDS = re.compile(r"\b(total|balance|amount due|amount charged|amt due|grand total)\b", re.IGNORECASE)
+NOT_TOTAL_WORDS = re.compile(r"sub\s*-?\s*total|\btax\b|saving|saved|discount|\bitems?\b|you save|points", re.IGNORECASE)
+STRONG_TOTAL_WORDS = re.compile(r"grand total|amount due|balance due|total due|amount charged", re.IGNORECASE)
+TENDER_WORDS = re.compile(r"\b(visa|mastercard|master card|amex|american express|discover|debit|credit|tend|cash|change)\b", re.IGNORECASE)
+
+LAST4_PATTERN = re.compile(
+    r"(?:\*{2,}|x{2,}|#{2,}|ending(?:\s+in)?|acct(?:ount)?\s*(?:#|no\.?|:)?|card\s*(?:#|no\.?|:))[\s*x#:.-]*(\d{4})\b",
+    re.IGNORECASE
+)
+CARD_BRANDS = [
+    (re.compile(r"\bamex\b|american\s+express", re.IGNORECASE), "Amex"),
+    (re.compile(r"\bvisa\b|mastercard|master\s+card|\bmc\b|discover|\bdebit\b|\bcredit\b", re.IGNORECASE), "Card"),
+]
+CASH_PATTERN = re.compile(r"\bcash\b", re.IGNORECASE)
+CHANGE_PATTERN = re.compile(r"\bchange\b", re.IGNORECASE)
+
+# Lines at the top (non-empty) where the store name is looked for
+HEADER_LINES = 5
+# Header lines that are never the store name
+NOT_STORE_WORDS = re.compile(r"welcome|receipt|store\s*#|\btel\b|phone|www\.|\.com|thank|cashier|register", re.IGNORECASE)
+
+_tesseract_missing = False
+_known_stores = None
+_known_stores_at = 0
+
+def is_available():
+    """True if images can be OCR'd (pytesseract and the tesseract binary are installed)."""
+    return pytesseract is not None and not _tesseract_missing
+
+def _ocr_image(image):
+    """Returns (lines, mean word confidence 0-1) for a PIL image."""
+    global _tesseract_missing
+    image = ImageOps.exif_transpose(image).convert("L")
+    box = find_receipt_box(image)
+    if box:
+        image = image.crop(box)
+    if image.height < MIN_OCR_HEIGHT:
+        scale = MIN_OCR_HEIGHT / float(image.height)
+        image = image.resize((int(image.width * scale), MIN_OCR_HEIGHT), Image.LANCZOS)
+    image = ImageOps.autocontrast(image)
+
+    try:
+        words = pytesseract.image_to_data(image, config=TESSERACT_CONFIG, output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractNotFoundError:
+        _tesseract_missing = True
+        logger.warning("tesseract binary not found, local OCR disabled")
+        return [], 0.0
+
+    lines, confidences = {}, []
+    for i, text in enumerate(words["text"]):
+        text = text.strip()
+        conf = float(words["conf"][i])
+        if not text or conf < 0:
+            continue
+        confidences.append(conf)
+        key = (words["block_num"][i], words["par_num"][i], words["line_num"][i])
+        lines.setdefault(key, []).append(text)
+
+    ordered = [" ".join(lines[key]) for key in sorted(lines)]
+    quality = (sum(confidences) / len(confidences) / 100.0) if confidences else 0.0
+    return ordered, quality
+
+def _pdf_text_lines(file_data):
+    """Text layer of a digital (not scanned) PDF, if it has one."""
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(file_data))
+    text = "\n".join((page.extract_text() or "") for page in reader.pages[:2])
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def read_lines(file_data, mime_type):
+    """Returns (lines, quality 0-1), or ([], 0.0) if nothing could be read."""
+    if mime_type == "application/pdf":
+        lines = _pdf_text_lines(file_data)
+        if len(lines) >= 3:
+            # Real text, nothing to misread
+            return lines, 1.0
+        if not is_available():
+            return [], 0.0
+        all_lines, qualities = [], []
+        for page in rasterize_pdf(file_data):
+            page_lines, quality = _ocr_image(page)
+            all_lines.extend(page_lines)
+            qualities.append(quality)
+        return all_lines, (min(qualities) if qualities else 0.0)
+
+    if not is_available():
+        return [], 0.0
+    return _ocr_image(Image.open(io.BytesIO(file_data)))
+
+def _to_date(year, month, day):
+    year = int(year)
+    if year < 100:
+        year += 2000
+    try:
+        date = datetime(year, int(month), int(day))
+    except ValueError:
+        return None
+    # A receipt from the future or from a decade ago is a misread
+    if date > datetime.now() + timedelta(days=1) or date < datetime.now() - timedelta(days=3650):
+        return None
+    return date
+
+def find_date(lines):
+    """Returns (YYMMDD, confidence)."""
+    found = []
+    for line in lines:
+        for pattern, order in DATE_PATTERNS:
+            for match in pattern.finditer(line):
+                a, b, c = match.groups()
+                if order == "mdy":
+                    # 25/12/2024 can only be day first
+                    date = _to_date(c, b, a) if int(a) > 12 else _to_date(c, a, b)
+                elif order == "ymd":
+                    date = _to_date(a, b, c)
+                elif order == "Mdy":
+                    date = _to_date(c, MONTHS.index(a[:3].lower()) + 1, b)
+                else:
+                    date = _to_date(c, MONTHS.index(b[:3].lower()) + 1, a)
+                if date:
+                    found.append(date)
+
+    if not found:
+        return None, 0.0
+    # Several different dates (return-by, expiry...) make the first one less certain
+    confidence = 1.0 if len(set(found)) == 1 else 0.8
+    return found[0].strftime("%y%m%d"), confidence
+
+def _amounts(line):
+    values = []
+    for whole, cents in AMOUNT_PATTERN.findall(line):
+        values.append(float(whole.replace(",", "") + "." + cents))
+    return values
+
+def find_total(lines):
+    """Returns (amount, confidence)."""
+    candidates = [] # (strong, amount)
+    for i, line in enumerate(lines):
+        if not TOTAL_WORDS.search(line) or NOT_TOTAL_WORDS.search(line):
+            continue
+        values = _amounts(line)
+        if not values and i + 1 < len(lines):
+            # Some layouts put the number on the line below the label
+            values = _amounts(lines[i + 1])
+        strong = bool(STRONG_TOTAL_WORDS.search(line))
+        candidates.extend((strong, value) for value in values)
+
+    all_values = [value for line in lines for value in _amounts(line)]
+    if not candidates:
+        if not all_values:
+            return None, 0.0
+        # No total line read; the largest number is a guess
+        return max(all_values), 0.3
+
+    strong = [value for is_strong, value in candidates if is_strong]
+    total = max(strong or [value for _, value in candidates])
+    # A tender line repeating it (VISA 23.45), cash minus change adding up to it, or
+    # nothing bigger on the receipt backs it up
+    tendered = any(total in _amounts(line) for line in lines if TENDER_WORDS.search(line))
+    cash = [value for line in lines if CASH_PATTERN.search(line) for value in _amounts(line)]
+    change = [value for line in lines if CHANGE_PATTERN.search(line) for value in _amounts(line)]
+    made_change = any(round(paid - back, 2) == total for paid in cash for back in change)
+    confidence = 1.0 if tendered or made_change or total >= max(all_values) else 0.7
+    return total, confidence
+
+def find_payment(lines):
+    """Returns (payment, confidence) in the naming convention, e.g. Card-1234, Amex-1002, Cash."""
+    text = "\n".join(lines)
+    brand = next((name for pattern, name in CARD_BRANDS if pattern.search(text)), None)
+    last4 = LAST4_PATTERN.search(text)
+
+    if last4:
+        return f"{brand or 'Card'}-{last4.group(1)}", 1.0
+    if brand:
+        return brand, 0.6
+    if CASH_PATTERN.search(text):
+        return "Cash", 0.9
+    return "Unknown", 0.0
+
+def _known_store_names():
+    global _known_stores, _known_stores_at
+    if _known_stores is None or time.time() - _known_stores_at > KNOWN_STORES_TTL_SECONDS:
+        try:
+            from history import get_known_stores
+            from_history = get_known_stores()
+        except Exception as e:
+            logger.warning(f"Could not load stores from history: {e}")
+            from_history = []
+        names = from_history + [name for name in KNOWN_STORES if name not in from_history]
+        _known_stores = [(name, _store_pattern(name)) for name in names]
+        _known_stores_at = time.time()
+    return _known_stores
+
+def _store_pattern(name):
+    # "Lowe's" matches LOWES and LOWE'S, "7-Eleven" matches 7 ELEVEN
+    words = re.findall(r"[a-z0-9]+", name.lower())
+    return re.compile(r"\b" + r"\W*".join(words) + r"\b", re.IGNORECASE) if words else None
+
+def find_store(lines):
+    """
+    Returns (store, confidence). Only the header counts: further down, "Target" or "BP"
+    is as likely to be an item, a brand or a gift card as the store.
+    """
+    header = [line for line in lines if line.strip()][:HEADER_LINES]
+    text = "\n".join(header)
+    for name, pattern in _known_store_names():
+        if pattern is not None and pattern.search(text):
+            return name, 1.0
+
+    # Otherwise the first wordy line of the header is usually the name
+    for line in header:
+        letters = sum(ch.isalpha() for ch in line)
+        if letters < 3 or letters / float(len(line)) < 0.6 or NOT_STORE_WORDS.search(line):
+            continue
+        words = re.findall(r"[A-Za-z][A-Za-z&']*", line)[:2]
+        if words:
+            return " ".join(word.capitalize() for word in words), 0.5
+    return "Unknown", 0.0
+
+def parse_receipt(lines, quality=1.0):
+    """
+    Pulls date/store/payment/amount out of OCR'd lines.
+    Returns the fields plus "confidence" (0-1): how much each field could be trusted,
+    weighted, times how cleanly the text was read. No total or no date means 0.
+    """
+    amount, amount_conf = find_total(lines)
+    date, date_conf = find_date(lines)
+    store, store_conf = find_store(lines)
+    payment, payment_conf = find_payment(lines)
+
+    scores = {"amount": amount_conf, "date": date_conf, "store": store_conf, "payment": payment_conf}
+    confidence = 0.0
+    if amount_conf and date_conf:
+        confidence = sum(FIELD_WEIGHTS[field] * score for field, score in scores.items()) * quality
+
+    return {
+        "date": date or datetime.now().strftime("%y%m%d"),
+        "store": store,
+        "payment": payment,
+        "amount": amount if amount is not None else 0.0,
+        "confidence": round(confidence, 3)
+    }
+
+def extract(file_data, mime_type):
+    """OCR + parse. Returns parse_receipt's dict, or None if nothing could be read."""
+    try:
+        lines, quality = read_lines(file_data, mime_type)
+    except Exception as e:
+        logger.warning(f"Local OCR failed: {e}")
+        return None
+    if not lines:
+        return None
+    return parse_receipt(lines, quality)
@@ -1,13 +1,24 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Form, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from typing import List, Optional
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from typing import Optional
 import os
-import shutil
+import json
 import logging
-from processor import process_document
-from history import add_history_entry, get_history
+import watcher
+import metrics
+import progress
+import previews
+import blobstore
+import notion_outbox
+import mimetypes
+from history import query_history
+from pipeline import gobble_file, gobble_upload, gobble_folder
+from jobs import submit_job, get_job
+from executor import run_blocking, get_executor
+from uploads import receive_uploads, UploadTooLarge, BadUpload, max_request_bytes
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +26,9 @@ logger = logging.getLogger("MightyGobbla")
 
 app = FastAPI(title="MIGHTY GOBBLA!")
 
+# Public address of the VPS, used to build absolute URLs for Notion
+PUBLIC_BASE_URL = "http://72.60.27.66:8000"
+
 # CORS 
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +45,60 @@ if not os.path.exists(STATIC_DIR):
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+def _route_template(request):
+    """The route's path template (/jobs/{job_id}), so ids don't blow up label cardinality."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse upload requests whose Content-Length is already over max_request_mb without
+    reading any of the body. Bodies without one are capped as they stream in (see
+    uploads.receive_uploads), and so is each file.
+    """
+    if request.url.path == "/upload_files":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_request_bytes():
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Added last so it wraps the other middleware (413s are counted too).
+    # Streaming endpoints (/process_folder) are timed to the first byte, not the last
+    route = _route_template(request)
+    metrics.HTTP_IN_FLIGHT.inc(route=route)
+    status = 500
+    try:
+        with metrics.HTTP_DURATION.time(method=request.method, route=route):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec(route=route)
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+
+def _debug_requested(request):
+    """?debug=1 or an X-Gobbla-Debug: 1 header adds a timing breakdown to each result."""
+    flag = request.query_params.get("debug") or request.headers.get("x-gobbla-debug") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+@app.on_event("startup")
+def start_watcher():
+    # Gobbles receipts dropped into the watch_folders setting, if any are configured
+    watcher.start_from_settings()
+    # Sends Notion writes left queued by the last run
+    notion_outbox.start()
+
+@app.on_event("shutdown")
+def stop_watcher():
+    watcher.stop()
+    notion_outbox.stop()
+
 @app.get("/")
 def read_root():
     return FileResponse(os.path.join(STATIC_DIR, "index.html"))
@@ -38,233 +106,179 @@ def read_root():
 
 
 @app.post("/upload_files")
-async def upload_files_endpoint(files: List[UploadFile] = File(...)):
-    results = []
-    for file in files:
-        try:
-            # Save file to public static folder for URL access
-            uploads_dir = os.path.join(STATIC_DIR, "uploads")
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-            
-            # Use original extension
-            ext = os.path.splitext(file.filename)[1]
-            temp_name = f"temp_{file.filename}" 
-            # We'll rename later, but for now we need a path
-            
-            save_path = os.path.join(uploads_dir, file.filename)
-            
-            with open(save_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Process the file
-            processed_info = process_document(save_path)
-            
-            # Generate Naming Convention (for Notion & History)
-            # Format: YYMMDD-Store-Payment
-            base_new_name = f"{processed_info['date']}-{processed_info['store']}-{processed_info['payment']}"
-            base_new_name = base_new_name.replace("/", "").replace(":", "")
-            new_name = f"{base_new_name}{ext}"
-            
-            # Rename in uploads folder to match convention
-            final_path = os.path.join(uploads_dir, new_name)
-            
-            # Avoid overwriting existing
-            counter = 1
-            while os.path.exists(final_path):
-                new_name = f"{base_new_name}_{counter}{ext}"
-                final_path = os.path.join(uploads_dir, new_name)
-                counter += 1
-                
-            os.rename(save_path, final_path)
-            
-            # Add Public URL for Notion
-            # Assuming standard port 8000 and direct IP access for now.
-            # Ideally this comes from ENV or headers. using hardcoded IP for VPS match or relative?
-            # Notion needs ABSOLUTE URL.
-            # We can try to infer host from request, but we are inside async loop.
-            # Let's assume the user's host is correct.
-            # Actually, let's just construct it relative to the server ROOT if we knew it.
-            # HARDCODED for VPS:
-            processed_info['file_url'] = f"http://72.60.27.66:8000/static/uploads/{new_name}"
-            
-            # For uploads, we can't rename the source file on the phone, 
-            # but we use the correct name for Notion/History.
-            processed_info['filename'] = new_name
-
-            # Notion Check
-            notion_result = None
-            history_added = False
-            from settings import get_setting
-            if get_setting("notion_enabled"):
-                from notion_integration import add_to_notion_expenses
-                notion_result = add_to_notion_expenses(processed_info)
-                
-                # Only add to history if success
-                if notion_result and notion_result.get('status') == 'success':
-                     add_history_entry(new_name, processed_info, directory="Mobile Upload")
-                     history_added = True
-            else:
-                add_history_entry(new_name, processed_info, directory="Mobile Upload")
-                history_added = True
-            
-            results.append({
-                "original": file.filename,
-                "new": new_name,
-                "status": "gobbled", 
-                "data": processed_info,
-                "notion_status": notion_result,
-                "history_added": history_added
-            })
-
-        except Exception as e:
-            logger.error(f"Error processing {file.filename}: {e}")
-            results.append({"original": file.filename, "status": "error", "message": str(e)})
-
-    return {"results": results}
-async def process_file_path_endpoint(file_path: str = Form(...)):
-    """Process a single local file in-place."""
+async def upload_files_endpoint(request: Request, response: Response):
+    """
+    Streams the uploaded files (multipart "files" fields) to disk and queues them for gobbling.
+    Returns one job id per file; poll /jobs/{job_id} for the result. A file over max_upload_mb,
+    or a request over max_request_mb, stops the upload with a 413 as soon as the limit is
+    passed, and nothing from that request is kept or queued.
+    In debug mode each job's result carries its timing breakdown.
+    """
+    debug = _debug_requested(request)
+    gobble = metrics.with_source("upload", metrics.traced(gobble_upload) if debug else gobble_upload)
+
+    try:
+        # Phones love naming everything image.jpg, so each upload is parked under a unique
+        # name until the pipeline moves it into the blob store under its hash.
+        # Chunked async writes; the hash is computed on the way through
+        uploads = await receive_uploads(request.headers.get("content-type"), request.stream(), blobstore.incoming_path)
+    except UploadTooLarge as e:
+        logger.warning(f"Rejected upload: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except BadUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files in the upload")
+
+    jobs = []
+    save_timings = []
+    for upload in uploads:
+        metrics.observe_stage("upload_save", upload["seconds"], source="upload")
+        save_timings.append({"stage": "upload_save", "ms": round(upload["seconds"] * 1000, 1), "detail": upload["filename"]})
+
+        # Add Public URL for Notion
+        # Notion needs ABSOLUTE URL. HARDCODED for VPS:
+        job_id = submit_job(
+            upload["filename"],
+            gobble,
+            upload["path"],
+            original=upload["filename"],
+            public_url_base=PUBLIC_BASE_URL,
+            content_hash=upload["sha256"]
+        )
+        jobs.append({"job_id": job_id, "original": upload["filename"], "status": "queued"})
+
+    if debug:
+        response.headers["Server-Timing"] = metrics.server_timing(save_timings)
+    return {"jobs": jobs}
+
+@app.get("/jobs/{job_id}")
+def get_job_endpoint(job_id: str, response: Response):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Jobs queued in debug mode finish with a timing breakdown
+    if job["result"] and job["result"].get("timings"):
+        response.headers["Server-Timing"] = metrics.server_timing(job["result"]["timings"])
+    return job
+
+@app.post("/process_file_path")
+async def process_file_path_endpoint(request: Request, response: Response, file_path: str = Form(...)):
+    """Process a single local file in-place. Debug mode adds timings and a Server-Timing header."""
     # Strip quotes just in case backend receives them
     file_path = file_path.strip().strip('"').strip("'")
     
     if not os.path.exists(file_path):
         return {"results": [{"original": file_path, "status": "error", "message": "File not found"}]}
-    
-    filename = os.path.basename(file_path)
-    root = os.path.dirname(file_path)
-    
-    # Logic similar to folder processing
-    try:
-        processed_info = process_document(file_path)
-        
-        ext = os.path.splitext(filename)[1]
-        
-        base_new_name = f"{processed_info['date']}-{processed_info['store']}-{processed_info['payment']}"
-        base_new_name = base_new_name.replace("/", "").replace(":", "")
-        
-        new_name = f"{base_new_name}{ext}"
-        new_path = os.path.join(root, new_name)
-        
-        # Collision Handling
-        counter = 1
-        while os.path.exists(new_path) and new_path != file_path:
-            new_name = f"{base_new_name}_{counter}{ext}"
-            new_path = os.path.join(root, new_name)
-            counter += 1
-            
-        if file_path != new_path:
-            os.rename(file_path, new_path)
-            logger.info(f"Renamed {file_path} -> {new_path}")
-            
-        # Notion Check
-        notion_result = None
-        history_added = False
-        from settings import get_setting
-        if get_setting("notion_enabled"):
-            from notion_integration import add_to_notion_expenses
-            processed_info['filename'] = new_name # Update to renamed filename for Notion
-            notion_result = add_to_notion_expenses(processed_info)
-            
-            # Only add to history if success
-            if notion_result and notion_result.get('status') == 'success':
-                 add_history_entry(new_name, processed_info, directory=root)
-                 history_added = True
-        else:
-            # If Notion disabled, we just log it as processed locally
-            add_history_entry(new_name, processed_info, directory=root)
-            history_added = True
-            
-        return {
-            "results": [
-                {
-                    "original": filename, 
-                    "new": new_name, 
-                    "status": "gobbled",
-                    "notion_status": notion_result,
-                    "data": processed_info,
-                    "history_added": history_added
-                }
-            ]
-        }
-        
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        return {"results": [{"original": filename, "status": "error", "message": str(e)}]}
+
+    debug = _debug_requested(request)
+    result = await run_blocking(metrics.with_source("file_path", metrics.traced(gobble_file) if debug else gobble_file), file_path)
+    if debug:
+        response.headers["Server-Timing"] = metrics.server_timing(result.get("timings"))
+    return {"results": [result]}
 
 @app.post("/process_folder")
-async def process_folder_endpoint(folder_path: str = Form(...)):
+async def process_folder_endpoint(
+    request: Request,
+    folder_path: str = Form(...),
+    concurrency: Optional[int] = Form(None),
+    force: bool = Form(False),
+    batch_size: Optional[int] = Form(None),
+    run_id: Optional[str] = Form(None)
+):
+    """
+    Gobbles the new and changed files in a folder, several at a time.
+    Streams one JSON result per line (NDJSON) as each file finishes, then a final
+    {"summary": {...}} line with the counts. force=true reprocesses everything.
+    batch_size > 1 sends that many receipts to Gemini per request.
+    In debug mode every result line carries that file's timing breakdown (no
+    Server-Timing header here: it would have to be sent before any file finished).
+    With a run_id, per-file progress is also pushed to /events/{run_id} as it happens.
+    """
+    debug = _debug_requested(request)
     # Strip quotes if present
     folder_path = folder_path.strip().strip('"').strip("'")
 
     if not os.path.isdir(folder_path):
         raise HTTPException(status_code=400, detail="Directory not found")
 
-    results = []
-    # Loop files
-    for root, _, files in os.walk(folder_path):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            # Filter extensions
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.pdf')):
-                try:
-                    processed_info = process_document(file_path)
-                    
-                    # Rename Logic
-                    # Convention: [yymmdd]-[Store]-[Payment]
-                    ext = os.path.splitext(filename)[1]
-                    # Format: YYMMDD-Store-Payment
-                    base_new_name = f"{processed_info['date']}-{processed_info['store']}-{processed_info['payment']}"
-                    base_new_name = base_new_name.replace("/", "").replace(":", "")
-                    
-                    new_name = f"{base_new_name}{ext}"
-                    new_path = os.path.join(root, new_name)
-                    
-                    # Collision Handling
-                    counter = 1
-                    while os.path.exists(new_path) and new_path != file_path:
-                        new_name = f"{base_new_name}_{counter}{ext}"
-                        new_path = os.path.join(root, new_name)
-                        counter += 1
-
-                    
-                    # Rename
-                    if file_path != new_path:
-                        os.rename(file_path, new_path)
-                        logger.info(f"Renamed {file_path} -> {new_path}")
-                        
-                    # Notion Check
-                    notion_result = None
-                    history_added = False
-                    from settings import get_setting
-                    if get_setting("notion_enabled"):
-                        from notion_integration import add_to_notion_expenses
-                        processed_info['filename'] = new_name
-                        notion_result = add_to_notion_expenses(processed_info)
-                        
-                        if notion_result and notion_result.get('status') == 'success':
-                            add_history_entry(new_name, processed_info, directory=root)
-                            history_added = True
-                    else:
-                        add_history_entry(new_name, processed_info, directory=root)
-                        history_added = True
-
-                    results.append({
-                        "original": filename, 
-                        "new": new_name, 
-                        "status": "gobbled",
-                        "notion_status": notion_result,
-                        "history_added": history_added
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Failed to gobble {filename}: {e}")
-                    results.append({"original": filename, "status": "error", "message": str(e)})
-    
-    return {"results": results}
+    def stream_results():
+        summary = {}
+        try:
+            for result in gobble_folder(folder_path, concurrency, force=force, summary=summary,
+                                        batch_size=batch_size, timings=debug, run_id=run_id):
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            if run_id:
+                progress.finish(run_id, summary)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/events/{run_id}")
+async def stream_events(run_id: str, request: Request):
+    """
+    Server-sent events for a folder run: started, split, extracted, renamed, notion and
+    result per file, then summary and done. Subscribe before starting the run (any order
+    works, events are buffered). Reconnects resume from Last-Event-ID.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(progress.stream(run_id, last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _immutable_file(request, path, tag, **kwargs):
+    """FileResponse for content-addressed files: cached for a year, 304 on a matching If-None-Match."""
+    etag = f'"{tag}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers, **kwargs)
+
+@app.get("/previews/{name}")
+def get_preview(name: str, request: Request):
+    """
+    Thumbnail/display copies of receipts. Names are content hashes, so they never change:
+    cached for a year, and revalidation with If-None-Match gets a 304.
+    """
+    path = previews.preview_path(name)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return _immutable_file(request, path, name.rsplit(".", 1)[0], media_type="image/jpeg")
+
+@app.get("/uploads/{sha256}/{name}")
+def get_upload(sha256: str, name: str, request: Request):
+    """
+    An uploaded receipt from the blob store. The hash picks the file, the name is just
+    what the browser saves it as, so the URL is immutable and cached for a year.
+    """
+    path = blobstore.find(sha256) if len(sha256) == 64 else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return _immutable_file(request, path, sha256, media_type=media_type, filename=name, content_disposition_type="inline")
 
 @app.get("/history")
-def get_history_endpoint(page: int = 1, limit: int = 10):
-    return get_history(page, limit)
+def get_history_endpoint(
+    limit: int = 10,
+    cursor: Optional[int] = None,
+    store: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    amount_min: Optional[float] = None,
+    amount_max: Optional[float] = None,
+    payment: Optional[str] = None,
+    directory: Optional[str] = None
+):
+    """Newest first. Pass next_cursor from the previous page as cursor to page on."""
+    return query_history(
+        store=store, date_from=date_from, date_to=date_to,
+        amount_min=amount_min, amount_max=amount_max,
+        payment=payment, directory=directory,
+        cursor=cursor, limit=limit
+    )
 
 @app.delete("/history/{entry_id}")
 def delete_history_item(entry_id: int):
@@ -278,6 +292,48 @@ def delete_all_history():
     clear_history()
     return {"status": "cleared"}
 
+# --- Extraction Cache Endpoints ---
+@app.get("/cache/stats")
+def get_cache_stats():
+    import extraction_cache
+    return extraction_cache.get_stats()
+
+@app.delete("/cache")
+def clear_cache():
+    import extraction_cache
+    extraction_cache.clear()
+    return {"status": "cleared"}
+
+@app.get("/extraction/stats")
+def get_extraction_stats():
+    """Hit rates and latencies of the cache, local OCR and Gemini tiers."""
+    import extraction_stats
+    return extraction_stats.get_stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: request, stage and model latencies, pool and tier counts."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/executor/stats")
+def get_executor_stats():
+    return get_executor().stats()
+
+@app.get("/watch")
+def get_watch_status():
+    return watcher.get_status()
+
+@app.get("/models/health")
+def get_models_health():
+    from processor import registry
+    return registry.snapshot()
+
+@app.get("/models/limiter")
+def get_models_limiter():
+    """Gemini calls in flight and waiting, 429s seen, and how long calls queue for their turn."""
+    import gemini_limiter
+    return gemini_limiter.get_limiter().stats()
+
 # --- Settings Endpoints ---
 @app.get("/settings")
 def get_settings_endpoint():
@@ -292,95 +348,34 @@ async def force_add_notion(
     payment: str = Form(...),
     amount: float = Form(...)
 ):
-    from notion_integration import add_to_notion_expenses
+    from notion_integration import force_add_expense
+    # Skips the duplicate check; only queues the page, but the outbox is SQLite so still off the event loop
+    return await run_blocking(metrics.with_source("force_add", force_add_expense), filename, date, store, payment, amount)
+
+@app.get("/notion/outbox")
+def get_notion_outbox():
+    """Notion writes still queued, done and given up on (with the latest failures)."""
+    return notion_outbox.get_stats()
+
+@app.post("/notion/outbox/retry")
+def retry_notion_outbox():
+    """Re-queues every write that gave up."""
+    return {"requeued": notion_outbox.retry_failed()}
+
+@app.post("/notion/mirror/refresh")
+def refresh_notion_mirror():
+    """Full re-sync of the local copy of the Expenses database."""
+    import notion_mirror
     from settings import get_setting
-    
-    # We construct the data and call a modified version or just "trust" it?
-    # Actually, we need to modify add_to_notion to create directly, OR we just
-    # ...create it directly here using logic similar to add_to_notion but without check.
-    # To keep code clean, let's just use the existing function but we need to bypass check.
-    # Hack: Pass a special flag in data? No, let's refactor slightly if needed.
-    # Or just copy the creation logic here for simplicity.
-    
     token = get_setting("notion_token")
     db_id = get_setting("notion_db_id")
-    import requests
-    from datetime import datetime
-    
-    # ISO date conversion
-    try:
-        dt = datetime.strptime(date, "%y%m%d")
-        iso_date = dt.strftime("%Y-%m-%d")
-    except:
-        iso_date = datetime.now().strftime("%Y-%m-%d")
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
-    }
-    
-    # Updated Schema Logic
-    # Parse Payment for metadata
-    payment_method = "Other"
-    payment_type = "Credit Card"
-    last_4 = ""
-    
-    if "Card" in payment:
-        payment_type = "Credit Card"
-        if "-" in payment:
-            last_4 = payment.split("-")[1]
-            if last_4 == "XXXX": last_4 = ""
-    elif "Check" in payment:
-        payment_method = "Check"
-        payment_type = "Check"
-        if "-" in payment:
-            last_4 = payment.split("-")[1]
-    elif "Cash" in payment:
-        payment_method = "Cash"
-        payment_type = "Cash"
-        
-    payload = {
-        "parent": {"database_id": db_id},
-        "properties": {
-            "Expense Description": {"title": [{"text": {"content": filename}}]},
-            "Vendor/Supplier": {"rich_text": [{"text": {"content": store}}]},
-            "Date Paid": {"date": {"start": iso_date}},
-            "Subtotal": {"number": amount},
-            "Payment Type": {"select": {"name": payment_type}}
-        }
-    }
-    
-    if payment_method != "Other":
-        payload["properties"]["Payment Method"] = {"select": {"name": payment_method}}
-        
-    if last_4:
-        payload["properties"]["Last 4 of Card"] = {"rich_text": [{"text": {"content": last_4}}]}
-    
-    try:
-        resp = requests.post("https://api.notion.com/v1/pages", headers=headers, json=payload)
-        if resp.status_code == 200:
-            # Success! Add to History now.
-            from history import add_history_entry
-            # Reconstruct details dict for history (since we don't pass 'processed_info' fully, we remake it)
-            details = {
-                "date": date, # Passed as yymmdd string from form
-                "store": store,
-                "payment": payment,
-                "amount": amount
-            }
-            # Directory? We don't have it in form. "Force Add" is contextless. 
-            # We can default to "Unknown/ForceAdd"
-            add_history_entry(filename, details, directory="Force Add")
-            
-            return {"status": "success", "url": resp.json().get('url')}
-        else:
-            return {"status": "error", "message": resp.text}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    if not token or not db_id:
+        raise HTTPException(status_code=400, detail="Notion is not configured")
+    pages = notion_mirror.refresh(token, db_id, full=True)
+    return {"status": "refreshed", "pages": pages}
 
 @app.post("/settings")
-async def update_settings_endpoint(
+def update_settings_endpoint(
     notion_enabled: bool = Form(...),
     notion_token: Optional[str] = Form(None),
     notion_db_id: Optional[str] = Form(None)
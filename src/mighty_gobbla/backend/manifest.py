@@ -0,0 +1,91 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("MightyGobbla.Manifest")
+
+# Which files we've already gobbled, so restarts and re-runs don't redo them
+MANIFEST_DB = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_manifest.db")
+
+_lock = threading.Lock()
+_conn = None
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(MANIFEST_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT,
+                status TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_files_folder ON files(folder)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files(sha256)")
+        _conn.commit()
+    return _conn
+
+def normalize_path(path):
+    """The form paths are stored in (absolute, case-folded on Windows)."""
+    return os.path.normcase(os.path.abspath(path))
+
+def get_entry(path):
+    with _lock:
+        row = _get_conn().execute("SELECT * FROM files WHERE path = ?", (normalize_path(path),)).fetchone()
+    return dict(row) if row else None
+
+def is_unchanged(path, stat_result):
+    """
+    True if path was recorded with this exact size and mtime, whatever its status. The
+    watcher relies on this so a "failed" file (its own rename) doesn't loop while Gemini is down.
+    """
+    entry = get_entry(path)
+    return bool(entry) and entry["size"] == stat_result.st_size and entry["mtime_ns"] == stat_result.st_mtime_ns
+
+def record(folder, path, sha256=None, status="gobbled"):
+    """Stores path's current size/mtime (and hash) as handled."""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        logger.warning(f"Can't record {path} in manifest: {e}")
+        return
+    with _lock:
+        conn = _get_conn()
+        conn.execute("""
+            INSERT OR REPLACE INTO files (path, folder, size, mtime_ns, sha256, status, processed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (normalize_path(path), normalize_path(folder), st.st_size, st.st_mtime_ns, sha256, status, time.time()))
+        conn.commit()
+
+def find_by_hash(sha256):
+    """A gobbled entry with these exact bytes, or None."""
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT * FROM files WHERE sha256 = ? AND status = 'gobbled' LIMIT 1", (sha256,)
+        ).fetchone()
+    return dict(row) if row else None
+
+def get_tree_entries(folder):
+    """
+    {path: (size, mtime_ns)} for every recorded file under folder, in one query,
+    so a folder run can check thousands of files without a lookup each.
+    Files whose extraction failed (status "failed") are left out, so the run retries them.
+    """
+    prefix = os.path.join(normalize_path(folder), "")
+    with _lock:
+        # Range on the primary key: every path that starts with prefix
+        rows = _get_conn().execute(
+            "SELECT path, size, mtime_ns FROM files WHERE path >= ? AND path < ? AND status != 'failed'",
+            (prefix, prefix + "\uffff")
+        ).fetchall()
+    return {row["path"]: (row["size"], row["mtime_ns"]) for row in rows}
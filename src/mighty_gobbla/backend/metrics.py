@@ -0,0 +1,258 @@
+import time
+import threading
+from urllib.parse import quote
+from contextlib import contextmanager
+
+# Prometheus text exposition (format 0.0.4) without pulling in prometheus_client.
+# Served at /metrics; everything is in-process and resets on restart.
+
+# Seconds; covers a quick SQLite write up to a slow multi-page Gemini call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with _lock:
+            values = dict(self._values)
+        return self._header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                                 for key, value in sorted(values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts = list(counts)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with _lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', _format_value(bound))])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+def register_collector(fn):
+    """
+    fn() is called on every scrape and returns [(name, kind, help, [(labels_dict, value)])],
+    for numbers that already live elsewhere (pool sizes, tier stats...).
+    """
+    with _lock:
+        _collectors.append(fn)
+
+def render():
+    lines = []
+    with _lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in collectors:
+        for name, kind, help_text, samples in collector():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- What a gobble spends its time on ---
+
+# Which entry point the current thread is working for (upload, folder, watch, force_add...)
+_source = threading.local()
+
+def current_source():
+    # None once a with_source wrapper has run on this thread and restored "nothing set"
+    return getattr(_source, "name", None) or "other"
+
+def with_source(name, fn, trace=None):
+    """Wraps fn so stages it runs are labelled with source=name (for pool threads)."""
+    def run(*args, **kwargs):
+        previous = getattr(_source, "name", None), getattr(_source, "trace", None)
+        _source.name, _source.trace = name, trace
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _source.name, _source.trace = previous
+    return run
+
+def carry_context(fn):
+    """with_source for work fanned out from a pool thread: keeps its source and timing trace."""
+    return with_source(current_source(), fn, getattr(_source, "trace", None))
+
+# --- Per-result timing breakdown (debug mode) ---
+# While a trace is active on a thread every stage and model attempt is also appended to it,
+# so a single slow receipt can be picked apart from the UI.
+
+def tracing():
+    return getattr(_source, "trace", None) is not None
+
+def _trace_add(name, seconds, **extra):
+    trace = getattr(_source, "trace", None)
+    if trace is not None:
+        trace.append({"stage": name, "ms": round(seconds * 1000, 1), **extra})
+
+def traced(fn):
+    """
+    Wraps fn so its result dict(s) get a "timings" list (stages in the order they ran)
+    and "total_ms". Results that already carry timings (per-file ones from a batch) are left alone.
+    """
+    def run(*args, **kwargs):
+        previous = getattr(_source, "trace", None)
+        _source.trace = []
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            timings = _source.trace
+        finally:
+            _source.trace = previous
+        total_ms = round((time.perf_counter() - start) * 1000, 1)
+        for item in (result if isinstance(result, list) else [result]):
+            if isinstance(item, dict) and "timings" not in item:
+                item["timings"] = timings
+                item["total_ms"] = total_ms
+        return result
+    return run
+
+@contextmanager
+def trace_section():
+    """
+    Yields a list that collects the stages run inside the block (empty when not tracing).
+    They still land in the enclosing trace too.
+    """
+    parent = getattr(_source, "trace", None)
+    section = []
+    if parent is None:
+        yield section
+        return
+    _source.trace = section
+    try:
+        yield section
+    finally:
+        _source.trace = parent
+        parent.extend(section)
+
+def server_timing(timings):
+    """
+    A Server-Timing header value for a "timings" list. Details (file and model names) are
+    percent-encoded: headers are latin-1, and a receipt called 收据.jpg mustn't turn into a 500.
+    """
+    entries = []
+    for entry in timings or []:
+        value = f"{entry['stage']};dur={entry['ms']}"
+        if entry.get("detail"):
+            value += f';desc="{quote(str(entry["detail"]), safe=" /:._-()")}"'
+        entries.append(value)
+    return ", ".join(entries)
+
+HTTP_REQUESTS = Counter("gobbla_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("gobbla_http_requests_in_flight", "HTTP requests being handled right now.", ("route",))
+HTTP_DURATION = Histogram("gobbla_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+STAGE_DURATION = Histogram("gobbla_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage", "source"))
+MODEL_CALLS = Counter("gobbla_model_calls_total", "Gemini calls per model in the candidate cascade.", ("model", "outcome"))
+MODEL_DURATION = Histogram("gobbla_model_call_duration_seconds", "Gemini call latency per model.", ("model",))
+
+def observe_stage(name, seconds, source=None):
+    STAGE_DURATION.observe(seconds, stage=name, source=source or current_source())
+    _trace_add(name, seconds)
+
+@contextmanager
+def stage(name, source=None):
+    """with stage("gemini"): ... records how long the block took under that stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start, source)
+
+@contextmanager
+def model_call(model_name):
+    """Times one generate_content call; counted as a model attempt in the timing trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        MODEL_DURATION.observe(seconds, model=model_name)
+        _trace_add("model_attempt", seconds, detail=model_name)
+
+def model_outcome(model_name, outcome):
+    """success/failure of the latest attempt on model_name (a bad answer fails after the call)."""
+    MODEL_CALLS.inc(model=model_name, outcome=outcome)
+    trace = getattr(_source, "trace", None)
+    for entry in reversed(trace or []):
+        if entry["stage"] == "model_attempt" and entry.get("detail") == model_name:
+            entry.setdefault("outcome", outcome)
+            break
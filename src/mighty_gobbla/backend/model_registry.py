@@ -0,0 +1,145 @@
+import time
+import logging
+import threading
+import google.generativeai as genai
+
+logger = logging.getLogger("MightyGobbla.Models")
+
+# A model that fails this many times in a row is skipped (circuit open)...
+FAILURE_THRESHOLD = 3
+# ...for this long, after which it gets one trial call again (half-open)
+OPEN_SECONDS = 5 * 60
+# How often the background thread re-checks which models the API offers
+PROBE_INTERVAL_SECONDS = 10 * 60
+
+def normalize_model_name(name):
+    """genai treats 'gemini-x' and 'models/gemini-x' as the same model."""
+    return name if name.startswith("models/") else f"models/{name}"
+
+class ModelRegistry:
+    """
+    Process-wide view of which Gemini models work.
+
+    Remembers the last model that succeeded and tries it first, opens a circuit on
+    models that keep failing, drops models the API no longer lists (checked in the
+    background), and reuses GenerativeModel objects across files.
+    """
+
+    def __init__(self, candidates, list_models_fn, probe_interval=PROBE_INTERVAL_SECONDS):
+        # Preference order, with duplicate spellings of the same model collapsed
+        self._candidates = []
+        for name in candidates:
+            if normalize_model_name(name) not in self._candidates:
+                self._candidates.append(normalize_model_name(name))
+
+        self._list_models_fn = list_models_fn
+        self._probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._models = {}
+        self._preferred = None
+        self._available = None # Set of names from the last successful probe
+        self._last_probe_at = None
+        self._probe_thread = None
+        self._health = {name: self._new_health() for name in self._candidates}
+
+    def ordered_candidates(self):
+        """
+        Models to try for the next file, best first.
+        The last known-good model leads; open circuits and unlisted models are left out.
+        If nothing is healthy we still return everything rather than give up without trying.
+        """
+        self._ensure_probing()
+        now = time.time()
+        with self._lock:
+            healthy = [
+                name for name in self._candidates
+                if self._health[name]["open_until"] <= now
+                and (self._available is None or name in self._available)
+            ]
+            if self._preferred in healthy:
+                healthy.remove(self._preferred)
+                healthy.insert(0, self._preferred)
+
+        if not healthy:
+            logger.warning("No healthy Gemini models; trying the full candidate list")
+            return list(self._candidates)
+        return healthy
+
+    def get_model(self, name):
+        """Returns a cached GenerativeModel for name."""
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = genai.GenerativeModel(name)
+                self._models[name] = model
+            return model
+
+    def record_success(self, name):
+        with self._lock:
+            health = self._health.setdefault(name, self._new_health())
+            health["successes"] += 1
+            health["consecutive_failures"] = 0
+            health["open_until"] = 0.0
+            self._preferred = name
+
+    def record_failure(self, name, error):
+        with self._lock:
+            health = self._health.setdefault(name, self._new_health())
+            health["failures"] += 1
+            health["consecutive_failures"] += 1
+            health["last_error"] = str(error)[:300]
+
+            if health["consecutive_failures"] >= FAILURE_THRESHOLD:
+                health["open_until"] = time.time() + OPEN_SECONDS
+                logger.warning(f"Circuit opened for {name} after {health['consecutive_failures']} failures")
+
+            if self._preferred == name:
+                self._preferred = None
+
+    def probe(self):
+        """Refreshes the set of models the API currently offers. Returns the list."""
+        available = self._list_models_fn()
+        if available:
+            with self._lock:
+                self._available = {normalize_model_name(name) for name in available}
+                self._last_probe_at = time.time()
+                missing = [name for name in self._candidates if name not in self._available]
+            if missing:
+                logger.info(f"Models not offered by the API, skipping: {missing}")
+        return available
+
+    def snapshot(self):
+        """Health report for the /models/health endpoint."""
+        now = time.time()
+        with self._lock:
+            return {
+                "preferred": self._preferred,
+                "last_probe_at": self._last_probe_at,
+                "models": {
+                    name: {
+                        **health,
+                        "circuit": "open" if health["open_until"] > now else "closed",
+                        "available": None if self._available is None else name in self._available
+                    }
+                    for name, health in self._health.items()
+                }
+            }
+
+    def _new_health(self):
+        return {"consecutive_failures": 0, "successes": 0, "failures": 0,
+                "open_until": 0.0, "last_error": None}
+
+    def _ensure_probing(self):
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="gobbla-model-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning(f"Model probe failed: {e}")
+            time.sleep(self._probe_interval)
@@ -4,51 +4,38 @@ import json
 import logging
 from datetime import datetime
 from settings import get_setting
+import notion_mirror
+import notion_outbox
+import metrics
 
 logger = logging.getLogger("MightyGobbla.Notion")
 
-def add_to_notion_expenses(file_data):
-    """
-    Adds an entry to the Notion Expenses database.
-    Values retrieved from settings.py
-    """
-    token = get_setting("notion_token")
-    db_id = get_setting("notion_db_id")
-    
-    if not token or not db_id:
-        logger.error("Notion Token or Database ID missing in settings.")
-        return False
+NOTION_API_URL = "https://api.notion.com/v1"
 
-    headers = {
+def get_notion_headers(token):
+    return {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
         "Notion-Version": "2022-06-28"
     }
-    
-    # 1. Check for duplicates
-    # We query for an entry with the same Date and same Name (Filename) or Store + Amount
-    # For now, let's use the Filename as the unique identifier "Name"
-    
-    query_url = f"https://api.notion.com/v1/databases/{db_id}/query"
-    
+
+def to_iso_date(raw_date):
+    """YYMMDD -> YYYY-MM-DD, falling back to today."""
     # Safe date parsing
     try:
-        raw_date = file_data.get('date', '')
-        if len(raw_date) == 6:
+        if raw_date and len(raw_date) == 6:
             dt = datetime.strptime(raw_date, "%y%m%d")
-            iso_date = dt.strftime("%Y-%m-%d")
-        else:
-            iso_date = datetime.now().strftime("%Y-%m-%d")
+            return dt.strftime("%Y-%m-%d")
     except:
-        iso_date = datetime.now().strftime("%Y-%m-%d")
+        pass
+    return datetime.now().strftime("%Y-%m-%d")
 
-    amount = file_data.get('amount', 0.0)
-    store = file_data.get('store', 'Unknown')
-    filename = file_data.get('filename')
-    payment_raw = file_data.get('payment', 'Unknown')
-    
-    # Parse Payment Details
-    # payment_raw ex: "Card-1234", "PayPal", "Check-101"
+def parse_payment(payment_raw):
+    """
+    Parse Payment Details
+    payment_raw ex: "Card-1234", "PayPal", "Check-101"
+    Returns (payment_method, payment_type, last_4).
+    """
     payment_method = "Other"
     payment_type = "Credit Card" # Default assumption for cards
     last_4 = ""
@@ -74,6 +61,15 @@ def add_to_notion_expenses(file_data):
         payment_method = "Cash"
         payment_type = "Cash"
 
+    return payment_method, payment_type, last_4
+
+def build_expense_payload(db_id, filename, store, iso_date, amount, payment_raw, file_url=None, image_url=None):
+    """
+    Page payload for the Expenses database. file_url links the original receipt;
+    image_url (a display-size preview) is what gets embedded, falling back to file_url.
+    """
+    payment_method, payment_type, last_4 = parse_payment(payment_raw)
+
     # Construct Payload
     payload = {
         "parent": {"database_id": db_id},
@@ -84,9 +80,6 @@ def add_to_notion_expenses(file_data):
             "Vendor/Supplier": {
                 "rich_text": [{"text": {"content": store}}]
             },
-            "Vendor/Supplier": {
-                "rich_text": [{"text": {"content": store}}]
-            },
             "Date Paid": {
                 "date": {"start": iso_date}
             },
@@ -108,57 +101,99 @@ def add_to_notion_expenses(file_data):
         payload["properties"]["Last 4 of Card"] = {"rich_text": [{"text": {"content": last_4}}]}
 
     # Add URL to "Receipt/Documentation" property
-    file_url = file_data.get('file_url')
     if file_url:
         payload["properties"]["Receipt/Documentation"] = {"url": file_url}
 
     # Add Receipt Image to Page Content (Embed as fallback/visual)
-    if file_url:
+    image_url = image_url or file_url
+    if image_url:
         payload["children"] = [
             {
                 "object": "block",
                 "type": "image",
                 "image": {
                     "type": "external",
-                    "external": {"url": file_url}
+                    "external": {"url": image_url}
                 }
             }
         ]
 
-    # Check for duplicates (Broadened: Date Paid only, then filter in Python)
-    # We query all entries for this Date.
-    query_payload = {
-        "filter": {
-            "property": "Date Paid",
-            "date": {"equals": iso_date}
-        }
-    }
+    return payload
+
+def create_expense_page(headers, payload):
+    """
+    Creates the page. Returns a status dict; errors carry the HTTP "code" and
+    Notion's "retry_after" so the outbox drainer can decide when to retry.
+    """
+    create_url = f"{NOTION_API_URL}/pages"
+    with metrics.stage("notion_create_page"):
+        resp = requests.post(create_url, headers=headers, json=payload, timeout=30)
     
+    if resp.status_code == 200:
+        logger.info("Successfully added to Notion!")
+        page = resp.json()
+        # Keep the local mirror current so the next duplicate check sees this page
+        notion_mirror.record_page(page, payload["parent"]["database_id"])
+        return {"status": "success", "url": page.get('url')}
+    else:
+        logger.error(f"Notion Error {resp.status_code}: {resp.text}")
+        return {"status": "error", "message": f"API Error: {resp.text}", "code": resp.status_code,
+                "retry_after": resp.headers.get("Retry-After")}
+
+def queued_result(outbox_id):
+    return {"status": "queued", "outbox_id": outbox_id, "message": "Queued for Notion"}
+
+def add_to_notion_expenses(file_data, history_entry=None):
+    """
+    Adds an entry to the Notion Expenses database.
+    Values retrieved from settings.py
+
+    Unless it looks like a duplicate, the page is queued in the outbox (see notion_outbox.py)
+    and {"status": "queued"} comes back straight away. history_entry is written to history
+    by the drainer once the page lands.
+    """
+    token = get_setting("notion_token")
+    db_id = get_setting("notion_db_id")
+    
+    if not token or not db_id:
+        logger.error("Notion Token or Database ID missing in settings.")
+        return False
+
+    # 1. Check for duplicates
+    # We query for an entry with the same Date and same Name (Filename) or Store + Amount
+    # For now, let's use the Filename as the unique identifier "Name"
+    
+    iso_date = to_iso_date(file_data.get('date', ''))
+    amount = file_data.get('amount', 0.0)
+    store = file_data.get('store', 'Unknown')
+    filename = file_data.get('filename')
+    payment_raw = file_data.get('payment', 'Unknown')
+
+    payload = build_expense_payload(db_id, filename, store, iso_date, amount, payment_raw,
+                                    file_url=file_data.get('file_url'), image_url=file_data.get('image_url'))
+
+    # Check for duplicates (Broadened: Date Paid only, then filter in Python)
+    # We look at all entries for this Date in the local mirror of the database,
+    # which is kept in sync incrementally instead of querying Notion every time.
+    # Until the mirror's first sync works, Notion is asked directly (as before the mirror).
     try:
-        dup_check = requests.post(query_url, headers=headers, json=query_payload)
-        search_results = []
-        if dup_check.status_code == 200:
-            search_results = dup_check.json().get('results', [])
+        with metrics.stage("notion_duplicate_check"):
+            if notion_mirror.ensure_fresh(token, db_id):
+                existing = notion_mirror.find_by_date(db_id, iso_date)
+            else:
+                existing = notion_mirror.fetch_by_date(token, db_id, iso_date)
+            # Queued pages count too, or a receipt uploaded twice in a row would slip through
+            search_results = existing + notion_outbox.pending_for_date(db_id, iso_date)
 
         # Python-side filtering for fuzzy matching
         for item in search_results:
-            # Check Title
-            props = item.get('properties', {})
-            
-            # Get Title
-            # Title prop name is "Expense Description" based on schema
-            existing_title = ""
-            title_list = props.get("Expense Description", {}).get("title", [])
-            if title_list: existing_title = title_list[0].get("plain_text", "").lower()
-            
-            # Get Vendor
-            existing_vendor = ""
-            vendor_list = props.get("Vendor/Supplier", {}).get("rich_text", [])
-            if vendor_list: existing_vendor = vendor_list[0].get("plain_text", "").lower()
+            # Title prop is "Expense Description" based on schema
+            existing_title = (item["title"] or "").lower()
+            existing_vendor = (item["vendor"] or "").lower()
             
             # Get Subtotal & Tax
-            existing_subtotal = props.get("Subtotal", {}).get("number") or 0.0
-            existing_tax = props.get("Tax Amount", {}).get("number") or 0.0
+            existing_subtotal = item["subtotal"] or 0.0
+            existing_tax = item["tax"] or 0.0
             existing_total_calc = existing_subtotal + existing_tax
             
             # CHECK MATCH
@@ -190,7 +225,7 @@ def add_to_notion_expenses(file_data):
             # DECISION: If Date matches (implicit) AND (Store matched OR Amount matched)
             if match_reason:
                 logger.info(f"Duplicate suspected: {match_reason}")
-                existing_url = item.get('url', 'unknown')
+                existing_url = item["url"] or 'unknown'
                 return {
                     "status": "duplicate_suspected",
                     "message": f"Potential Duplicate: {', '.join(match_reason)}.", 
@@ -198,17 +233,39 @@ def add_to_notion_expenses(file_data):
                     "details": f"Found entry on {iso_date}:\nTitle: {existing_title}\nSubtotal: ${existing_subtotal} (+${existing_tax} Tax)\n(Your file: {store} | ${amount})"
                 }
                 
-        # Create Page
-        create_url = "https://api.notion.com/v1/pages"
-        resp = requests.post(create_url, headers=headers, json=payload)
-        
-        if resp.status_code == 200:
-            logger.info("Successfully added to Notion!")
-            return {"status": "success", "url": resp.json().get('url')}
-        else:
-            logger.error(f"Notion Error {resp.status_code}: {resp.text}")
-            return {"status": "error", "message": f"API Error: {resp.text}"}
+        # Create Page (in the background)
+        return queued_result(notion_outbox.enqueue(payload, history_entry))
             
     except Exception as e:
         logger.error(f"Notion Exception: {e}")
         return {"status": "error", "message": str(e)}
+
+def force_add_expense(filename, date, store, payment, amount):
+    """
+    Queues the page without the duplicate check (user confirmed it's not a dupe);
+    it's recorded in history once it lands.
+    """
+    token = get_setting("notion_token")
+    db_id = get_setting("notion_db_id")
+
+    # Say so now, not later as a failed outbox entry nobody is looking at
+    if not token or not db_id:
+        logger.error("Notion Token or Database ID missing in settings.")
+        return {"status": "error", "message": "Notion Token or Database ID missing in settings."}
+
+    payload = build_expense_payload(db_id, filename, store, to_iso_date(date), amount, payment)
+
+    # Reconstruct details dict for history (since we don't pass 'processed_info' fully, we remake it)
+    details = {
+        "date": date, # Passed as yymmdd string from form
+        "store": store,
+        "payment": payment,
+        "amount": amount
+    }
+    # Directory? We don't have it in form. "Force Add" is contextless.
+    history_entry = {"filename": filename, "details": details, "directory": "Force Add"}
+
+    try:
+        return queued_result(notion_outbox.enqueue(payload, history_entry))
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,270 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import requests
+from settings import get_setting
+
+logger = logging.getLogger("MightyGobbla.NotionMirror")
+
+# Local copy of the Expenses database so duplicate checks don't need a Notion query
+MIRROR_DB = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_notion_mirror.db")
+
+# Pull edits made in Notion at most this often (in the background)...
+DEFAULT_REFRESH_SECONDS = 5 * 60
+# ...and re-read everything this often to drop pages deleted/archived in Notion
+DEFAULT_FULL_SYNC_HOURS = 24
+PAGE_SIZE = 100
+# After a failed first sync, wait this long before trying again (doubling up to the max);
+# meanwhile duplicate checks query Notion directly
+INITIAL_SYNC_RETRY_SECONDS = 30
+MAX_INITIAL_SYNC_RETRY_SECONDS = 15 * 60
+
+_lock = threading.Lock()
+_conn = None
+_refresh_lock = threading.Lock()
+_initial_sync_lock = threading.Lock()
+# db_id -> (time of the last failed first sync, failures in a row)
+_initial_sync_failures = {}
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(MIRROR_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id TEXT PRIMARY KEY,
+                db_id TEXT NOT NULL,
+                date_paid TEXT,
+                vendor TEXT COLLATE NOCASE,
+                title TEXT,
+                subtotal REAL,
+                tax REAL,
+                url TEXT,
+                last_edited_time TEXT,
+                synced_at REAL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_lookup ON pages(db_id, date_paid, vendor, subtotal)")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                db_id TEXT PRIMARY KEY,
+                last_edited_time TEXT,
+                last_refresh_at REAL,
+                last_full_sync_at REAL
+            )
+        """)
+        _conn.commit()
+    return _conn
+
+def _normalize_id(notion_id):
+    """Notion hands out ids with and without dashes; store one form."""
+    return (notion_id or "").replace("-", "")
+
+def _plain_text(prop, kind):
+    items = (prop or {}).get(kind) or []
+    if not items:
+        return ""
+    first = items[0]
+    return first.get("plain_text") or first.get("text", {}).get("content", "")
+
+def _page_row(page, db_id=None):
+    props = page.get("properties", {})
+    date_prop = props.get("Date Paid", {}).get("date") or {}
+    return (
+        page["id"],
+        _normalize_id(db_id or page.get("parent", {}).get("database_id")),
+        date_prop.get("start"),
+        _plain_text(props.get("Vendor/Supplier"), "rich_text"),
+        _plain_text(props.get("Expense Description"), "title"),
+        props.get("Subtotal", {}).get("number"),
+        props.get("Tax Amount", {}).get("number"),
+        page.get("url"),
+        page.get("last_edited_time"),
+        time.time()
+    )
+
+def _upsert_rows(conn, rows):
+    conn.executemany("""
+        INSERT OR REPLACE INTO pages
+            (id, db_id, date_paid, vendor, title, subtotal, tax, url, last_edited_time, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+def record_page(page, db_id=None):
+    """Adds a page we just created (the Notion API response) to the mirror."""
+    if page.get("archived") or page.get("in_trash"):
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            _upsert_rows(conn, [_page_row(page, db_id)])
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Could not record page in mirror: {e}")
+
+PAGE_COLUMNS = ("id", "db_id", "date_paid", "vendor", "title", "subtotal", "tax", "url", "last_edited_time", "synced_at")
+
+def fetch_by_date(token, db_id, iso_date):
+    """
+    Pages on iso_date straight from Notion (date-filtered query), shaped like find_by_date
+    rows. For when the mirror has never synced. Raises if Notion can't be asked.
+    """
+    from notion_integration import NOTION_API_URL, get_notion_headers
+
+    url = f"{NOTION_API_URL}/databases/{db_id}/query"
+    query = {"page_size": PAGE_SIZE, "filter": {"property": "Date Paid", "date": {"equals": iso_date}}}
+    pages = []
+    while True:
+        resp = requests.post(url, headers=get_notion_headers(token), json=query, timeout=30)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Notion query failed {resp.status_code}: {resp.text[:200]}")
+        body = resp.json()
+        pages += [dict(zip(PAGE_COLUMNS, _page_row(page, db_id))) for page in body.get("results", [])]
+        if not body.get("has_more"):
+            return pages
+        query["start_cursor"] = body.get("next_cursor")
+
+def find_by_date(db_id, iso_date):
+    """Every mirrored page on iso_date (YYYY-MM-DD), as dicts."""
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT * FROM pages WHERE db_id = ? AND date_paid = ?",
+            (_normalize_id(db_id), iso_date)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def _get_state(db_id):
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT * FROM sync_state WHERE db_id = ?", (_normalize_id(db_id),)
+        ).fetchone()
+    return dict(row) if row else None
+
+def refresh(token, db_id, full=False):
+    """
+    Pulls pages from Notion into the mirror, following pagination.
+    Incremental refreshes only ask for pages edited since the last one we saw;
+    a full refresh re-reads everything and drops pages that no longer exist.
+    """
+    from notion_integration import NOTION_API_URL, get_notion_headers
+
+    with _refresh_lock:
+        state = _get_state(db_id)
+        full = full or state is None or not state.get("last_edited_time")
+        started_at = time.time()
+
+        query = {"page_size": PAGE_SIZE}
+        if not full:
+            # Notion rounds last_edited_time to the minute, so on_or_after re-reads the
+            # boundary minute; upserts make that harmless.
+            query["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": state["last_edited_time"]}
+            }
+
+        url = f"{NOTION_API_URL}/databases/{db_id}/query"
+        headers = get_notion_headers(token)
+        newest_edit = state["last_edited_time"] if state else None
+        seen = 0
+
+        while True:
+            resp = requests.post(url, headers=headers, json=query, timeout=30)
+            if resp.status_code != 200:
+                raise RuntimeError(f"Notion query failed {resp.status_code}: {resp.text[:200]}")
+            body = resp.json()
+            results = body.get("results", [])
+            seen += len(results)
+
+            with _lock:
+                conn = _get_conn()
+                _upsert_rows(conn, [_page_row(page, db_id) for page in results])
+                conn.commit()
+
+            for page in results:
+                edited = page.get("last_edited_time")
+                if edited and (newest_edit is None or edited > newest_edit):
+                    newest_edit = edited
+
+            if not body.get("has_more"):
+                break
+            query["start_cursor"] = body.get("next_cursor")
+
+        with _lock:
+            conn = _get_conn()
+            if full:
+                # Anything not touched by this sweep was deleted or archived in Notion
+                conn.execute("DELETE FROM pages WHERE db_id = ? AND synced_at < ?",
+                             (_normalize_id(db_id), started_at))
+            conn.execute("""
+                INSERT INTO sync_state (db_id, last_edited_time, last_refresh_at, last_full_sync_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(db_id) DO UPDATE SET
+                    last_edited_time = excluded.last_edited_time,
+                    last_refresh_at = excluded.last_refresh_at,
+                    last_full_sync_at = COALESCE(excluded.last_full_sync_at, sync_state.last_full_sync_at)
+            """, (_normalize_id(db_id), newest_edit, time.time(), time.time() if full else None))
+            conn.commit()
+
+        logger.info(f"Notion mirror {'full' if full else 'incremental'} refresh: {seen} pages")
+        return seen
+
+def _background_refresh(token, db_id, full):
+    try:
+        refresh(token, db_id, full=full)
+    except Exception as e:
+        logger.warning(f"Background mirror refresh failed: {e}")
+
+def _initial_sync(token, db_id):
+    """The first full sync, inline. True if the mirror is usable afterwards."""
+    with _initial_sync_lock:
+        # Another worker may have finished the first sync while we waited
+        if _get_state(db_id) is not None:
+            return True
+        failed_at, failures = _initial_sync_failures.get(db_id, (0.0, 0))
+        backoff = min(MAX_INITIAL_SYNC_RETRY_SECONDS, INITIAL_SYNC_RETRY_SECONDS * 2 ** max(0, failures - 1))
+        if failures and time.time() - failed_at < backoff:
+            return False
+        try:
+            refresh(token, db_id, full=True)
+        except Exception as e:
+            _initial_sync_failures[db_id] = (time.time(), failures + 1)
+            logger.error(f"Initial Notion mirror sync failed ({failures + 1} in a row), next try in "
+                         f"{min(MAX_INITIAL_SYNC_RETRY_SECONDS, INITIAL_SYNC_RETRY_SECONDS * 2 ** failures)}s: {e}")
+            return False
+        _initial_sync_failures.pop(db_id, None)
+        return True
+
+def ensure_fresh(token, db_id):
+    """
+    Called before each duplicate check. Returns True if find_by_date can be trusted,
+    False if the mirror has never synced (use fetch_by_date instead).
+
+    The very first sync runs inline (we have nothing to check against yet), and after
+    a failure it isn't tried again on every gobble but backs off. After that, stale
+    mirrors are refreshed in the background so the gobble never waits on Notion.
+    """
+    state = _get_state(db_id)
+    if state is None:
+        return _initial_sync(token, db_id)
+
+    refresh_seconds = float(get_setting("notion_mirror_refresh_seconds", DEFAULT_REFRESH_SECONDS))
+    full_sync_seconds = float(get_setting("notion_mirror_full_sync_hours", DEFAULT_FULL_SYNC_HOURS)) * 3600
+    now = time.time()
+
+    full = now - (state.get("last_full_sync_at") or 0) > full_sync_seconds
+    if full or now - (state.get("last_refresh_at") or 0) > refresh_seconds:
+        if not _refresh_lock.locked():
+            threading.Thread(target=_background_refresh, args=(token, db_id, full),
+                             name="gobbla-notion-mirror", daemon=True).start()
+    return True
+
+def get_stats(db_id):
+    with _lock:
+        count = _get_conn().execute(
+            "SELECT COUNT(*) FROM pages WHERE db_id = ?", (_normalize_id(db_id),)
+        ).fetchone()[0]
+    return {"pages": count, "sync_state": _get_state(db_id)}
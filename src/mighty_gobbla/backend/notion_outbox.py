@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from settings import get_setting
+import metrics
+
+logger = logging.getLogger("MightyGobbla.NotionOutbox")
+
+# Notion page creations are queued here and sent by one background drainer, so a gobble
+# never waits on Notion (or fails because Notion is slow or rate limiting). The queue is
+# on disk: anything not yet sent is picked up again after a restart.
+OUTBOX_DB = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_notion_outbox.db")
+
+# Notion allows about 3 requests per second per integration
+DEFAULT_RATE_PER_SECOND = 3
+DEFAULT_MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 10 * 60
+# Worth another try; anything else (a 400 for a bad payload...) won't fix itself
+RETRYABLE_STATUS = (409, 429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_conn = None
+
+_thread = None
+_stop = threading.Event()
+_wake = threading.Event()
+_last_sent_at = 0.0
+# Set from Retry-After on a 429: nothing is sent before this, whichever entry it is
+_paused_until = 0.0
+
+def _get_conn():
+    """Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(OUTBOX_DB, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                db_id TEXT NOT NULL,
+                date_paid TEXT,
+                title TEXT,
+                vendor TEXT,
+                subtotal REAL,
+                payload TEXT NOT NULL,
+                history TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                page_url TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_date ON outbox(db_id, date_paid, status)")
+        _conn.commit()
+    return _conn
+
+def _text(prop, kind):
+    parts = (prop or {}).get(kind) or []
+    return parts[0]["text"]["content"] if parts else None
+
+def enqueue(payload, history_entry=None):
+    """
+    Queues a page creation (a build_expense_payload payload). history_entry, if given,
+    is {"filename", "details", "directory"} and is written to history once the page lands.
+    Returns the outbox id.
+    """
+    props = payload["properties"]
+    with _lock:
+        conn = _get_conn()
+        cursor = conn.execute(
+            "INSERT INTO outbox (db_id, date_paid, title, vendor, subtotal, payload, history, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (payload["parent"]["database_id"], props["Date Paid"]["date"]["start"],
+             _text(props.get("Expense Description"), "title"), _text(props.get("Vendor/Supplier"), "rich_text"),
+             props.get("Subtotal", {}).get("number"), json.dumps(payload),
+             json.dumps(history_entry) if history_entry else None, time.time(), time.time())
+        )
+        conn.commit()
+        outbox_id = cursor.lastrowid
+    start()
+    _wake.set()
+    return outbox_id
+
+def pending_for_date(db_id, iso_date):
+    """
+    Queued pages on iso_date, shaped like notion_mirror rows, so the duplicate check
+    also sees receipts that haven't reached Notion yet.
+    """
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT id, title, vendor, subtotal FROM outbox WHERE db_id = ? AND date_paid = ? AND status = 'pending'",
+            (db_id, iso_date)
+        ).fetchall()
+    return [{"title": row["title"], "vendor": row["vendor"], "subtotal": row["subtotal"], "tax": None,
+             "url": f"(queued for Notion, outbox #{row['id']})"} for row in rows]
+
+def get_stats():
+    with _lock:
+        conn = _get_conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        failed = conn.execute(
+            "SELECT id, title, attempts, last_error, created_at FROM outbox WHERE status = 'failed' ORDER BY id DESC LIMIT 20"
+        ).fetchall()
+    return {
+        "pending": counts.get("pending", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+        "paused_for_seconds": round(max(0.0, _paused_until - time.time()), 1),
+        "recent_failures": [dict(row) for row in failed]
+    }
+
+def retry_failed():
+    """Puts every failed entry back in the queue. Returns how many."""
+    with _lock:
+        conn = _get_conn()
+        count = conn.execute(
+            "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+            (time.time(),)
+        ).rowcount
+        conn.commit()
+    _wake.set()
+    return count
+
+def _collect_outbox_metrics():
+    with _lock:
+        counts = dict(_get_conn().execute("SELECT status, COUNT(*) FROM outbox WHERE status != 'done' GROUP BY status").fetchall())
+    return [("gobbla_notion_outbox_entries", "gauge", "Notion writes waiting in the outbox, and ones that gave up.",
+             [({"status": status}, counts.get(status, 0)) for status in ("pending", "failed")])]
+
+metrics.register_collector(_collect_outbox_metrics)
+
+# --- Drainer ---
+
+def start():
+    """Starts the drainer thread if it isn't running. Safe to call any number of times."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=metrics.with_source("notion_outbox", _drain_loop),
+                                   name="gobbla-notion-outbox", daemon=True)
+        _thread.start()
+
+def stop():
+    _stop.set()
+    _wake.set()
+
+def _next_due():
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+            (time.time(),)
+        ).fetchone()
+        if row is None:
+            upcoming = _get_conn().execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+            return None, upcoming
+    return dict(row), None
+
+def _throttle():
+    """Waits out the rate limit (and any Retry-After pause). False if stopping."""
+    rate = float(get_setting("notion_rate_per_second", DEFAULT_RATE_PER_SECOND))
+    ready_at = max(_last_sent_at + 1.0 / max(rate, 0.01), _paused_until)
+    delay = ready_at - time.time()
+    return not (delay > 0 and _stop.wait(delay))
+
+def _retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None # HTTP-date form; the backoff will do
+
+def _drain_loop():
+    while not _stop.is_set():
+        try:
+            entry, upcoming = _next_due()
+        except Exception as e:
+            logger.error(f"Outbox read failed: {e}")
+            _stop.wait(5)
+            continue
+
+        if entry is None:
+            # Sleep until the next retry is due or something new is queued
+            _wake.wait(timeout=min(60.0, max(0.1, upcoming - time.time())) if upcoming else 60.0)
+            _wake.clear()
+            continue
+
+        try:
+            if not _throttle():
+                break
+            _send(entry)
+        except Exception as e:
+            # Anything unexpected: log it and retry the entry later, but keep the drainer alive
+            logger.exception(f"Outbox #{entry['id']} crashed the drainer: {e}")
+            try:
+                _retry_or_give_up(entry, f"Drainer error: {e}")
+            except Exception:
+                logger.exception(f"Could not reschedule outbox #{entry['id']}")
+                _stop.wait(5)
+
+def _send(entry):
+    global _last_sent_at
+    from notion_integration import create_expense_page, get_notion_headers
+
+    token = get_setting("notion_token")
+    _last_sent_at = time.time()
+    try:
+        if not token:
+            raise RuntimeError("Notion token missing in settings")
+        result = create_expense_page(get_notion_headers(token), json.loads(entry["payload"]))
+    except Exception as e:
+        result = {"status": "error", "message": str(e), "code": None}
+
+    if result["status"] == "success":
+        _mark_done(entry, result.get("url"))
+        return
+    _retry_or_give_up(entry, result.get("message"), result.get("code"), result.get("retry_after"))
+
+def _retry_or_give_up(entry, message, code=None, retry_after=None):
+    """Schedules the next attempt with backoff, or marks the entry failed if it's hopeless or out of attempts."""
+    global _paused_until
+    attempts = entry["attempts"] + 1
+    max_attempts = int(get_setting("notion_outbox_max_attempts", DEFAULT_MAX_ATTEMPTS))
+    if (code is not None and code not in RETRYABLE_STATUS) or attempts >= max_attempts:
+        logger.error(f"Giving up on outbox #{entry['id']} ({entry['title']}) after {attempts} attempts: {message}")
+        _update(entry["id"], status="failed", attempts=attempts, last_error=message)
+        return
+
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
+    retry_after = _retry_after_seconds(retry_after)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    if code == 429:
+        # The limit is per integration, so every queued write has to back off, not just this one
+        _paused_until = time.time() + (retry_after if retry_after is not None else delay)
+    logger.warning(f"Outbox #{entry['id']} failed ({code or message}), retry {attempts} in {delay:.1f}s")
+    _update(entry["id"], attempts=attempts, last_error=message, next_attempt_at=time.time() + delay)
+
+def _mark_done(entry, page_url):
+    _update(entry["id"], status="done", attempts=entry["attempts"] + 1, page_url=page_url, sent_at=time.time(), last_error=None)
+    if not entry["history"]:
+        return
+    # History only lists receipts that made it to Notion (same rule as before the outbox)
+    try:
+        from history import add_history_entry
+        history = json.loads(entry["history"])
+        details = dict(history["details"], notion_url=page_url)
+        add_history_entry(history["filename"], details, directory=history.get("directory"))
+    except Exception as e:
+        logger.error(f"Page for outbox #{entry['id']} landed but history write failed: {e}")
+
+def _update(outbox_id, **fields):
+    with _lock:
+        conn = _get_conn()
+        conn.execute(f"UPDATE outbox SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?",
+                     list(fields.values()) + [outbox_id])
+        conn.commit()
@@ -0,0 +1,66 @@
+import logging
+from pypdf import PdfReader, PdfWriter
+from settings import get_setting
+
+logger = logging.getLogger("MightyGobbla.PdfSplit")
+
+# PDFs this long are treated as a stack of receipts (statements, vendor bundles);
+# shorter ones are one receipt that may run onto a second page
+DEFAULT_SPLIT_MIN_PAGES = 3
+DEFAULT_PAGES_PER_RECEIPT = 1
+
+# Extractions that mean "nothing read", never merged with a neighbour
+FAILED_STORES = ("Error", "FileError")
+
+def count_pages(file_path):
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception as e:
+        logger.warning(f"Could not read page count of {file_path}: {e}")
+        return 0
+
+def should_split(file_path):
+    """True for PDFs long enough to be several receipts."""
+    if not file_path.lower().endswith(".pdf") or not get_setting("pdf_split_enabled", True):
+        return False
+    min_pages = int(get_setting("pdf_split_min_pages", DEFAULT_SPLIT_MIN_PAGES))
+    return count_pages(file_path) >= max(2, min_pages)
+
+def page_groups(page_count):
+    """Splits page indexes into groups of pdf_pages_per_receipt, e.g. [[0], [1], [2]]."""
+    per_receipt = max(1, int(get_setting("pdf_pages_per_receipt", DEFAULT_PAGES_PER_RECEIPT)))
+    return [list(range(start, min(start + per_receipt, page_count)))
+            for start in range(0, page_count, per_receipt)]
+
+def write_pages(reader, pages, dest_path):
+    """Writes the given page indexes of reader to a new PDF at dest_path."""
+    writer = PdfWriter()
+    for index in pages:
+        writer.add_page(reader.pages[index])
+    with open(dest_path, "wb") as f:
+        writer.write(f)
+    return dest_path
+
+def page_label(pages):
+    """1-based, e.g. "p3" or "p3-4"."""
+    first, last = pages[0] + 1, pages[-1] + 1
+    return f"p{first}" if first == last else f"p{first}-{last}"
+
+def _same_receipt(a, b):
+    if a.get("store") in FAILED_STORES or b.get("store") in FAILED_STORES:
+        return False
+    return all(str(a.get(key)).lower() == str(b.get(key)).lower() for key in ("date", "store", "amount"))
+
+def merge_continued_receipts(groups, extractions):
+    """
+    Joins neighbouring page groups that read as the same receipt (same date, store and
+    amount), i.e. one receipt that ran over a page break.
+    Returns [(pages, extraction), ...].
+    """
+    receipts = []
+    for pages, data in zip(groups, extractions):
+        if receipts and _same_receipt(receipts[-1][1], data):
+            receipts[-1][0].extend(pages)
+        else:
+            receipts.append((list(pages), data))
+    return receipts
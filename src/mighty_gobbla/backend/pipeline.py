@@ -0,0 +1,453 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import wait, FIRST_COMPLETED
+from pypdf import PdfReader
+from executor import get_executor, get_page_executor
+from processor import process_document, process_documents, DEFAULT_EXTRACTION_BATCH_SIZE, MAX_EXTRACTION_BATCH_SIZE
+from history import add_history_entry
+from settings import get_setting
+import manifest
+import pdf_split
+import metrics
+import progress
+import previews
+import blobstore
+
+logger = logging.getLogger("MightyGobbla.Pipeline")
+
+# Extensions we know how to gobble
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pdf')
+
+# Files in flight at once for /process_folder, unless overridden per request
+DEFAULT_FOLDER_CONCURRENCY = 4
+MAX_FOLDER_CONCURRENCY = 16
+
+# Store names process_document puts on a file it couldn't read at all (every model failed / unreadable)
+EXTRACTION_FAILED_STORES = ("Error", "FileError")
+
+# Renames probe the filesystem for collisions, so only one thread may pick a name at a time
+_rename_lock = threading.Lock()
+
+def build_base_name(processed_info):
+    """Format: YYMMDD-Store-Payment"""
+    base_new_name = f"{processed_info['date']}-{processed_info['store']}-{processed_info['payment']}"
+    return base_new_name.replace("/", "").replace(":", "")
+
+def rename_to_convention(file_path, processed_info):
+    """
+    Renames file_path in its own folder to the naming convention.
+    Returns (new_name, new_path).
+    """
+    root = os.path.dirname(file_path)
+    ext = os.path.splitext(file_path)[1]
+    base_new_name = build_base_name(processed_info)
+
+    with metrics.stage("rename"), _rename_lock:
+        new_name = f"{base_new_name}{ext}"
+        new_path = os.path.join(root, new_name)
+
+        # Collision Handling
+        counter = 1
+        while os.path.exists(new_path) and new_path != file_path:
+            new_name = f"{base_new_name}_{counter}{ext}"
+            new_path = os.path.join(root, new_name)
+            counter += 1
+
+        if file_path != new_path:
+            os.rename(file_path, new_path)
+            logger.info(f"Renamed {file_path} -> {new_path}")
+
+    return new_name, new_path
+
+def sync_and_record(new_name, processed_info, directory):
+    """
+    Sends the entry to Notion (if enabled) and writes history.
+    Returns (notion_result, history_added).
+
+    With Notion on, the page is only queued (notion_result status "queued"); history is
+    written by the outbox drainer once the page lands, so history_added is False here.
+    """
+    notion_result = None
+    history_added = False
+    if get_setting("notion_enabled"):
+        from notion_integration import add_to_notion_expenses
+        notion_result = add_to_notion_expenses(
+            processed_info, {"filename": new_name, "details": processed_info, "directory": directory})
+    else:
+        # If Notion disabled, we just log it as processed locally
+        add_history_entry(new_name, processed_info, directory=directory)
+        history_added = True
+
+    return notion_result, history_added
+
+def gobble_file(file_path, directory=None, original=None, public_url_base=None, content_hash=None):
+    """
+    Runs one file through extraction -> rename -> Notion -> history.
+
+    directory is what gets recorded in history (defaults to the file's folder).
+    public_url_base is the site's public address; when given, absolute URLs of the
+    stored receipt and its preview are built for Notion.
+    content_hash is the file's SHA-256 if the caller already computed it.
+    Returns the result object the endpoints send back to the UI.
+
+    Long PDFs are split into one receipt per page (group); see gobble_pdf_receipts.
+    """
+    if pdf_split.should_split(file_path):
+        return gobble_pdf_receipts(file_path, directory, original, public_url_base)
+
+    try:
+        processed_info = process_document(file_path, content_hash=content_hash)
+    except Exception as e:
+        original = original or os.path.basename(file_path)
+        logger.error(f"Failed to gobble {original}: {e}")
+        return {"original": original, "status": "error", "message": str(e)}
+
+    return finish_gobble(file_path, processed_info, directory, original, public_url_base)
+
+def gobble_upload(incoming_path, original, public_url_base=None, content_hash=None):
+    """Moves a saved upload into the blob store (see blobstore.py), then gobbles it."""
+    try:
+        file_path = blobstore.put(incoming_path, content_hash)
+    except Exception as e:
+        logger.error(f"Failed to store {original}: {e}")
+        return {"original": original, "status": "error", "message": str(e)}
+    return gobble_file(file_path, directory="Mobile Upload", original=original,
+                       public_url_base=public_url_base, content_hash=content_hash)
+
+def finish_gobble(file_path, processed_info, directory=None, original=None, public_url_base=None):
+    """Everything after extraction: rename -> Notion -> history. Same arguments and result as gobble_file."""
+    original = original or os.path.basename(file_path)
+    directory = directory or os.path.dirname(file_path)
+    if extraction_failed(processed_info):
+        return _failed_result(original, processed_info)
+    progress.emit("extracted", file_path, name=original,
+                  data={key: processed_info.get(key) for key in ("date", "store", "payment", "amount")})
+
+    try:
+        stored = blobstore.is_blob(file_path)
+        if stored:
+            # Stored by content hash: the readable name is only metadata, nothing moves
+            with metrics.stage("rename"):
+                new_name = blobstore.add_name(file_path, build_base_name(processed_info), original)
+            new_path = file_path
+        else:
+            new_name, new_path = rename_to_convention(file_path, processed_info)
+        progress.emit("renamed", file_path, name=original, new=new_name)
+
+        # Small copies for the history list and Notion (see previews.py)
+        preview_urls = previews.generate(new_path)
+        if preview_urls:
+            processed_info['thumbnail_url'] = preview_urls['thumb']
+            processed_info['display_url'] = preview_urls['display']
+
+        if public_url_base:
+            if stored:
+                processed_info['file_url'] = urljoin(f"{public_url_base}/", blobstore.url_path(new_path, new_name))
+            if preview_urls:
+                # Notion embeds the display-size copy; the property still links the original
+                processed_info['image_url'] = urljoin(f"{public_url_base}/", preview_urls['display'])
+        processed_info['filename'] = new_name # Renamed filename for Notion
+
+        notion_result, history_added = sync_and_record(new_name, processed_info, directory)
+        progress.emit("notion", file_path, name=original, new=new_name, notion_status=notion_result, history_added=history_added)
+
+        return {
+            "original": original,
+            "new": new_name,
+            "status": "gobbled",
+            "data": processed_info,
+            "notion_status": notion_result,
+            "history_added": history_added
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to gobble {original}: {e}")
+        return {"original": original, "status": "error", "message": str(e)}
+
+def hash_file(file_path):
+    sha256 = hashlib.sha256()
+    with metrics.stage("hash"), open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def gobble_pdf_receipts(file_path, directory=None, original=None, public_url_base=None):
+    """
+    Gobbles a multi-receipt PDF: every page group is extracted in parallel, neighbours
+    that turn out to be the same receipt are joined, and each receipt is written out as
+    its own PDF next to the original and goes through rename -> Notion -> history.
+    The original PDF is left as it is.
+
+    Returns the first receipt's result with every receipt's result under "receipts".
+    """
+    original = original or os.path.basename(file_path)
+    directory = directory or os.path.dirname(file_path)
+
+    try:
+        reader = PdfReader(file_path)
+        groups = pdf_split.page_groups(len(reader.pages))
+        logger.info(f"Splitting {original} into {len(groups)} parts")
+        progress.emit("split", file_path, name=original, parts=len(groups))
+
+        # Extract from throwaway copies so nothing half-done lands in the user's folder
+        with tempfile.TemporaryDirectory(prefix="gobbla-pdf-") as tmp_dir:
+            part_paths = [pdf_split.write_pages(reader, pages, os.path.join(tmp_dir, f"{pdf_split.page_label(pages)}.pdf"))
+                          for pages in groups]
+            extract = metrics.carry_context(process_document)
+            futures = [get_page_executor().submit(extract, part_path) for part_path in part_paths]
+            extractions = [future.result() for future in futures]
+    except Exception as e:
+        logger.error(f"Failed to gobble {original}: {e}")
+        return {"original": original, "status": "error", "message": str(e)}
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    folder = os.path.dirname(file_path)
+    # Receipts split out of an upload go into the blob store, not next to it
+    stored = blobstore.is_blob(file_path)
+    results = []
+    for pages, processed_info in pdf_split.merge_continued_receipts(groups, extractions):
+        label = pdf_split.page_label(pages)
+        if extraction_failed(processed_info):
+            # Nothing is written out for a part no model could read
+            results.append(_failed_result(f"{original} ({label})", processed_info))
+            continue
+        try:
+            if stored:
+                receipt_path = blobstore.put(pdf_split.write_pages(reader, pages, blobstore.incoming_path(f"{stem}_{label}.pdf")))
+            else:
+                receipt_path = pdf_split.write_pages(reader, pages, os.path.join(folder, f"{stem}_{label}.pdf"))
+        except Exception as e:
+            logger.error(f"Failed to write {label} of {original}: {e}")
+            results.append({"original": f"{original} ({label})", "status": "error", "message": str(e)})
+            continue
+
+        result = finish_gobble(receipt_path, processed_info, directory, f"{original} ({label})", public_url_base)
+        if result["status"] == "gobbled" and not stored:
+            # So folder runs and the watcher see the split-out receipts as done
+            new_path = os.path.join(folder, result["new"])
+            manifest.record(folder, new_path, hash_file(new_path), status="gobbled")
+        results.append(result)
+
+    gobbled = [result for result in results if result["status"] == "gobbled"]
+    if not gobbled:
+        return {"original": original, "status": "error",
+                "message": "; ".join(result.get("message", "") for result in results) or "No pages",
+                "receipts": results}
+    return {**gobbled[0], "original": original, "receipts": results}
+
+def _already_gobbled(file_path, folder, content_hash):
+    """The skip result if these exact bytes were gobbled before (a copy, or a file only touched since)."""
+    previous = manifest.find_by_hash(content_hash)
+    if not previous:
+        return None
+    manifest.record(folder, file_path, content_hash)
+    return {
+        "original": os.path.basename(file_path),
+        "status": "skipped",
+        "message": f"Already gobbled as {os.path.basename(previous['path'])}"
+    }
+
+def extraction_failed(processed_info):
+    """True for the placeholder processor hands back when no model (or the file read) worked."""
+    return (processed_info or {}).get("store") in EXTRACTION_FAILED_STORES
+
+def _failed_result(original, processed_info):
+    """
+    The result for a file no model could read. It isn't renamed, synced or put in history,
+    so a later retry that works is the only entry.
+    """
+    logger.warning(f"Couldn't read {original}: {processed_info.get('raw_text_debug', processed_info['store'])}")
+    message = "The file couldn't be read" if processed_info["store"] == "FileError" else "No model could read the receipt"
+    return {"original": original, "status": "error", "message": message, "data": processed_info}
+
+def _error_status(result):
+    # A file no model could read is "failed", not done: the next folder run retries it
+    failures = result.get("receipts") or [result]
+    return "failed" if all(extraction_failed(failure.get("data")) for failure in failures) else "error"
+
+def _record_result(file_path, folder, content_hash, result):
+    if result.get("receipts") and result["status"] == "gobbled":
+        # Split PDF: the receipts recorded themselves, the original stays where it was
+        manifest.record(folder, file_path, content_hash, status="gobbled")
+    elif result["status"] == "gobbled":
+        manifest.record(folder, os.path.join(os.path.dirname(file_path), result["new"]), content_hash, status="gobbled")
+    else:
+        # Recorded so an unchanged broken file isn't retried every run; editing it retries
+        manifest.record(folder, file_path, content_hash, status=_error_status(result))
+    return result
+
+def gobble_new_file(file_path, folder, content_hash=None, force=False):
+    """
+    gobble_file plus manifest bookkeeping, for folder runs and the watcher.
+
+    Files whose exact bytes were already gobbled are skipped unless force is set.
+    Whatever happens, the manifest is updated so the next run can skip this path on
+    size/mtime alone.
+    """
+    content_hash = content_hash or hash_file(file_path)
+    skipped = None if force else _already_gobbled(file_path, folder, content_hash)
+    if skipped:
+        return skipped
+    return _record_result(file_path, folder, content_hash, gobble_file(file_path, content_hash=content_hash))
+
+def gobble_new_files(file_paths, folder, force=False):
+    """
+    gobble_new_file for several files at once, with a single batched extraction
+    request for all of them. Returns one result per file, in order.
+    """
+    results = [None] * len(file_paths)
+    to_extract = [] # (index, file_path, content_hash)
+    # Per-file timing breakdown, only filled in when traced (debug mode)
+    timings = [[] for _ in file_paths]
+    elapsed = [0.0] * len(file_paths)
+
+    for i, file_path in enumerate(file_paths):
+        progress.emit("started", file_path, name=os.path.basename(file_path))
+        start = time.perf_counter()
+        with metrics.trace_section() as timings[i]:
+            try:
+                content_hash = hash_file(file_path)
+            except OSError as e:
+                logger.error(f"Failed to gobble {os.path.basename(file_path)}: {e}")
+                results[i] = {"original": os.path.basename(file_path), "status": "error", "message": str(e)}
+                continue
+            results[i] = None if force else _already_gobbled(file_path, folder, content_hash)
+            if results[i] is None:
+                if pdf_split.should_split(file_path):
+                    # Its pages are extracted in parallel on their own, not batched with other files
+                    results[i] = _record_result(file_path, folder, content_hash, gobble_file(file_path))
+                else:
+                    to_extract.append((i, file_path, content_hash))
+        elapsed[i] += time.perf_counter() - start
+
+    if not to_extract:
+        return _batch_done(file_paths, results, timings, elapsed)
+
+    start = time.perf_counter()
+    with metrics.trace_section() as batch_timings:
+        try:
+            extracted = process_documents([path for _, path, _ in to_extract],
+                                          [content_hash for _, _, content_hash in to_extract])
+        except Exception as e:
+            logger.error(f"Batch extraction failed: {e}")
+            extracted = None
+            for i, file_path, _ in to_extract:
+                results[i] = {"original": os.path.basename(file_path), "status": "error", "message": str(e)}
+    batch_seconds = time.perf_counter() - start
+    # Every file in the batch waited on the whole request
+    for i, _, _ in to_extract:
+        timings[i] += [dict(entry, shared_by=len(to_extract)) for entry in batch_timings] if len(to_extract) > 1 else batch_timings
+        elapsed[i] += batch_seconds
+
+    if extracted is None:
+        return _batch_done(file_paths, results, timings, elapsed)
+
+    for (i, file_path, content_hash), processed_info in zip(to_extract, extracted):
+        start = time.perf_counter()
+        with metrics.trace_section() as finish_timings:
+            results[i] = _record_result(file_path, folder, content_hash, finish_gobble(file_path, processed_info))
+        timings[i] += finish_timings
+        elapsed[i] += time.perf_counter() - start
+    return _batch_done(file_paths, results, timings, elapsed)
+
+def _batch_done(file_paths, results, timings, elapsed):
+    """
+    Attaches each file's own timing breakdown in debug mode (see metrics.traced)
+    and reports the results to the live progress stream.
+    """
+    tracing = metrics.tracing()
+    for file_path, result, file_timings, seconds in zip(file_paths, results, timings, elapsed):
+        if tracing:
+            result["timings"] = file_timings
+            result["total_ms"] = round(seconds * 1000, 1)
+        progress.emit("result", file_path, result=result)
+    return results
+
+def iter_folder_files(folder_path):
+    """Lazily yields every supported file under folder_path."""
+    for root, _, files in os.walk(folder_path):
+        for filename in files:
+            # Filter extensions
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, filename)
+
+def gobble_folder(folder_path, concurrency=None, force=False, summary=None, batch_size=None, timings=False, run_id=None):
+    """
+    Gobbles every new or changed supported file under folder_path, yielding each
+    result as soon as it finishes (completion order, not walk order).
+
+    Files the manifest already has at the same size and mtime are skipped without
+    being read; force=True reprocesses everything. If a summary dict is passed it is
+    filled with counts (seen, unchanged, skipped, gobbled, errors) as the run goes.
+
+    Files are extracted batch_size at a time in one model request (1 = a request per
+    file), and at most `concurrency` of those requests are in flight. The walk only
+    advances as slots free up, so memory stays flat no matter how big the folder is.
+
+    timings=True adds each file's stage timing breakdown to its result (debug mode).
+    With a run_id, per-file progress is published to that run (see progress.py).
+    """
+    if not concurrency:
+        concurrency = int(get_setting("folder_concurrency", DEFAULT_FOLDER_CONCURRENCY))
+    concurrency = max(1, min(concurrency, MAX_FOLDER_CONCURRENCY))
+    if not batch_size:
+        batch_size = int(get_setting("extraction_batch_size", DEFAULT_EXTRACTION_BATCH_SIZE))
+    batch_size = max(1, min(batch_size, MAX_EXTRACTION_BATCH_SIZE))
+
+    if summary is None:
+        summary = {}
+    summary.update(seen=0, unchanged=0, skipped=0, gobbled=0, errors=0)
+
+    # One query up front instead of one per file
+    known = {} if force else manifest.get_tree_entries(folder_path)
+
+    def finished(future):
+        for result in future.result():
+            status = result["status"]
+            summary[status if status in ("gobbled", "skipped") else "errors"] += 1
+            yield result
+
+    pool = get_executor()
+    gobble_batch = metrics.with_source("folder", metrics.traced(gobble_new_files) if timings else gobble_new_files)
+    if run_id:
+        gobble_batch = progress.bind(run_id, gobble_batch)
+    in_flight = set()
+    batch = []
+    try:
+        for file_path in iter_folder_files(folder_path):
+            summary["seen"] += 1
+            if not force:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                if known.get(manifest.normalize_path(file_path)) == (st.st_size, st.st_mtime_ns):
+                    summary["unchanged"] += 1
+                    continue
+
+            batch.append(file_path)
+            if len(batch) < batch_size:
+                continue
+            in_flight.add(pool.submit(gobble_batch, batch, folder_path, force=force))
+            batch = []
+            if len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from finished(future)
+
+        if batch:
+            in_flight.add(pool.submit(gobble_batch, batch, folder_path, force=force))
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from finished(future)
+    finally:
+        # Client went away mid-run: don't start files nobody will see
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,131 @@
+import io
+import logging
+from PIL import Image, ImageOps
+from settings import get_setting
+import metrics
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger("MightyGobbla.Preprocess")
+
+# Long edge in pixels; plenty for Gemini to read a receipt
+DEFAULT_MAX_DIMENSION = 1600
+DEFAULT_QUALITY = 80
+DEFAULT_FORMAT = "JPEG"
+# Receipts rarely run past the second page
+DEFAULT_PDF_MAX_PAGES = 2
+
+# Crop detection runs on a small working copy for speed
+CROP_WORK_DIMENSION = 800
+# Ignore "receipts" that are tiny specks or already fill the frame
+MIN_CROP_AREA_RATIO = 0.15
+MAX_CROP_AREA_RATIO = 0.95
+CROP_MARGIN_RATIO = 0.02
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+def find_receipt_box(gray):
+    """
+    Finds the bounding box of the receipt (the largest bright blob) in a grayscale PIL image.
+    Returns (left, top, right, bottom) in the image's coordinates, or None.
+    """
+    if cv2 is None:
+        return None
+
+    scale = min(1.0, CROP_WORK_DIMENSION / max(gray.size))
+    work = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))))
+    arr = cv2.GaussianBlur(np.array(work), (5, 5), 0)
+
+    # Receipt paper is brighter than the table it sits on
+    _, mask = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    area_ratio = (w * h) / float(work.width * work.height)
+    if area_ratio < MIN_CROP_AREA_RATIO or area_ratio > MAX_CROP_AREA_RATIO:
+        return None
+
+    margin_x = int(work.width * CROP_MARGIN_RATIO)
+    margin_y = int(work.height * CROP_MARGIN_RATIO)
+    left = max(0, x - margin_x) / scale
+    top = max(0, y - margin_y) / scale
+    right = min(work.width, x + w + margin_x) / scale
+    bottom = min(work.height, y + h + margin_y) / scale
+    return (int(left), int(top), int(right), int(bottom))
+
+def preprocess_image(image):
+    """
+    EXIF rotate -> auto-crop -> grayscale -> downscale -> re-encode.
+    Takes a PIL image, returns (bytes, mime_type).
+    """
+    max_dimension = int(get_setting("preprocess_max_dimension", DEFAULT_MAX_DIMENSION))
+    quality = int(get_setting("preprocess_quality", DEFAULT_QUALITY))
+    fmt = str(get_setting("preprocess_format", DEFAULT_FORMAT)).upper()
+    if fmt not in MIME_TYPES:
+        fmt = DEFAULT_FORMAT
+
+    image = ImageOps.exif_transpose(image)
+    gray = image.convert("L")
+
+    box = find_receipt_box(gray)
+    if box:
+        gray = gray.crop(box)
+
+    gray.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    out = io.BytesIO()
+    gray.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue(), MIME_TYPES[fmt]
+
+def rasterize_pdf(file_data):
+    """Renders only the first few pages of a PDF. Returns a list of PIL images."""
+    from pdf2image import convert_from_bytes
+    from pypdf import PdfReader
+
+    max_pages = int(get_setting("preprocess_pdf_max_pages", DEFAULT_PDF_MAX_PAGES))
+    page_count = len(PdfReader(io.BytesIO(file_data)).pages)
+    last_page = max(1, min(page_count, max_pages))
+
+    # Render at roughly the resolution we downscale to anyway
+    return convert_from_bytes(file_data, dpi=150, first_page=1, last_page=last_page)
+
+def prepare_parts(file_data, mime_type):
+    """
+    Turns raw file bytes into the content parts sent to Gemini.
+    Falls back to the original bytes whenever preprocessing fails or doesn't help.
+    """
+    with metrics.stage("preprocess"):
+        return _prepare_parts(file_data, mime_type)
+
+def _prepare_parts(file_data, mime_type):
+    original = [{'mime_type': mime_type, 'data': file_data}]
+    if not get_setting("preprocess_enabled", True):
+        return original
+
+    try:
+        if mime_type == "application/pdf":
+            parts = []
+            for page in rasterize_pdf(file_data):
+                data, page_mime = preprocess_image(page)
+                parts.append({'mime_type': page_mime, 'data': data})
+        else:
+            data, new_mime = preprocess_image(Image.open(io.BytesIO(file_data)))
+            parts = [{'mime_type': new_mime, 'data': data}]
+    except Exception as e:
+        # Missing poppler, odd image formats, etc. The model can still read the original.
+        logger.warning(f"Preprocessing failed, sending original: {e}")
+        return original
+
+    sent = sum(len(part['data']) for part in parts)
+    if sent >= len(file_data):
+        return original
+
+    logger.info(f"Preprocessed payload: {len(file_data)} -> {sent} bytes")
+    return parts
@@ -0,0 +1,88 @@
+import io
+import os
+import re
+import uuid
+import hashlib
+import logging
+from PIL import Image, ImageOps
+from settings import get_setting
+import metrics
+
+logger = logging.getLogger("MightyGobbla.Previews")
+
+# Small copies of each receipt, made at ingest, so the history list and Notion pages don't
+# pull the full-size upload every time. Named by the SHA-256 of the receipt's bytes: a
+# preview URL always means the same image, so browsers and Notion may cache it forever.
+PREVIEWS_DIR = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_previews")
+
+# variant -> (long edge in pixels, JPEG quality)
+VARIANTS = {
+    "thumb": (320, 70),     # History list
+    "display": (1280, 82)   # Notion page image, history "open"
+}
+
+PDF_RENDER_DPI = 100
+
+_NAME_RE = re.compile(r"^[0-9a-f]{64}_(thumb|display)\.jpg$")
+
+def preview_name(content_hash, variant):
+    return f"{content_hash}_{variant}.jpg"
+
+def preview_path(name):
+    """Where a preview lives on disk, or None if name isn't a preview name."""
+    if not _NAME_RE.match(name):
+        return None
+    # Sharded by hash prefix so no single directory gets huge
+    return os.path.join(PREVIEWS_DIR, name[:2], name)
+
+def _render(file_data, file_path):
+    """The receipt as an upright RGB image (first page for PDFs)."""
+    if file_path.lower().endswith(".pdf"):
+        from pdf2image import convert_from_bytes
+        image = convert_from_bytes(file_data, dpi=PDF_RENDER_DPI, first_page=1, last_page=1)[0]
+    else:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(file_data)))
+    return image.convert("RGB")
+
+def _write(image, path, size, quality):
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so a half-written file is never served under the final name.
+    # Unique per call: two copies of the same receipt may be gobbled at once.
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        image.save(tmp_path, format="JPEG", quality=quality, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def generate(file_path):
+    """
+    Makes the thumb and display variants of a receipt, unless they exist already.
+    Returns {"thumb": "/previews/<name>", "display": "/previews/<name>"}, or None when
+    previews are off or the file can't be rendered (e.g. a PDF without poppler).
+    """
+    if not get_setting("previews_enabled", True):
+        return None
+
+    with metrics.stage("previews"):
+        try:
+            with open(file_path, "rb") as f:
+                file_data = f.read()
+            content_hash = hashlib.sha256(file_data).hexdigest()
+
+            image = None
+            urls = {}
+            for variant, (size, quality) in VARIANTS.items():
+                name = preview_name(content_hash, variant)
+                path = preview_path(name)
+                if not os.path.exists(path):
+                    image = image or _render(file_data, file_path)
+                    _write(image, path, size, quality)
+                urls[variant] = f"/previews/{name}"
+            return urls
+        except Exception as e:
+            logger.warning(f"No preview for {os.path.basename(file_path)}: {e}")
+            return None
@@ -1,9 +1,18 @@
 import os
-import json
+import time
+import hashlib
 import logging
 from datetime import datetime
 import google.generativeai as genai
 from settings import get_setting
+import extraction_cache
+import extraction_stats
+import gemini_limiter
+import local_ocr
+import metrics
+import receipt_schema
+from model_registry import ModelRegistry
+from preprocess import prepare_parts
 
 # Setup Logger
 logger = logging.getLogger("MightyGobbla.Gemini")
@@ -20,6 +29,59 @@ try:
 except Exception as e:
     logger.error(f"Failed to configure Gemini: {e}")
 
+# Bump PROMPT_VERSION whenever EXTRACTION_PROMPT (or receipt_schema) changes so cached extractions are not reused
+PROMPT_VERSION = "2"
+# The answer's shape is enforced by receipt_schema.RECEIPT_SCHEMA (response_schema), the prompt says what goes in it
+EXTRACTION_PROMPT = """
+        You are an expert receipt scanner AI. 
+        Analyze this image and extract the following fields:
+        
+        {
+            "date": "YYMMDD", (Format YearMonthDay, e.g. 241109 for Nov 9, 2024. Use file date if unknown, but prefer receipt date).
+            "store": "StoreName", (Capitalized, Short. E.g. 'Kroger', 'Walmart', 'Shell'. Identify logos correctly).
+            "payment": "Method", (E.g. 'Card-1234', 'Cash', 'Amex-1002'. Look for 'Ending in', 'VISA', asterisk masking).
+            "amount": 12.34 (The TOTAL amount paid. Look for 'Total', 'Balance', 'Amount Charged').
+        }
+        
+        If you are unsure of the date, use today's date.
+        If you are unsure of the store, guess based on items or header.
+        """
+
+# Several receipts in one request: each one's images follow a "Receipt i of N" marker.
+# Answers share the single-file cache, so keep the fields identical to EXTRACTION_PROMPT.
+BATCH_EXTRACTION_PROMPT = """
+        You are an expert receipt scanner AI.
+        You were given several receipts above. Each one starts with a "Receipt i of N" line,
+        followed by its image(s). Extract each receipt separately.
+
+        Return exactly one object per receipt, in the same order:
+
+        [
+            {
+                "index": 0, (The i from that receipt's "Receipt i of N" line).
+                "date": "YYMMDD", (Format YearMonthDay, e.g. 241109 for Nov 9, 2024).
+                "store": "StoreName", (Capitalized, Short. E.g. 'Kroger', 'Walmart', 'Shell'. Identify logos correctly).
+                "payment": "Method", (E.g. 'Card-1234', 'Cash', 'Amex-1002'. Look for 'Ending in', 'VISA', asterisk masking).
+                "amount": 12.34 (The TOTAL amount paid. Look for 'Total', 'Balance', 'Amount Charged').
+            }
+        ]
+
+        Never mix up details between receipts.
+        """
+
+# Sent (with the receipt again) when some fields of an answer didn't validate:
+# only those fields are asked for, on the same model, instead of starting over on the next one.
+FIELD_RETRY_PROMPT = """
+        You are an expert receipt scanner AI.
+        An earlier reading of this receipt got these fields wrong:
+{problems}
+        Look at the receipt again and return only these fields: {fields}.
+        """
+
+# Receipts per request in batch mode; 1 means one call per file
+DEFAULT_EXTRACTION_BATCH_SIZE = 1
+MAX_EXTRACTION_BATCH_SIZE = 10
+
 def list_available_models():
     """List all models supporting generateContent."""
     try:
@@ -32,95 +94,192 @@ def list_available_models():
         logger.error(f"Could not list models: {e}")
         return []
 
-def process_document(file_path):
+# Candidate models to try in order of preference
+# Updated based on server logs showing 2.0/2.5 availability
+CANDIDATE_MODELS = [
+    "gemini-2.0-flash",
+    "gemini-2.5-flash",
+    "gemini-flash-latest",
+    "models/gemini-1.5-flash"
+]
+
+# Shared across every request so each file goes straight to a model that works
+registry = ModelRegistry(CANDIDATE_MODELS, list_available_models)
+
+def read_document(file_path):
+    """Returns (file_data, mime_type)."""
+    ext = os.path.splitext(file_path)[1].lower()
+    mime_type = "image/jpeg"
+    if ext == ".png": mime_type = "image/png"
+    elif ext == ".pdf": mime_type = "application/pdf"
+
+    with metrics.stage("file_read"), open(file_path, "rb") as f:
+        return f.read(), mime_type
+
+def generate(model_name, contents, schema):
     """
-    Uses Google Gemini Flash to extract structured data from receipts.
-    Replaces local OCR entirely.
+    One Gemini call asking for JSON of the given response_schema. Waits its turn in the
+    shared limiter (gemini_limiter.py), which also sits out 429s before trying again.
     """
-    logger.info(f"Sending {file_path} to Gemini Vision...")
-    
-    # Candidate models to try in order of preference
-    # Updated based on server logs showing 2.0/2.5 availability
-    candidates = [
-        "gemini-2.0-flash",
-        "models/gemini-2.0-flash",
-        "gemini-2.5-flash",
-        "models/gemini-2.5-flash",
-        "gemini-flash-latest",
-        "models/gemini-flash-latest",
-        "models/gemini-1.5-flash"
-    ]
+    def call():
+        with metrics.model_call(model_name):
+            return registry.get_model(model_name).generate_content(
+                contents,
+                generation_config={"response_mime_type": "application/json", "response_schema": schema}
+            )
+    return gemini_limiter.get_limiter().call(call)
+
+def parse_model_json(raw_text):
+    return receipt_schema.parse_json(raw_text)
+
+def fill_missing_fields(data):
+    if "date" not in data: data["date"] = datetime.now().strftime("%y%m%d")
+    if "store" not in data: data["store"] = "Unknown"
+    if "payment" not in data: data["payment"] = "Unknown"
+    if "amount" not in data: data["amount"] = 0.0
+    return data
+
+def read_answer(raw_text):
+    """(values, problems) for one receipt answer; an unparseable answer has every field wrong."""
+    try:
+        data = parse_model_json(raw_text)
+    except ValueError as e:
+        return {}, {name: f"unparseable answer ({e})" for name in receipt_schema.FIELDS}
+    return receipt_schema.validate(data)
+
+def retry_fields(model_name, parts, values, problems):
+    """
+    Asks model_name again for just the fields in problems. Returns (values, problems)
+    with whatever the follow-up fixed merged in. A failed follow-up changes nothing.
+    """
+    fields = [name for name in receipt_schema.FIELDS if name in problems]
+    logger.info(f"Re-asking {model_name} for {', '.join(fields)} ({problems})")
+    prompt = FIELD_RETRY_PROMPT.format(
+        problems="\n".join(f"        - {name}: {reason}" for name, reason in problems.items()),
+        fields=", ".join(fields)
+    )
+    try:
+        response = generate(model_name, parts + [prompt], receipt_schema.fields_schema(fields))
+        fixed, still_wrong = receipt_schema.validate(parse_model_json(response.text), fields)
+        metrics.model_outcome(model_name, "field_retry")
+    except Exception as e:
+        logger.warning(f"Follow-up on {model_name} failed: {e}")
+        metrics.model_outcome(model_name, "failure")
+        return values, problems
+    return dict(values, **fixed), still_wrong
+
+def finish_answer(model_name, parts, values, problems):
+    """
+    Follows up on invalid fields once, then fills whatever is still missing.
+    Returns (data, complete); incomplete answers shouldn't be cached.
+    """
+    if problems:
+        values, problems = retry_fields(model_name, parts, values, problems)
+        if problems:
+            logger.warning(f"{model_name} still unsure of {', '.join(problems)}, using defaults")
+    data = receipt_schema.Receipt(**fill_missing_fields(dict(values))).to_dict()
+    return data, not problems
+
+def lookup_cache(file_path, content_hash):
+    start = time.perf_counter()
+    cached = extraction_cache.get_cached(content_hash, PROMPT_VERSION)
+    extraction_stats.record("cache", bool(cached), time.perf_counter() - start)
+    if cached:
+        logger.info(f"Cache hit for {file_path}")
+        cached["raw_text_debug"] = "Extraction Cache Hit"
+    return cached
+
+def try_local_ocr(file_path, file_data, mime_type):
+    """
+    Reads the receipt with local OCR. Returns the extraction if it's confident enough
+    (local_ocr_min_confidence), else None so the caller asks Gemini.
+    """
+    if not get_setting("local_ocr_enabled", True):
+        return None
+    start = time.perf_counter()
+    result = local_ocr.extract(file_data, mime_type)
+    threshold = float(get_setting("local_ocr_min_confidence", local_ocr.DEFAULT_MIN_CONFIDENCE))
+    accepted = result is not None and result["confidence"] >= threshold
+    if result is not None:
+        extraction_stats.record("local", accepted, time.perf_counter() - start)
+
+    if not accepted:
+        if result is not None:
+            logger.info(f"Local OCR not sure about {file_path} ({result['confidence']}), asking Gemini")
+        return None
 
+    confidence = result.pop("confidence")
+    logger.info(f"Local OCR read {file_path} ({confidence})")
+    result["raw_text_debug"] = f"Local OCR (confidence {confidence})"
+    return result
+
+def process_document(file_path, content_hash=None):
+    """
+    Extracts structured data from a receipt: extraction cache first, then local OCR,
+    and Google Gemini Flash only when local OCR isn't confident.
+    Pass content_hash (SHA-256 of the file) if it's already known to skip rehashing.
+    """
     # Read file bytes once
     try:
-        ext = os.path.splitext(file_path)[1].lower()
-        mime_type = "image/jpeg"
-        if ext == ".png": mime_type = "image/png"
-        elif ext == ".pdf": mime_type = "application/pdf"
-        
-        with open(file_path, "rb") as f:
-            file_data = f.read()
+        file_data, mime_type = read_document(file_path)
     except Exception as e:
          logger.error(f"Failed to read file: {e}")
          return {"store": "FileError", "amount": 0.0, "date": "240101"}
 
-    prompt = """
-        You are an expert receipt scanner AI. 
-        Analyze this image and extract the following fields in strict JSON format:
-        
-        {
-            "date": "YYMMDD", (Format YearMonthDay, e.g. 241109 for Nov 9, 2024. Use file date if unknown, but prefer receipt date).
-            "store": "StoreName", (Capitalized, Short. E.g. 'Kroger', 'Walmart', 'Shell'. Identify logos correctly).
-            "payment": "Method", (E.g. 'Card-1234', 'Cash', 'Amex-1002'. Look for 'Ending in', 'VISA', asterisk masking).
-            "amount": 12.34 (The TOTAL amount paid. Look for 'Total', 'Balance', 'Amount Charged').
-        }
-        
-        If you are unsure of the date, use today's date.
-        If you are unsure of the store, guess based on items or header.
-        Return ONLY valid JSON.
-        """
+    # Same bytes + same prompt = same answer, skip the model entirely
+    content_hash = content_hash or hashlib.sha256(file_data).hexdigest()
+    cached = lookup_cache(file_path, content_hash)
+    if cached:
+        return cached
+
+    # Clean receipts are read right here, no network call
+    local = try_local_ocr(file_path, file_data, mime_type)
+    if local:
+        return local
 
+    # Shrink the payload (rotate, crop, grayscale, downscale) before it goes over the wire
+    return extract_with_gemini(file_path, prepare_parts(file_data, mime_type), content_hash)
+
+def extract_with_gemini(file_path, parts, content_hash):
+    """Sends the prepared parts to the first model that answers, caching the result."""
+    logger.info(f"Sending {file_path} to Gemini Vision...")
+    started = time.perf_counter()
     last_error = None
     
-    for model_name in candidates:
+    for model_name in registry.ordered_candidates():
         try:
             logger.info(f"Attempting with model: {model_name}")
-            model = genai.GenerativeModel(model_name)
-
-            # Generate content
-            response = model.generate_content([
-                {'mime_type': mime_type, 'data': file_data},
-                prompt
-            ])
-            
-            # Clean response (remove markdown code blocks if any)
+            response = generate(model_name, parts + [EXTRACTION_PROMPT], receipt_schema.RECEIPT_SCHEMA)
+            # A blocked or empty answer raises here (ValueError); that's the model failing, try the next one
             raw_text = response.text
-            clean_json = raw_text.replace("```json", "").replace("```", "").strip()
-            
-            data = json.loads(clean_json)
-            
-            # Add debug info
-            data["raw_text_debug"] = f"Gemini Success ({model_name})"
-            logger.info(f"Success with {model_name}")
-            
-            # Validate keys exist
-            if "date" not in data: data["date"] = datetime.now().strftime("%y%m%d")
-            if "store" not in data: data["store"] = "Unknown"
-            if "payment" not in data: data["payment"] = "Unknown"
-            if "amount" not in data: data["amount"] = 0.0
-            
-            return data
-
+            registry.record_success(model_name)
+            metrics.model_outcome(model_name, "success")
         except Exception as e:
             logger.warning(f"Failed with {model_name}: {e}")
+            registry.record_failure(model_name, e)
+            metrics.model_outcome(model_name, "failure")
             last_error = e
             # Continue to next candidate
-            
+            continue
+
+        # The model answered; a field it got wrong is asked for again, not the whole receipt
+        values, problems = read_answer(raw_text)
+        retried = ", ".join(problems)
+        data, complete = finish_answer(model_name, parts, values, problems)
+        data["raw_text_debug"] = f"Gemini Success ({model_name}" + (f", re-asked {retried})" if retried else ")")
+        logger.info(f"Success with {model_name}")
+
+        extraction_stats.record("gemini", True, time.perf_counter() - started)
+        if complete:
+            extraction_cache.store(content_hash, PROMPT_VERSION, data)
+        return data
+
     # If we get here, all failed
     logger.error("All Gemini models failed.")
+    extraction_stats.record("gemini", False, time.perf_counter() - started)
     
     # Log available models to help debug
-    available = list_available_models()
+    available = registry.probe()
     logger.info(f"Available models on server: {available}")
     
     return {
@@ -130,3 +289,112 @@ def process_document(file_path):
         "amount": 0.0,
         "raw_text_debug": f"All Gemini Models Failed. Available: {available}. Last Error: {str(last_error)}"
     }
+
+def is_complete_extraction(data):
+    """A batch answer whose every field validates."""
+    return isinstance(data, dict) and not receipt_schema.validate(data)[1]
+
+def _map_batch_answer(answer, count):
+    """Lines the model's array up with our receipts. Returns a list with None where unsure."""
+    if isinstance(answer, dict):
+        # Some models wrap the array, e.g. {"receipts": [...]}
+        answer = next((value for value in answer.values() if isinstance(value, list)), [])
+    if not isinstance(answer, list):
+        return [None] * count
+
+    by_index = [None] * count
+    for item in answer:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and by_index[index] is None:
+            by_index[index] = item
+
+    # No usable indexes at all, but the right number of answers: trust the order
+    if all(item is None for item in by_index) and len(answer) == count:
+        return [item if isinstance(item, dict) else None for item in answer]
+    return by_index
+
+def _extract_batch(parts_list):
+    """One model call for several receipts. Returns (answers, model_name), answers lined up with parts_list."""
+    count = len(parts_list)
+    contents = []
+    for i, parts in enumerate(parts_list):
+        contents.append(f"Receipt {i} of {count}:")
+        contents.extend(parts)
+    contents.append(BATCH_EXTRACTION_PROMPT)
+
+    for model_name in registry.ordered_candidates():
+        try:
+            logger.info(f"Attempting batch of {count} with model: {model_name}")
+            response = generate(model_name, contents, receipt_schema.BATCH_RECEIPT_SCHEMA)
+            answers = _map_batch_answer(parse_model_json(response.text), count)
+            registry.record_success(model_name)
+            metrics.model_outcome(model_name, "success")
+            return answers, model_name
+        except Exception as e:
+            logger.warning(f"Batch failed with {model_name}: {e}")
+            registry.record_failure(model_name, e)
+            metrics.model_outcome(model_name, "failure")
+
+    return [None] * count, None
+
+def process_documents(file_paths, content_hashes=None):
+    """
+    Batched process_document: the files that neither the cache nor local OCR can answer
+    go to Gemini together in one request, and the answers are mapped back by index.
+    A file missing from the answer is extracted on its own; one with some bad fields
+    only gets those fields asked for again.
+    Returns one result per file, in order.
+    """
+    content_hashes = content_hashes or [None] * len(file_paths)
+    if len(file_paths) == 1:
+        return [process_document(file_paths[0], content_hash=content_hashes[0])]
+
+    results = [None] * len(file_paths)
+    pending = [] # (index, file_path, content_hash, parts)
+
+    for i, (file_path, content_hash) in enumerate(zip(file_paths, content_hashes)):
+        try:
+            file_data, mime_type = read_document(file_path)
+        except Exception:
+            # process_document reports the read error its usual way
+            results[i] = process_document(file_path, content_hash=content_hash)
+            continue
+
+        content_hash = content_hash or hashlib.sha256(file_data).hexdigest()
+        results[i] = lookup_cache(file_path, content_hash) or try_local_ocr(file_path, file_data, mime_type)
+        if results[i]:
+            continue
+        pending.append((i, file_path, content_hash, prepare_parts(file_data, mime_type)))
+
+    if len(pending) > 1:
+        logger.info(f"Sending {len(pending)} receipts to Gemini Vision in one request...")
+        start = time.perf_counter()
+        answers, model_name = _extract_batch([parts for _, _, _, parts in pending])
+        extraction_stats.record("gemini_batch", sum(1 for data in answers if is_complete_extraction(data)),
+                                time.perf_counter() - start, attempts=len(pending))
+    else:
+        answers, model_name = [None] * len(pending), None
+
+    for (i, file_path, content_hash, parts), data in zip(pending, answers):
+        if data is None:
+            if model_name:
+                logger.warning(f"No batch answer for {file_path}, extracting it alone")
+            results[i] = extract_with_gemini(file_path, parts, content_hash)
+            continue
+
+        # Just this receipt's bad fields go back to the model, with just its images
+        values, problems = receipt_schema.validate(data)
+        retried = ", ".join(problems)
+        data, complete = finish_answer(model_name, parts, values, problems)
+        data["raw_text_debug"] = f"Gemini Batch Success ({model_name}, {len(pending)} receipts" + (
+            f", re-asked {retried})" if retried else ")")
+        if complete:
+            extraction_cache.store(content_hash, PROMPT_VERSION, data)
+        results[i] = data
+
+    return results
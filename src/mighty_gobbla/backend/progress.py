@@ -0,0 +1,123 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("MightyGobbla.Progress")
+
+# Live per-file progress for the web UI, streamed as server-sent events from /events/{run_id}.
+# The page picks a run id, subscribes, then starts the run with that id; pipeline threads
+# publish to it as each file is started, extracted, renamed and synced.
+
+# Events kept per run, so a late or reconnecting subscriber can catch up
+MAX_EVENTS_PER_RUN = 5000
+# Finished (or abandoned) runs are forgotten after this long
+RUN_TTL_SECONDS = 10 * 60
+# Comment line sent when nothing happened for a while, so proxies don't drop the stream
+KEEPALIVE_SECONDS = 15
+
+_runs = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+def _prune():
+    """Caller holds _lock."""
+    cutoff = time.time() - RUN_TTL_SECONDS
+    expired = [run_id for run_id, run in _runs.items()
+               if not run["subscribers"] and run["touched_at"] < cutoff]
+    for run_id in expired:
+        del _runs[run_id]
+
+def _get_run(run_id):
+    """Caller holds _lock."""
+    run = _runs.get(run_id)
+    if run is None:
+        _prune()
+        run = _runs[run_id] = {"events": deque(maxlen=MAX_EVENTS_PER_RUN), "next_id": 1,
+                               "subscribers": [], "touched_at": time.time()}
+    return run
+
+def publish(run_id, event, **data):
+    with _lock:
+        run = _get_run(run_id)
+        entry = {"id": run["next_id"], "event": event, "data": data}
+        run["next_id"] += 1
+        run["events"].append(entry)
+        run["touched_at"] = time.time()
+        subscribers = list(run["subscribers"])
+
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, entry)
+        except RuntimeError:
+            pass # Its event loop is gone; the subscriber cleans itself up
+
+def finish(run_id, summary=None):
+    """Last events of a run; subscribers' streams end after "done"."""
+    if summary is not None:
+        publish(run_id, "summary", **summary)
+    publish(run_id, "done")
+
+# --- Publishing from pool threads ---
+
+def current_run():
+    return getattr(_local, "run_id", None)
+
+def bind(run_id, fn):
+    """Wraps fn so emit() calls made while it runs (on a pool thread) go to run_id."""
+    def run(*args, **kwargs):
+        previous = getattr(_local, "run_id", None)
+        _local.run_id = run_id
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.run_id = previous
+    return run
+
+def emit(event, file_path, **data):
+    """Progress of one file, if this thread is working for a run. No-op otherwise."""
+    run_id = current_run()
+    if run_id:
+        publish(run_id, event, file=file_path, **data)
+
+# --- Subscribing (event loop side) ---
+
+def _format(entry):
+    return f"id: {entry['id']}\nevent: {entry['event']}\ndata: {json.dumps(entry['data'])}\n\n"
+
+async def stream(run_id, last_event_id=None):
+    """
+    Async generator of SSE-formatted events for run_id: everything after last_event_id
+    that is still buffered, then new events as they are published, until "done".
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    subscriber = (loop, queue)
+    with _lock:
+        run = _get_run(run_id)
+        # Snapshot and subscribe under the same lock, so nothing is missed or sent twice
+        backlog = [entry for entry in run["events"] if last_event_id is None or entry["id"] > last_event_id]
+        run["subscribers"].append(subscriber)
+
+    try:
+        for entry in backlog:
+            yield _format(entry)
+            if entry["event"] == "done":
+                return
+        while True:
+            try:
+                entry = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _format(entry)
+            if entry["event"] == "done":
+                return
+    finally:
+        with _lock:
+            run = _runs.get(run_id)
+            if run and subscriber in run["subscribers"]:
+                run["subscribers"].remove(subscriber)
+                run["touched_at"] = time.time()
@@ -0,0 +1,162 @@
+import re
+import json
+import math
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from local_ocr import CARD_BRANDS, CASH_PATTERN
+
+# The shape of one extracted receipt. Gemini is asked for exactly this (response_schema),
+# and whatever comes back is coerced into it, so small slips like "$1,234.56" or
+# "2024-11-09" are fixed here instead of costing another model call.
+
+@dataclass
+class Receipt:
+    date: str      # YYMMDD
+    store: str
+    payment: str   # Card-1234, Amex-1002, Cash, Check-101, PayPal... or Unknown
+    amount: float  # Total paid
+
+    def to_dict(self):
+        return asdict(self)
+
+FIELDS = ("date", "store", "payment", "amount")
+
+FIELD_SCHEMAS = {
+    "date": {"type": "string", "description": "Receipt date as YYMMDD, e.g. 241109 for Nov 9, 2024."},
+    "store": {"type": "string", "description": "Store name, capitalized and short, e.g. Kroger, Walmart, Shell."},
+    "payment": {"type": "string", "description": "Payment method, e.g. Card-1234, Cash, Amex-1002. Unknown if not shown."},
+    "amount": {"type": "number", "description": "The TOTAL amount paid (Total, Balance, Amount Charged)."}
+}
+
+def fields_schema(fields, with_index=False):
+    """response_schema for an object with just these fields (plus "index" for batches)."""
+    properties = {name: FIELD_SCHEMAS[name] for name in fields}
+    required = list(fields)
+    if with_index:
+        properties = dict(index={"type": "integer", "description": "The i from the receipt's \"Receipt i of N\" line."}, **properties)
+        required = ["index"] + required
+    return {"type": "object", "properties": properties, "required": required}
+
+RECEIPT_SCHEMA = fields_schema(FIELDS)
+BATCH_RECEIPT_SCHEMA = {"type": "array", "items": fields_schema(FIELDS, with_index=True)}
+
+# --- Coercion ---
+
+DATE_FORMATS = ("%y%m%d", "%Y%m%d", "%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y",
+                "%b %d, %Y", "%B %d, %Y", "%b %d %Y", "%B %d %Y", "%d %b %Y", "%d %B %Y")
+# Receipts from before this, or more than a few days ahead (time zones), are misreads
+EARLIEST_YEAR = 2000
+MAX_DAYS_AHEAD = 3
+
+CHECK_PATTERN = re.compile(r"\bche(?:ck|que)\b\D*(\d+)?", re.IGNORECASE)
+PAYPAL_PATTERN = re.compile(r"pay\s*pal", re.IGNORECASE)
+TRAILING_DIGITS = re.compile(r"(\d{4})\D*$")
+DECIMAL_COMMA = re.compile(r"^-?\d+,\d{1,2}$")
+
+def coerce_date(value):
+    text = str(value if value is not None else "").strip()
+    # A number like 241109.0 or a timestamp's date part
+    text = re.sub(r"\.0+$", "", text).split("T")[0]
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"unreadable date {value!r}")
+    if parsed.year < EARLIEST_YEAR or parsed > datetime.now() + timedelta(days=MAX_DAYS_AHEAD):
+        raise ValueError(f"implausible date {value!r}")
+    return parsed.strftime("%y%m%d")
+
+def coerce_amount(value):
+    if isinstance(value, bool):
+        raise ValueError(f"not an amount {value!r}")
+    if isinstance(value, str):
+        text = value.strip().replace("$", "").replace("USD", "").strip()
+        # Accounting style negative: (12.34)
+        if text.startswith("(") and text.endswith(")"):
+            text = "-" + text[1:-1]
+        # "12,34" is a decimal comma; otherwise commas are thousands separators ("1,234.56")
+        if DECIMAL_COMMA.match(text):
+            text = text.replace(",", ".")
+        value = text.replace(",", "")
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"not an amount {value!r}")
+    if not math.isfinite(amount):
+        raise ValueError(f"not an amount {value!r}")
+    return round(amount, 2)
+
+def coerce_store(value):
+    store = " ".join(str(value if value is not None else "").split())
+    if not store:
+        raise ValueError("no store")
+    return store
+
+def coerce_payment(value):
+    """Into the naming convention (same as local OCR). Never invalid: Unknown is an answer."""
+    text = " ".join(str(value if value is not None else "").split())
+    if not text or text.lower() in ("unknown", "none", "null", "n/a"):
+        return "Unknown"
+
+    brand = next((name for pattern, name in CARD_BRANDS if pattern.search(text)), None)
+    if brand is None and re.search(r"\bcard\b", text, re.IGNORECASE):
+        brand = "Card"
+    last4 = TRAILING_DIGITS.search(text)
+    if brand:
+        return f"{brand}-{last4.group(1)}" if last4 else brand
+
+    check = CHECK_PATTERN.search(text)
+    if check:
+        return f"Check-{check.group(1)}" if check.group(1) else "Check"
+    if CASH_PATTERN.search(text):
+        return "Cash"
+    if PAYPAL_PATTERN.search(text):
+        return "PayPal"
+    # Just the digits, e.g. "****1234"
+    if last4 and not re.search(r"[a-z]", text, re.IGNORECASE):
+        return f"Card-{last4.group(1)}"
+    return text
+
+COERCERS = {
+    "date": coerce_date,
+    "store": coerce_store,
+    "payment": coerce_payment,
+    "amount": coerce_amount
+}
+
+def validate(data, fields=FIELDS):
+    """
+    Coerces a model answer field by field. Returns (values, problems): the fields that
+    coerced cleanly, and {field: reason} for the ones that are missing or unusable.
+    """
+    if not isinstance(data, dict):
+        data = {}
+    values, problems = {}, {}
+    for name in fields:
+        try:
+            values[name] = COERCERS[name](data.get(name))
+        except ValueError as e:
+            problems[name] = str(e)
+    return values, problems
+
+def parse_json(raw_text):
+    """
+    JSON out of a model answer. Schema-constrained answers are plain JSON already; this
+    also copes with code fences, prose around the JSON and trailing commas.
+    """
+    text = raw_text.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON in model answer")
+    start = min(starts)
+    end = text.rfind("]" if text[start] == "[" else "}")
+    if end < start:
+        raise ValueError("no JSON in model answer")
+    return json.loads(re.sub(r",\s*([}\]])", r"\1", text[start:end + 1]))
@@ -1,9 +1,22 @@
 import json
 import os
+import threading
 
 SETTINGS_FILE = os.path.join(os.path.expanduser("~"), ".mighty_gobbla_settings.json")
 
-def load_settings():
+# Parsed settings are cached and only re-read when the file's mtime changes
+# (e.g. someone edits it by hand on the VPS) or save_settings is called.
+_lock = threading.RLock()
+_cache = None
+_cache_mtime = None
+
+def _file_mtime():
+    try:
+        return os.stat(SETTINGS_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _read_settings():
     if not os.path.exists(SETTINGS_FILE):
         return {"notion_enabled": False}
     try:
@@ -12,15 +25,37 @@ def load_settings():
     except:
         return {"notion_enabled": False}
 
+def _cached_settings():
+    """Returns the cached dict, refreshing it if the file changed. Caller holds _lock."""
+    global _cache, _cache_mtime
+    mtime = _file_mtime()
+    if _cache is None or mtime != _cache_mtime:
+        _cache = _read_settings()
+        _cache_mtime = mtime
+    return _cache
+
+def load_settings():
+    with _lock:
+        # Copy so callers can modify it without touching the cache
+        return dict(_cached_settings())
+
 def save_settings(settings):
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
+    global _cache, _cache_mtime
+    with _lock:
+        # Write to a temp file and swap it in so readers never see half a file
+        tmp_file = SETTINGS_FILE + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(settings, f, indent=2)
+        os.replace(tmp_file, SETTINGS_FILE)
+        _cache = dict(settings)
+        _cache_mtime = _file_mtime()
 
 def get_setting(key, default=None):
-    settings = load_settings()
-    return settings.get(key, default)
+    with _lock:
+        return _cached_settings().get(key, default)
 
 def set_setting(key, value):
-    settings = load_settings()
-    settings[key] = value
-    save_settings(settings)
+    with _lock:
+        settings = dict(_cached_settings())
+        settings[key] = value
+        save_settings(settings)
@@ -2,6 +2,10 @@ const API_URL = ""; // Relative path
 
 
 let currentPage = 1;
+// Keyset pagination: cursor used to load each page we've visited (page 1 has none)
+let pageCursors = [null];
+let nextCursor = null;
+let historyFilters = {};
 
 // Tabs
 function switchTab(tab) {
@@ -36,7 +40,6 @@ if (fileInput) {
         }
     });
 }
-});
 
 async function uploadMobileFile(file) {
     showOverlay(true);
@@ -44,15 +47,24 @@ async function uploadMobileFile(file) {
     formData.append('files', file);
 
     try {
-        const response = await fetch(`${API_URL}/upload_files`, {
+        const response = await fetch(`${API_URL}/upload_files${debugQuery()}`, {
             method: 'POST',
             body: formData
         });
         const result = await response.json();
         console.log(result);
-
-        if (result.results && result.results.length > 0) {
-            handleResultItem(result.results[0]);
+        // Too big (413) or not an upload at all (400)
+        if (!response.ok) throw new Error(result.detail || response.status);
+
+        // Upload returns straight away with job ids; wait for the worker to finish
+        if (result.jobs && result.jobs.length > 0) {
+            const job = result.jobs[0];
+            if (job.status === 'error') {
+                handleResultItem(job);
+            } else {
+                const finished = await waitForJob(job.job_id);
+                handleResultItem(finished.result);
+            }
         }
         loadHistory();
     } catch (error) {
@@ -64,6 +76,16 @@ async function uploadMobileFile(file) {
     }
 }
 
+async function waitForJob(jobId) {
+    while (true) {
+        const res = await fetch(`${API_URL}/jobs/${jobId}`);
+        if (!res.ok) throw new Error(`Job ${jobId} lost (${res.status})`);
+        const job = await res.json();
+        if (job.status === 'done' || job.status === 'error') return job;
+        await new Promise(resolve => setTimeout(resolve, 1500));
+    }
+}
+
 // Settings Logic
 async function loadSettings() {
     try {
@@ -71,6 +93,8 @@ async function loadSettings() {
         const data = await res.json();
         const toggle = document.getElementById('notion-toggle');
         if (toggle) toggle.checked = data.notion_enabled;
+        const debugToggle = document.getElementById('debug-toggle');
+        if (debugToggle) debugToggle.checked = debugTimingsOn();
     } catch (e) { console.error("Failed to load settings", e); }
 }
 
@@ -81,6 +105,32 @@ async function saveSettings() {
     await fetch(`${API_URL}/settings`, { method: 'POST', body: formData });
 }
 
+// Debug timings: asks the backend for a per-file breakdown of where the time went
+// (kept in this browser only, not a server setting)
+function debugTimingsOn() {
+    return localStorage.getItem('gobbla-debug-timings') === '1';
+}
+
+function saveDebugTimings() {
+    localStorage.setItem('gobbla-debug-timings', document.getElementById('debug-toggle').checked ? '1' : '0');
+}
+
+function debugQuery() {
+    return debugTimingsOn() ? '?debug=1' : '';
+}
+
+function formatTimings(item) {
+    if (!item.timings) return '';
+    let text = `\n\n⏱ ${item.total_ms} ms total`;
+    for (const t of item.timings) {
+        let line = `\n  ${t.stage}: ${t.ms} ms`;
+        if (t.detail) line += ` (${t.detail}${t.outcome ? ', ' + t.outcome : ''})`;
+        if (t.shared_by) line += ` [shared by ${t.shared_by}]`;
+        text += line;
+    }
+    return text;
+}
+
 // Gobble Actions (Single Path)
 async function gobbleSinglePath() {
     const path = document.getElementById('single-file-path').value;
@@ -92,7 +142,7 @@ async function gobbleSinglePath() {
     formData.append('file_path', cleanPath);
 
     try {
-        const response = await fetch(`${API_URL}/process_file_path`, { method: 'POST', body: formData });
+        const response = await fetch(`${API_URL}/process_file_path${debugQuery()}`, { method: 'POST', body: formData });
         const result = await response.json();
         if (result.results && result.results[0]) {
             await handleResultItem(result.results[0]);
@@ -106,51 +156,154 @@ async function gobbleSinglePath() {
     }
 }
 
+// Live folder progress: the server pushes each file's steps over /events/{runId} (SSE)
+function setProgress(file, name, status, state) {
+    const list = document.getElementById('folder-progress');
+    let row = list.querySelector(`[data-file="${CSS.escape(file)}"]`);
+    if (!row) {
+        row = document.createElement('div');
+        row.className = 'progress-row';
+        row.dataset.file = file;
+        row.innerHTML = '<span class="progress-name"></span><span class="progress-status"></span>';
+        row.querySelector('.progress-name').textContent = name;
+        list.prepend(row);
+    }
+    row.querySelector('.progress-status').textContent = status;
+    row.classList.remove('done', 'error');
+    if (state) row.classList.add(state);
+}
+
+function notionText(notionStatus) {
+    if (!notionStatus) return '';
+    if (notionStatus.status === 'success') return ' · Notion ✅';
+    if (notionStatus.status === 'queued') return ' · Notion 📮';
+    if (notionStatus.status === 'duplicate_suspected') return ' · ⚠️ Notion duplicate?';
+    return ' · ❌ Notion';
+}
+
+function watchRun(runId) {
+    document.getElementById('folder-progress').innerHTML = '';
+    if (!window.EventSource) return null; // The NDJSON stream still reports the totals
+
+    const source = new EventSource(`${API_URL}/events/${runId}`);
+    const on = (event, handler) => source.addEventListener(event, e => handler(JSON.parse(e.data)));
+    on('started', d => setProgress(d.file, d.name, 'reading...'));
+    on('split', d => setProgress(d.file, d.name, `splitting into ${d.parts}...`));
+    on('extracted', d => setProgress(d.file, d.name, `${d.data.store || '?'} $${d.data.amount ?? '?'} · renaming...`));
+    on('renamed', d => setProgress(d.file, d.name, `→ ${d.new} · syncing...`));
+    on('notion', d => setProgress(d.file, d.name, `→ ${d.new}${notionText(d.notion_status)}`, 'done'));
+    on('result', d => {
+        const r = d.result;
+        if (r.status === 'error') setProgress(d.file, r.original, `❌ ${r.message}`, 'error');
+        else if (r.status === 'skipped') setProgress(d.file, r.original, r.message || 'skipped', 'done');
+        else if (r.receipts) setProgress(d.file, r.original, `✅ ${r.receipts.length} receipts`, 'done');
+        else setProgress(d.file, r.original, `✅ ${r.new}${notionText(r.notion_status)}`, 'done');
+    });
+    on('done', () => source.close());
+    return source;
+}
+
 async function gobbleFolder() {
     const path = document.getElementById('folder-path').value;
     if (!path) return alert("Where is the folder?");
     const cleanPath = path.replace(/"/g, '');
 
-    showOverlay(true);
+    // No overlay: the progress list shows the run moving, and the button stays
+    // disabled so a second click can't start the same folder twice
+    const button = document.getElementById('folder-gobble-btn');
+    button.disabled = true;
+    const runId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+    const source = watchRun(runId);
+
     const formData = new FormData();
     formData.append('folder_path', cleanPath);
+    formData.append('force', document.getElementById('folder-force').checked);
+    formData.append('run_id', runId);
 
     try {
-        const response = await fetch(`${API_URL}/process_folder`, { method: 'POST', body: formData });
-        const result = await response.json();
+        const response = await fetch(`${API_URL}/process_folder${debugQuery()}`, { method: 'POST', body: formData });
+        if (!response.ok) {
+            const err = await response.json();
+            throw new Error(err.detail || response.status);
+        }
 
-        // Count warnings
+        // Results stream back one JSON object per line as each file finishes
+        // (the last line is a summary of the whole run)
+        let processed = 0;
         let warnings = 0;
-        if (result.results) {
-            for (const item of result.results) {
-                if (item.notion_status && item.notion_status.status === 'duplicate_suspected') warnings++;
+        let summary = null;
+        let slowest = null;
+        await readNdjson(response, (item) => {
+            if (item.summary) {
+                summary = item.summary;
+                return;
             }
-        }
+            processed++;
+            button.textContent = `${processed} done`;
+            if (item.timings) {
+                console.log(`${item.original}: ${item.total_ms} ms`, item.timings);
+                if (!slowest || item.total_ms > slowest.total_ms) slowest = item;
+            }
+            for (const receipt of (item.receipts || [item])) {
+                if (receipt.notion_status && receipt.notion_status.status === 'duplicate_suspected') warnings++;
+            }
+        });
 
-        let msg = `Finished! Processed ${result.results.length} files.`;
+        let msg = `Finished! Processed ${processed} files.`;
+        if (summary) {
+            msg = `Finished! Gobbled ${summary.gobbled} new files.`;
+            if (summary.unchanged + summary.skipped > 0) msg += `\nSkipped ${summary.unchanged + summary.skipped} already done.`;
+            if (summary.errors > 0) msg += `\n❌ ${summary.errors} failed.`;
+        }
         if (warnings > 0) msg += `\n⚠️ ${warnings} Potential Notion Duplicates found. switch to Single File mode to review/force add.`;
+        if (slowest) msg += `\n\nSlowest: ${slowest.original}` + formatTimings(slowest);
         alert(msg);
         loadHistory();
     } catch (error) {
+        // On success the stream closes itself after its last event ("done")
+        if (source) source.close();
         alert("Error: " + error);
     } finally {
-        showOverlay(false);
+        button.disabled = false;
+        button.textContent = 'GOBBLE';
     }
 }
 
+async function readNdjson(response, onItem) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (value) buffer += decoder.decode(value, { stream: true });
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onItem(JSON.parse(line));
+        }
+        if (done) break;
+    }
+    if (buffer.trim()) onItem(JSON.parse(buffer));
+}
+
 async function handleResultItem(item) {
+    // A long PDF comes back as several receipts; report each one
+    if (item.receipts) {
+        for (const receipt of item.receipts) await handleResultItem(receipt);
+        if (item.timings) alert(`${item.original}` + formatTimings(item));
+        return;
+    }
     if (item.status === 'error') {
-        alert("Error: " + item.message);
+        alert("Error: " + item.message + formatTimings(item));
     } else {
         let msg = `Gobbled: ${item.new}`;
         if (item.notion_status) {
             if (item.notion_status.status === 'success') msg += "\n✅ Saved to Notion!";
+            else if (item.notion_status.status === 'queued') msg += "\n📮 Queued for Notion (shows up in history once it lands)";
             else if (item.notion_status.status === 'duplicate_suspected') {
                 if (confirm(`⚠️ DUPLICATE SUSPECTED for ${item.new}!\n\n${item.notion_status.message}\n\n${item.notion_status.details}\n\nAdd to Notion anyway?`)) {
-                    await forceAddNotion(item); // Note: forceAddNotion is missing implementation in this snippet but handleResultItem calls it. Assuming it exists or I should add it? 
-                    // Wait, forceAddNotion was MISSING in the provided view_file! 
-                    // I need to add it!
-                    msg += "\n✅ Force Added to Notion!";
+                    msg += await forceAddNotion(item);
                 } else {
                     msg += "\n❌ Notion Skipped (Duplicate)";
                 }
@@ -158,34 +311,77 @@ async function handleResultItem(item) {
                 msg += `\n❌ Notion Error: ${item.notion_status.message}`;
             }
         }
-        alert(msg);
+        alert(msg + formatTimings(item));
         loadHistory();
     }
 }
 
 async function forceAddNotion(item) {
-    // Re-implement basic force add if it was lost
+    // Same fields the gobble found; the endpoint just skips the duplicate check
     const formData = new FormData();
     formData.append('filename', item.new);
-    // We hope item has data attached, if not we can't force add easily without re-parsing
-    // For now just try the endpoint
+    for (const key of ['date', 'store', 'payment', 'amount']) formData.append(key, item.data[key]);
+
     try {
-        await fetch(`${API_URL}/notion/force_add`, { method: 'POST', body: formData }); // This endpoint might not exist, checking main.py...
-        // main.py doesn't seem to have /notion/force_add exposed in recent edits?
-        // Actually I recall seeing it in app.js before.
-    } catch (e) { console.error(e); }
+        const res = await fetch(`${API_URL}/notion/force_add`, { method: 'POST', body: formData });
+        if (!res.ok) throw new Error(`Force add failed (${res.status})`);
+        const result = await res.json();
+        if (result.status === 'queued') return "\n📮 Force Added (queued for Notion)!";
+        if (result.status === 'success') return "\n✅ Force Added to Notion!";
+        return `\n❌ Notion Error: ${result.message}`;
+    } catch (e) {
+        console.error(e);
+        return `\n❌ Notion Error: ${e.message}`;
+    }
 }
 
 
 async function loadHistory() {
     try {
-        const res = await fetch(`${API_URL}/history?page=${currentPage}&limit=10`);
+        const params = new URLSearchParams({ limit: 10, ...historyFilters });
+        const cursor = pageCursors[currentPage - 1];
+        if (cursor !== null && cursor !== undefined) params.set('cursor', cursor);
+
+        const res = await fetch(`${API_URL}/history?${params}`);
         const data = await res.json();
+        nextCursor = data.next_cursor;
         renderHistory(data.items);
         document.getElementById('page-indicator').innerText = `Page ${currentPage}`;
     } catch (e) { console.error(e); }
 }
 
+function applyFilters() {
+    const fields = {
+        store: 'filter-store',
+        payment: 'filter-payment',
+        date_from: 'filter-date-from',
+        date_to: 'filter-date-to',
+        amount_min: 'filter-amount-min',
+        amount_max: 'filter-amount-max',
+        directory: 'filter-directory'
+    };
+    historyFilters = {};
+    for (const [param, id] of Object.entries(fields)) {
+        const value = document.getElementById(id).value.trim();
+        if (value) historyFilters[param] = value;
+    }
+    resetPaging();
+    loadHistory();
+}
+
+function resetFilters() {
+    document.querySelectorAll('.history-filters input').forEach(el => el.value = '');
+    historyFilters = {};
+    resetPaging();
+    loadHistory();
+}
+
+function resetPaging() {
+    currentPage = 1;
+    pageCursors = [null];
+    nextCursor = null;
+}
+
 function renderHistory(items) {
     // Clear container
     const tableContainer = document.getElementById('history-table-container');
@@ -203,6 +399,10 @@ function renderHistory(items) {
                 <span class="card-arrow">▼</span>
             </div>
             <div class="card-details" style="display:none;">
+                ${item.details.thumbnail_url ? `
+                <a href="${item.details.display_url || item.details.thumbnail_url}" target="_blank" onclick="event.stopPropagation()">
+                    <img class="receipt-thumb" src="${item.details.thumbnail_url}" loading="lazy" alt="Receipt">
+                </a>` : ''}
                 <p><strong>Date:</strong> ${item.details.date}</p>
                 <p><strong>Store:</strong> ${item.details.store}</p>
                 <p><strong>Payment:</strong> ${item.details.payment}</p>
@@ -238,10 +438,13 @@ function deleteEntry(e, id) {
 async function clearHistory() {
     if (!confirm("Wait! Delete ALL history?")) return;
     await fetch(`${API_URL}/history`, { method: 'DELETE' });
+    resetPaging();
     loadHistory();
 }
 
 function nextPage() {
+    if (nextCursor === null) return; // Already on the last page
+    pageCursors[currentPage] = nextCursor;
     currentPage++;
     loadHistory();
 }
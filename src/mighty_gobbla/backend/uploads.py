@@ -0,0 +1,148 @@
+import os
+import time
+import hashlib
+import logging
+import aiofiles
+from python_multipart import MultipartParser
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+from settings import get_setting
+
+logger = logging.getLogger("MightyGobbla.Uploads")
+
+DEFAULT_MAX_UPLOAD_MB = 25
+DEFAULT_MAX_REQUEST_MB = 200
+
+class UploadTooLarge(Exception):
+    pass
+
+def _mb(num_bytes):
+    return f"{round(num_bytes / (1024 * 1024), 1):g} MB"
+
+def max_upload_bytes():
+    """Per-file cap."""
+    return int(float(get_setting("max_upload_mb", DEFAULT_MAX_UPLOAD_MB)) * 1024 * 1024)
+
+def max_request_bytes():
+    """Cap for a whole /upload_files request body."""
+    return int(float(get_setting("max_request_mb", DEFAULT_MAX_REQUEST_MB)) * 1024 * 1024)
+
+class BadUpload(Exception):
+    """The body isn't a multipart/form-data upload we can read."""
+
+class _Part:
+    """A file part on its way to disk."""
+    def __init__(self, filename, path):
+        self.filename = filename
+        self.path = path
+        self.out = None
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.started = time.perf_counter()
+
+    def saved(self):
+        return {"filename": self.filename, "path": self.path, "size": self.size,
+                "sha256": self.hasher.hexdigest(), "seconds": time.perf_counter() - self.started}
+
+def _file_part(headers, field, dest_for):
+    """A _Part for a file sent as `field`, or None for anything else (form fields, empty file inputs)."""
+    _, options = parse_options_header(headers.get(b"content-disposition", b""))
+    filename = options.get(b"filename", b"").decode("utf-8", "replace")
+    if options.get(b"name") != field.encode() or not filename:
+        return None
+    return _Part(filename, dest_for(filename))
+
+async def receive_uploads(content_type, stream, dest_for, field="files"):
+    """
+    Reads a multipart/form-data body straight off the request stream (no spooling first)
+    and writes each file sent as `field` to dest_for(filename), hashing the bytes as they
+    go by.
+
+    Raises UploadTooLarge as soon as a file is over max_upload_mb or the body is over
+    max_request_mb: the rest of the body isn't read and every file written so far is
+    removed. Raises BadUpload for a body that isn't multipart or is cut short.
+
+    Returns [{"filename", "path", "size", "sha256", "seconds"}] in the order they were sent.
+    """
+    _, params = parse_options_header(content_type or "")
+    if b"boundary" not in params:
+        raise BadUpload("Expected a multipart/form-data upload")
+
+    file_cap = max_upload_bytes()
+    request_cap = max_request_bytes()
+
+    # The parser's callbacks can't await, so they queue what they saw and the loop
+    # below does the (async) writing after each chunk
+    events = []
+    headers = {}
+    header = [b"", b""] # name, value; both can arrive in pieces
+
+    def on_header_field(data, start, end):
+        header[0] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header[1] += data[start:end]
+
+    def on_header_end():
+        headers[header[0].lower()] = header[1]
+        header[:] = [b"", b""]
+
+    def on_headers_finished():
+        events.append(("part", dict(headers)))
+        headers.clear()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    saved = []
+    part = None
+    received = 0
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > request_cap:
+                raise UploadTooLarge(f"The upload is larger than the {_mb(request_cap)} limit for one request; "
+                                     f"send fewer files at once")
+            parser.write(chunk)
+
+            for kind, value in events:
+                if kind == "part":
+                    part = _file_part(value, field, dest_for)
+                    if part:
+                        part.out = await aiofiles.open(part.path, "wb")
+                elif part is None:
+                    continue # A form field we don't use
+                elif kind == "data":
+                    part.size += len(value)
+                    if part.size > file_cap:
+                        raise UploadTooLarge(f"{part.filename} is larger than {_mb(file_cap)}")
+                    part.hasher.update(value)
+                    await part.out.write(value)
+                else:
+                    await part.out.close()
+                    saved.append(part.saved())
+                    part = None
+            events.clear()
+
+        parser.finalize()
+        if part:
+            raise BadUpload(f"The upload ended in the middle of {part.filename}")
+    except BaseException as e:
+        if part:
+            if part.out:
+                await part.out.close()
+            saved.append({"path": part.path})
+        for upload in saved:
+            if os.path.exists(upload["path"]):
+                os.remove(upload["path"])
+        if isinstance(e, FormParserError):
+            raise BadUpload(f"Couldn't read the upload: {e}") from e
+        raise
+
+    return saved
@@ -0,0 +1,238 @@
+import os
+import time
+import logging
+import threading
+from settings import get_setting
+from pipeline import gobble_new_file, hash_file, iter_folder_files, SUPPORTED_EXTENSIONS
+from executor import get_executor
+import manifest
+import metrics
+
+try:
+    # inotify on Linux (ReadDirectoryChangesW on Windows, FSEvents on macOS)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger("MightyGobbla.Watcher")
+
+# A file must keep the same size/mtime this long before we trust it's fully written
+DEFAULT_SETTLE_SECONDS = 5
+# How often to rescan folders when no native file events are available
+DEFAULT_POLL_SECONDS = 30
+CHECK_INTERVAL_SECONDS = 1
+
+def is_candidate(path):
+    name = os.path.basename(path)
+    return not name.startswith(".") and name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher, folder):
+        self.watcher = watcher
+        self.folder = folder
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path, self.folder)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path, self.folder)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.dest_path, self.folder)
+
+class FolderWatcher:
+    """
+    Gobbles receipts as they land in the watched folders.
+
+    New files are debounced until their size and mtime stop changing, then sent through
+    the usual extract -> rename -> Notion -> history pipeline. The manifest remembers
+    what was handled (by path/size/mtime and by content hash), so restarts resume where
+    they left off and the watcher ignores the renamed files it produces itself.
+    """
+
+    def __init__(self, folders, settle_seconds=DEFAULT_SETTLE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.mode = None
+        self._lock = threading.Lock()
+        self._pending = {} # path -> {"folder", "size", "mtime_ns", "stable_since"}
+        self._in_flight_paths = set()
+        self._in_flight_hashes = set()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+        self._stats = {"gobbled": 0, "errors": 0, "skipped": 0}
+
+    def start(self):
+        folders = [folder for folder in self.folders if os.path.isdir(folder)]
+        for missing in set(self.folders) - set(folders):
+            logger.error(f"Watch folder not found: {missing}")
+        self.folders = folders
+
+        self.mode = "polling"
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                for folder in self.folders:
+                    self._observer.schedule(_EventHandler(self, folder), folder, recursive=True)
+                self._observer.start()
+                self.mode = "events"
+            except Exception as e:
+                logger.warning(f"File events unavailable, falling back to polling: {e}")
+                self._observer = None
+
+        self._thread = threading.Thread(target=self._run, name="gobbla-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.folders} ({self.mode})")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def notice(self, path, folder):
+        """Queue a path for the settle check (from file events or scans)."""
+        if not is_candidate(path):
+            return
+        with self._lock:
+            if path not in self._in_flight_paths and path not in self._pending:
+                self._pending[path] = {"folder": folder, "size": None, "mtime_ns": None, "stable_since": None}
+
+    def status(self):
+        with self._lock:
+            return {
+                "folders": self.folders,
+                "mode": self.mode,
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight_paths),
+                **self._stats
+            }
+
+    def _scan(self):
+        for folder in self.folders:
+            for path in iter_folder_files(folder):
+                self.notice(path, folder)
+
+    def _run(self):
+        # Catch up on anything that landed while we weren't running
+        self._scan()
+        last_scan = time.time()
+
+        while not self._stop.wait(CHECK_INTERVAL_SECONDS):
+            if self.mode == "polling" and time.time() - last_scan >= self.poll_seconds:
+                self._scan()
+                last_scan = time.time()
+            try:
+                self._dispatch_settled()
+            except Exception as e:
+                logger.error(f"Watcher check failed: {e}")
+
+    def _dispatch_settled(self):
+        now = time.time()
+        with self._lock:
+            pending = list(self._pending.items())
+
+        for path, info in pending:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Gone (renamed by us, moved away, deleted)
+                self._drop(path)
+                continue
+
+            if manifest.is_unchanged(path, st):
+                self._drop(path)
+                continue
+
+            # Still being written? Restart the settle clock on every change.
+            if (st.st_size, st.st_mtime_ns) != (info["size"], info["mtime_ns"]):
+                info.update(size=st.st_size, mtime_ns=st.st_mtime_ns, stable_since=now)
+                continue
+
+            if st.st_size > 0 and now - info["stable_since"] >= self.settle_seconds:
+                with self._lock:
+                    self._pending.pop(path, None)
+                    self._in_flight_paths.add(path)
+                get_executor().submit(metrics.with_source("watch", self._gobble), path, info["folder"])
+
+    def _drop(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def _gobble(self, path, folder):
+        content_hash = None
+        owns_hash = False
+        try:
+            content_hash = hash_file(path)
+
+            # Same bytes already in progress: this is one of our own renamed files
+            # (or a re-dropped copy) turning up mid-gobble, not a new receipt.
+            with self._lock:
+                owns_hash = content_hash not in self._in_flight_hashes
+                if owns_hash:
+                    self._in_flight_hashes.add(content_hash)
+            if not owns_hash:
+                manifest.record(folder, path, content_hash)
+                self._count("skipped")
+                return
+
+            result = gobble_new_file(path, folder, content_hash=content_hash)
+            status = result["status"]
+            self._count(status if status in ("gobbled", "skipped") else "errors")
+
+        except Exception as e:
+            logger.error(f"Watcher failed on {path}: {e}")
+            self._count("errors")
+        finally:
+            # By now the manifest has the renamed file's hash, so releasing is safe
+            with self._lock:
+                self._in_flight_paths.discard(path)
+                if owns_hash:
+                    self._in_flight_hashes.discard(content_hash)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+_watcher = None
+
+def start_from_settings():
+    """Starts watching the folders in the watch_folders setting, if any."""
+    global _watcher
+    folders = get_setting("watch_folders") or []
+    if not folders or _watcher is not None:
+        return _watcher
+    _watcher = FolderWatcher(
+        folders,
+        settle_seconds=float(get_setting("watch_settle_seconds", DEFAULT_SETTLE_SECONDS)),
+        poll_seconds=float(get_setting("watch_poll_seconds", DEFAULT_POLL_SECONDS))
+    )
+    _watcher.start()
+    return _watcher
+
+def stop():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+def get_status():
+    return _watcher.status() if _watcher else {"folders": [], "mode": None}
+
+if __name__ == "__main__":
+    # Standalone daemon: python watcher.py (no web UI)
+    logging.basicConfig(level=logging.INFO)
+    if start_from_settings() is None:
+        print("No watch_folders configured in ~/.mighty_gobbla_settings.json")
+    else:
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            stop()
@@ -0,0 +1,142 @@
+"""
+Compares extraction throughput of one request per receipt vs batched requests.
+
+Usage (from anywhere):
+    python src/mighty_gobbla/benchmarks/bench_batching.py C:\\Path\\To\\Receipts --batch-size 5
+    python src/mighty_gobbla/benchmarks/bench_batching.py C:\\Path\\To\\Receipts --simulate
+
+Real runs send every file to Gemini twice (once per mode) and cost quota; the extraction
+cache is bypassed so both modes do the same work. --simulate swaps Gemini for a fake model
+with a fixed per-request overhead plus a per-receipt cost, to see the shape without quota.
+Agreement is the share of receipts where both modes extracted the same fields.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import processor
+import extraction_cache
+import gemini_limiter
+from pipeline import iter_folder_files
+
+FIELDS = ("date", "store", "payment", "amount")
+
+class CallCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def wrap(self, get_model):
+        def counted_get_model(name):
+            model = get_model(name)
+            counter = self
+
+            class Counted:
+                def generate_content(self, contents, generation_config=None):
+                    with counter.lock:
+                        counter.calls += 1
+                    return model.generate_content(contents, generation_config=generation_config)
+            return Counted()
+        return counted_get_model
+
+class FakeModel:
+    """Answers like Gemini would, after sleeping overhead + per_receipt per receipt."""
+
+    def __init__(self, overhead, per_receipt):
+        self.overhead = overhead
+        self.per_receipt = per_receipt
+
+    def generate_content(self, contents, generation_config=None):
+        # Split the request back into receipts; each answer is derived from its image bytes
+        receipts = []
+        for part in contents:
+            if isinstance(part, str) and part.startswith("Receipt "):
+                receipts.append(b"")
+            elif isinstance(part, dict):
+                if not receipts:
+                    receipts.append(b"")
+                receipts[-1] += part["data"]
+        time.sleep(self.overhead + self.per_receipt * len(receipts))
+
+        def answer(i, data):
+            fingerprint = sum(data) % 1000
+            return {"index": i, "date": "250101", "store": f"Store{fingerprint}",
+                    "payment": "Cash", "amount": fingerprint / 10}
+
+        answers = [answer(i, data) for i, data in enumerate(receipts)]
+        batched = isinstance(contents[0], str)
+
+        class Response:
+            text = json.dumps(answers if batched else answers[0])
+        return Response()
+
+def run_mode(files, batch_size, concurrency):
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [result for batch_results in pool.map(processor.process_documents, batches)
+                   for result in batch_results]
+    return results, time.perf_counter() - start
+
+def run(folder, batch_size, concurrency, limit=None, simulate=False, overhead=1.5, per_receipt=0.3):
+    files = list(iter_folder_files(folder))[:limit]
+    if not files:
+        print("No receipts found")
+        return
+
+    # Both modes must really extract, not read each other's answers from the cache
+    extraction_cache.get_cached = lambda *args, **kwargs: None
+    extraction_cache.store = lambda *args, **kwargs: None
+    # ...and local OCR isn't what's being compared
+    processor.try_local_ocr = lambda *args, **kwargs: None
+
+    if simulate:
+        fake = FakeModel(overhead, per_receipt)
+        processor.registry.get_model = lambda name: fake
+        # No real quota to protect, and the rate limit would hide what batching saves
+        unlimited = gemini_limiter.GeminiLimiter(concurrency, 0)
+        gemini_limiter.get_limiter = lambda: unlimited
+    counter = CallCounter()
+    processor.registry.get_model = counter.wrap(processor.registry.get_model)
+
+    print(f"Files: {len(files)}   concurrency: {concurrency}   batch size: {batch_size}"
+          f"{'   (simulated)' if simulate else ''}")
+    print()
+
+    runs = {}
+    for label, size in (("Single-file", 1), (f"Batched x{batch_size}", batch_size)):
+        counter.calls = 0
+        results, elapsed = run_mode(files, size, concurrency)
+        runs[label] = results
+        print(f"{label:<16} {elapsed:>8.1f} s   {len(files) / elapsed:>7.2f} files/s   "
+              f"{counter.calls:>5} model calls")
+
+    single, batched = runs.values()
+    same = sum(1 for a, b in zip(single, batched)
+               if all(str(a.get(f)) == str(b.get(f)) for f in FIELDS))
+    # A lone file left over at the end is never batched, so it isn't a fallback
+    batchable = len(files) - (1 if len(files) % batch_size == 1 else 0)
+    fallbacks = sum(1 for r in batched[:batchable] if "Batch" not in str(r.get("raw_text_debug", "")))
+    print()
+    print(f"Agreement: {same}/{len(files)}   single-file fallbacks in batch mode: {fallbacks}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched receipt extraction")
+    parser.add_argument("folder", help="Folder of sample receipts")
+    parser.add_argument("--batch-size", type=int, default=5, help="Receipts per batched request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N files")
+    parser.add_argument("--simulate", action="store_true", help="Use a fake model instead of Gemini")
+    parser.add_argument("--overhead", type=float, default=1.5, help="Simulated seconds per request")
+    parser.add_argument("--per-receipt", type=float, default=0.3, help="Simulated seconds per receipt")
+    args = parser.parse_args()
+
+    run(args.folder, args.batch_size, args.concurrency, limit=args.limit, simulate=args.simulate,
+        overhead=args.overhead, per_receipt=args.per_receipt)
@@ -0,0 +1,417 @@
+"""
+Load benchmark for /upload_files and /process_folder, fully offline.
+
+Each scenario starts the real app (bench_server.py) in its own process with a scratch
+HOME, a stub Gemini model and a fake Notion server (fake_notion.py), feeds it a synthetic
+receipt corpus, and reports files/sec, p50/p95/p99 latency per endpoint and the server's
+peak RSS.
+
+Usage (from anywhere):
+    python src/mighty_gobbla/benchmarks/bench_pipeline.py
+    python src/mighty_gobbla/benchmarks/bench_pipeline.py --sizes 10,100 --endpoints folder
+    python src/mighty_gobbla/benchmarks/bench_pipeline.py --json before.json
+    python src/mighty_gobbla/benchmarks/bench_pipeline.py --baseline before.json
+
+With --baseline the run is compared to a saved --json run and the script exits with
+status 1 if throughput dropped or p95 latency grew by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageDraw
+
+from fake_notion import FakeNotion
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ---------------------------------------------------------------- corpus
+
+ITEMS = ["MILK 2% GAL", "BREAD WHT", "EGGS LG 12", "BANANAS", "COFFEE 12OZ", "PAPER TOWEL",
+         "UNLEADED 87", "CHIPS", "SODA 12PK", "BATTERIES AA", "SHAMPOO", "APPLES"]
+
+def make_receipt(path, index):
+    """A plain receipt-looking image; every file is different so nothing is deduped."""
+    rnd = random.Random(index)
+    lines = [f"STORE #{rnd.randint(100, 999)}", f"{rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/25", ""]
+    total = 0.0
+    for _ in range(rnd.randint(3, 15)):
+        price = rnd.randint(99, 4999) / 100.0
+        total += price
+        lines.append(f"{rnd.choice(ITEMS):<20}{price:>8.2f}")
+    lines += ["", f"{'TOTAL':<20}{total:>8.2f}", f"VISA ************{rnd.randint(1000, 9999)}", f"REF {index:08d}"]
+
+    image = Image.new("L", (576, 120 + 22 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, 60 + i * 22), line, fill=0)
+    # A little sensor noise, like a photo
+    for _ in range(400):
+        image.putpixel((rnd.randrange(image.width), rnd.randrange(image.height)), rnd.randint(150, 255))
+
+    if index % 10 == 9:
+        image.save(path + ".png")
+    else:
+        image.save(path + ".jpg", quality=85)
+
+def make_corpus(folder, size):
+    os.makedirs(folder, exist_ok=True)
+    for i in range(size):
+        make_receipt(os.path.join(folder, f"receipt_{i:05d}"), i)
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder))
+
+# ---------------------------------------------------------------- server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def peak_rss_mb(pid):
+    """High-water RSS of a running process, or None if this platform can't tell."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process(pid).memory_info()
+        # Windows tracks the peak itself; elsewhere this is only the current RSS
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+class Server:
+    """The app in a child process with its own HOME."""
+
+    def __init__(self, scratch, args, notion_url):
+        self.scratch = scratch
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+        home = os.path.join(scratch, "home")
+        os.makedirs(home, exist_ok=True)
+        with open(os.path.join(home, ".mighty_gobbla_settings.json"), "w") as f:
+            json.dump({
+                "notion_enabled": not args.no_notion,
+                "notion_token": "bench-token",
+                "notion_db_id": "bench-db",
+                "blocking_workers": args.blocking_workers,
+                "folder_concurrency": args.folder_concurrency,
+                "extraction_batch_size": args.batch_size,
+                "local_ocr_enabled": args.local_ocr,
+                "gemini_max_concurrent": args.gemini_concurrency,
+                "gemini_requests_per_minute": args.gemini_rpm
+            }, f)
+
+        env = dict(os.environ, HOME=home, USERPROFILE=home, PYTHONUNBUFFERED="1")
+        self.log = open(os.path.join(scratch, "server.log"), "w")
+        self.process = subprocess.Popen([
+            sys.executable, os.path.join(BENCH_DIR, "bench_server.py"),
+            "--port", str(self.port),
+            "--static-dir", os.path.join(scratch, "static"),
+            "--notion-url", notion_url,
+            "--model-latency-ms", str(args.model_latency_ms),
+            "--model-jitter-ms", str(args.model_jitter_ms),
+            "--model-error-rate", str(args.model_error_rate),
+            "--model-quota-rpm", str(args.model_quota_rpm)
+        ], env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited early, see {self.log.name}")
+            try:
+                requests.get(f"{self.base_url}/executor/stats", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f"Server did not start, see {self.log.name}")
+
+    def stop(self):
+        rss = peak_rss_mb(self.process.pid)
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        return rss
+
+# ---------------------------------------------------------------- drivers
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {} # label -> [seconds]
+        self.outcomes = {}  # e.g. gobbled / error / notion:success
+
+    def latency(self, label, seconds):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(seconds)
+
+    def outcome(self, key):
+        with self._lock:
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def result(self, item):
+        for receipt in item.get("receipts") or [item]:
+            self.outcome(receipt.get("status", "unknown"))
+            notion = receipt.get("notion_status")
+            if notion:
+                self.outcome(f"notion:{notion.get('status')}")
+
+def drive_upload(server, files, args, rec):
+    """Clients upload upload_batch files per request, then poll each job until it's done."""
+    local = threading.local()
+    batches = [files[i:i + args.upload_batch] for i in range(0, len(files), args.upload_batch)]
+
+    def run_batch(batch):
+        # One session (keep-alive connection) per client thread
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        handles = [open(path, "rb") for path in batch]
+        try:
+            started = time.perf_counter()
+            resp = session.post(f"{server.base_url}/upload_files",
+                                files=[("files", (os.path.basename(path), handle)) for path, handle in zip(batch, handles)])
+            rec.latency("POST /upload_files", time.perf_counter() - started)
+            resp.raise_for_status()
+        finally:
+            for handle in handles:
+                handle.close()
+
+        pending = [job["job_id"] for job in resp.json()["jobs"] if job.get("job_id")]
+        for _ in range(len(batch) - len(pending)):
+            rec.outcome("upload_rejected")
+        while pending:
+            time.sleep(args.poll_interval)
+            still = []
+            for job_id in pending:
+                poll_started = time.perf_counter()
+                job = session.get(f"{server.base_url}/jobs/{job_id}").json()
+                rec.latency("GET /jobs/{id}", time.perf_counter() - poll_started)
+                if job["status"] in ("done", "error"):
+                    rec.latency("upload -> job done", time.perf_counter() - started)
+                    rec.result(job.get("result") or {"status": "error"})
+                else:
+                    still.append(job_id)
+            pending = still
+
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(run_batch, batches))
+
+def drive_folder(server, files, args, rec, scratch):
+    """One /process_folder run over a copy of the corpus, then an incremental re-run."""
+    folder = os.path.join(scratch, "folder")
+    os.makedirs(folder, exist_ok=True)
+    for path in files:
+        shutil.copy(path, folder)
+
+    def run(label):
+        started = time.perf_counter()
+        resp = requests.post(f"{server.base_url}/process_folder", data={"folder_path": folder}, stream=True)
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            item = json.loads(line)
+            if "summary" in item:
+                continue
+            rec.latency(f"{label} (time to each result)", time.perf_counter() - started)
+            rec.result(item)
+        elapsed = time.perf_counter() - started
+        rec.latency(label, elapsed)
+        return elapsed
+
+    elapsed = run("POST /process_folder")
+    # Nothing changed, so this should just walk the manifest
+    rerun = run("POST /process_folder re-run")
+    return elapsed, rerun
+
+# ---------------------------------------------------------------- reporting
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize_latencies(latencies):
+    return {
+        label: {
+            "n": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1)
+        }
+        for label, values in latencies.items() if values
+    }
+
+def wait_for_outbox(server, args):
+    """Notion writes are queued and sent in the background; seconds until the outbox is empty."""
+    if args.no_notion:
+        return 0.0
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.outbox_timeout:
+        if requests.get(f"{server.base_url}/notion/outbox").json()["pending"] == 0:
+            break
+        time.sleep(0.2)
+    return time.perf_counter() - started
+
+def run_scenario(endpoint, size, corpus, args, root):
+    scratch = os.path.join(root, f"{endpoint}_{size}")
+    os.makedirs(scratch)
+    notion = FakeNotion(args.notion_latency_ms, args.notion_jitter_ms, args.notion_error_rate)
+    server = Server(scratch, args, notion.start())
+    rec = Recorder()
+    rss = None
+    try:
+        server.wait_ready()
+        started = time.perf_counter()
+        if endpoint == "upload":
+            drive_upload(server, corpus, args, rec)
+            wall = time.perf_counter() - started
+        else:
+            wall, _ = drive_folder(server, corpus, args, rec, scratch)
+        drain = wait_for_outbox(server, args)
+        limiter = requests.get(f"{server.base_url}/models/limiter").json()
+    finally:
+        rss = server.stop()
+        notion.stop()
+
+    return {
+        "scenario": f"{endpoint} x{size}",
+        "endpoint": endpoint,
+        "files": size,
+        "wall_s": round(wall, 2),
+        "files_per_s": round(size / wall, 2) if wall else 0.0,
+        # After the last result came back, until the last queued Notion page landed
+        "notion_drain_s": round(drain, 2),
+        "peak_rss_mb": round(rss, 1) if rss else None,
+        "outcomes": rec.outcomes,
+        "latency": summarize_latencies(rec.latencies),
+        "notion_requests": dict(notion.counts),
+        "gemini_limiter": limiter
+    }
+
+def print_report(results):
+    print()
+    print(f"{'Scenario':<16} {'Files':>6} {'Wall s':>8} {'Files/s':>8} {'Drain s':>8} {'Peak RSS MB':>12}  Outcomes")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] else "n/a"
+        outcomes = ", ".join(f"{key}={value}" for key, value in sorted(r["outcomes"].items()))
+        print(f"{r['scenario']:<16} {r['files']:>6} {r['wall_s']:>8.2f} {r['files_per_s']:>8.2f} {r.get('notion_drain_s', 0.0):>8.2f} {rss:>12}  {outcomes}")
+
+    print()
+    print(f"{'Scenario':<16} {'Latency':<46} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        for label, stats in r["latency"].items():
+            print(f"{r['scenario']:<16} {label:<46} {stats['n']:>6} "
+                  f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+    print()
+    print(f"{'Scenario':<16} {'Gemini calls':>12} {'429s':>6} {'Avg wait ms':>12} {'Max wait ms':>12}")
+    for r in results:
+        limiter = r.get("gemini_limiter") or {}
+        print(f"{r['scenario']:<16} {limiter.get('calls', 0):>12} {limiter.get('rate_limited', 0):>6} "
+              f"{limiter.get('avg_queue_wait_ms', 0.0):>12.1f} {limiter.get('max_queue_wait_ms', 0.0):>12.1f}")
+
+def compare(results, baseline_path, tolerance):
+    """Prints changes vs a saved run. Returns True if anything regressed past tolerance."""
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    regressed = False
+    print()
+    print(f"Compared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        before = baseline.get(r["scenario"])
+        if not before:
+            continue
+        if before["files_per_s"]:
+            change = r["files_per_s"] / before["files_per_s"] - 1
+            flag = "  REGRESSION" if change < -tolerance else ""
+            regressed |= bool(flag)
+            print(f"  {r['scenario']:<16} files/s {before['files_per_s']:>8.2f} -> {r['files_per_s']:>8.2f} ({change:+.0%}){flag}")
+        for label, stats in r["latency"].items():
+            old = before["latency"].get(label)
+            if not old or not old["p95_ms"]:
+                continue
+            change = stats["p95_ms"] / old["p95_ms"] - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            regressed |= bool(flag)
+            print(f"  {r['scenario']:<16} p95 {label:<40} {old['p95_ms']:>9.1f} -> {stats['p95_ms']:>9.1f} ms ({change:+.0%}){flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the gobbling pipeline")
+    parser.add_argument("--sizes", default="10,100,1000", help="Corpus sizes, comma separated")
+    parser.add_argument("--endpoints", default="upload,folder", help="upload and/or folder")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent upload clients")
+    parser.add_argument("--upload-batch", type=int, default=5, help="Files per /upload_files request")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="Seconds between /jobs polls")
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--model-jitter-ms", type=float, default=200)
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--model-quota-rpm", type=float, default=0,
+                        help="Stub Gemini answers 429 past this many calls a minute (0: no quota)")
+    parser.add_argument("--gemini-concurrency", type=int, default=8, help="gemini_max_concurrent setting")
+    parser.add_argument("--gemini-rpm", type=float, default=0,
+                        help="gemini_requests_per_minute setting (0: no rate limit)")
+    parser.add_argument("--notion-latency-ms", type=float, default=300)
+    parser.add_argument("--notion-jitter-ms", type=float, default=100)
+    parser.add_argument("--notion-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-notion", action="store_true", help="Run with Notion sync off")
+    parser.add_argument("--outbox-timeout", type=float, default=600,
+                        help="Max seconds to wait for queued Notion writes after a run")
+    parser.add_argument("--blocking-workers", type=int, default=8)
+    parser.add_argument("--folder-concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1, help="extraction_batch_size setting")
+    parser.add_argument("--local-ocr", action="store_true", help="Leave local OCR on (needs tesseract)")
+    parser.add_argument("--json", help="Save results here")
+    parser.add_argument("--baseline", help="Compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown for --baseline")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch folder (logs, corpora)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    root = tempfile.mkdtemp(prefix="gobbla-bench-")
+    print(f"Scratch folder: {root}")
+
+    results = []
+    try:
+        for size in sizes:
+            corpus = make_corpus(os.path.join(root, f"corpus_{size}"), size)
+            for endpoint in endpoints:
+                print(f"Running {endpoint} x{size}...", flush=True)
+                results.append(run_scenario(endpoint, size, corpus, args, root))
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nSaved to {args.json}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares what we send to Gemini with and without the preprocessing stage.
+
+Usage (from anywhere):
+    python src/mighty_gobbla/benchmarks/bench_preprocess.py C:\\Path\\To\\Receipts
+    python src/mighty_gobbla/benchmarks/bench_preprocess.py C:\\Path\\To\\Receipts --live
+
+Without --live only payload sizes and preprocessing time are measured.
+With --live every file is also sent to Gemini twice (raw and preprocessed) to time extraction.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from preprocess import prepare_parts
+from pipeline import iter_folder_files
+
+MIME_TYPES = {".png": "image/png", ".pdf": "application/pdf"}
+
+def time_extraction(parts):
+    """One direct model call, bypassing the extraction cache. Returns seconds."""
+    from processor import registry, generate, EXTRACTION_PROMPT
+    from receipt_schema import RECEIPT_SCHEMA
+    model_name = registry.ordered_candidates()[0]
+    start = time.perf_counter()
+    generate(model_name, parts + [EXTRACTION_PROMPT], RECEIPT_SCHEMA)
+    return time.perf_counter() - start
+
+def summarize(label, values, unit):
+    if not values:
+        return
+    print(f"{label:<28} total {sum(values):>12.1f} {unit}   "
+          f"mean {statistics.mean(values):>10.1f}   median {statistics.median(values):>10.1f}")
+
+def run(folder, live=False, limit=None):
+    raw_bytes, sent_bytes, prep_ms = [], [], []
+    raw_latency, prep_latency = [], []
+
+    for i, file_path in enumerate(iter_folder_files(folder)):
+        if limit and i >= limit:
+            break
+        ext = os.path.splitext(file_path)[1].lower()
+        mime_type = MIME_TYPES.get(ext, "image/jpeg")
+        with open(file_path, "rb") as f:
+            file_data = f.read()
+
+        start = time.perf_counter()
+        parts = prepare_parts(file_data, mime_type)
+        prep_ms.append((time.perf_counter() - start) * 1000)
+
+        raw_bytes.append(len(file_data) / 1024)
+        sent_bytes.append(sum(len(part['data']) for part in parts) / 1024)
+
+        if live:
+            raw_latency.append(time_extraction([{'mime_type': mime_type, 'data': file_data}]))
+            prep_latency.append(time_extraction(parts))
+
+        print(f"{os.path.basename(file_path):<40} {raw_bytes[-1]:>10.1f} KB -> {sent_bytes[-1]:>8.1f} KB")
+
+    print()
+    print(f"Files: {len(raw_bytes)}")
+    summarize("Bytes sent (before)", raw_bytes, "KB")
+    summarize("Bytes sent (after)", sent_bytes, "KB")
+    summarize("Preprocess time", prep_ms, "ms")
+    summarize("Extraction latency (before)", raw_latency, "s")
+    summarize("Extraction latency (after)", prep_latency, "s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark receipt preprocessing")
+    parser.add_argument("folder", help="Folder of sample receipts")
+    parser.add_argument("--live", action="store_true", help="Also time real Gemini calls (costs quota)")
+    parser.add_argument("--limit", type=int, default=None, help="Only look at the first N files")
+    args = parser.parse_args()
+
+    run(args.folder, live=args.live, limit=args.limit)
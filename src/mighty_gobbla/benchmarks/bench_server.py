@@ -0,0 +1,116 @@
+"""
+Runs the real FastAPI app with Gemini replaced by a stub model and Notion pointed at a
+fake server. Started by bench_pipeline.py in its own process (with HOME pointed at a
+scratch folder, so settings, history and caches never touch the real ones).
+
+    python src/mighty_gobbla/benchmarks/bench_server.py --port 8001 --static-dir /tmp/x \\
+        --notion-url http://127.0.0.1:8765/v1 --model-latency-ms 800
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+STORES = ["Kroger", "Walmart", "Target", "Costco", "Shell", "Home Depot", "Lowe's", "Walgreens",
+          "Publix", "Aldi", "Meijer", "Starbucks", "Speedway", "Best Buy", "Chevron", "CVS"]
+PAYMENTS = ["Card-1234", "Card-5678", "Amex-1002", "Cash"]
+
+class StubModel:
+    """
+    Answers like Gemini after latency_ms (+- jitter_ms), failing error_rate of calls.
+    With quota_rpm, calls past that many in the last minute get a 429 with a retry hint.
+    The answer is derived from the image bytes, so the same file always reads the same.
+    """
+
+    def __init__(self, latency_ms, jitter_ms, error_rate, quota_rpm=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_rpm = quota_rpm
+        self._accepted = [] # Times of the calls inside the quota window
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None):
+        # Split batched requests back into receipts ("Receipt i of N" markers)
+        receipts = []
+        for part in contents:
+            if isinstance(part, str) and part.startswith("Receipt "):
+                receipts.append(b"")
+            elif isinstance(part, dict):
+                if not receipts:
+                    receipts.append(b"")
+                receipts[-1] += part["data"]
+
+        with self._lock:
+            if self.quota_rpm:
+                now = time.time()
+                self._accepted = [t for t in self._accepted if t > now - 60]
+                if len(self._accepted) >= self.quota_rpm:
+                    retry_in = self._accepted[0] + 60 - now
+                    raise RuntimeError(f"429 Resource has been exhausted (e.g. check quota). Please retry in {retry_in:.1f}s.")
+                self._accepted.append(now)
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            failed = self._random.random() < self.error_rate
+        time.sleep(max(0.0, delay) / 1000.0)
+        if failed:
+            raise RuntimeError("503 Stub model unavailable")
+
+        answers = [self._answer(i, data) for i, data in enumerate(receipts)]
+        text = json.dumps(answers if isinstance(contents[0], str) else answers[0])
+
+        class Response:
+            pass
+        response = Response()
+        response.text = text
+        return response
+
+    def _answer(self, index, data):
+        seed = int(hashlib.sha256(data).hexdigest()[:12], 16)
+        day = seed % 365
+        return {
+            "index": index,
+            "date": time.strftime("%y%m%d", time.localtime(time.time() - day * 86400)),
+            "store": STORES[seed % len(STORES)],
+            "payment": PAYMENTS[(seed // 7) % len(PAYMENTS)],
+            "amount": round(1 + (seed % 50000) / 100.0, 2)
+        }
+
+def install_stubs(static_dir, notion_url, model_latency_ms, model_jitter_ms, model_error_rate, model_quota_rpm=0):
+    import processor
+    import notion_integration
+    import main
+
+    stub = StubModel(model_latency_ms, model_jitter_ms, model_error_rate, model_quota_rpm)
+    candidates = list(processor.registry._candidates)
+    # Every candidate "exists" and every one of them is the stub
+    processor.registry._list_models_fn = lambda: candidates
+    processor.registry.get_model = lambda name: stub
+
+    notion_integration.NOTION_API_URL = notion_url
+    # Nothing lands in backend/static (uploads go to the blob store under the scratch HOME)
+    main.STATIC_DIR = static_dir
+    return main.app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="The app with stubbed Gemini and Notion")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--static-dir", required=True)
+    parser.add_argument("--notion-url", required=True)
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--model-jitter-ms", type=float, default=200)
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--model-quota-rpm", type=float, default=0, help="Stub Gemini quota, 0 for none")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = install_stubs(args.static_dir, args.notion_url, args.model_latency_ms,
+                        args.model_jitter_ms, args.model_error_rate, args.model_quota_rpm)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,143 @@
+"""
+A local stand-in for the bits of the Notion API the app uses, for benchmarks.
+
+    POST /v1/pages                   creates a page (kept in memory)
+    POST /v1/databases/{id}/query    pages of that database, paginated like Notion
+
+Every request waits latency_ms (+- jitter_ms), and error_rate of page creations fail
+with a 429 (with Retry-After) or a 500, so retry and error paths get exercised.
+
+Standalone:
+    python src/mighty_gobbla/benchmarks/fake_notion.py --port 8765 --latency-ms 300 --error-rate 0.05
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeNotion:
+    def __init__(self, latency_ms=300, jitter_ms=100, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = []
+        self._server = None
+        self.counts = {"create": 0, "query": 0, "errors": 0}
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                status, payload, headers = fake.handle(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-notion", daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _sleep(self):
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000.0)
+
+    def handle(self, path, body):
+        """Returns (status, json_body, extra_headers)."""
+        self._sleep()
+        parts = path.strip("/").split("/")
+
+        if parts[-1] == "pages":
+            with self._lock:
+                self.counts["create"] += 1
+                failed = self._random.random() < self.error_rate
+                if failed:
+                    self.counts["errors"] += 1
+                    rate_limited = self._random.random() < 0.5
+            if failed:
+                if rate_limited:
+                    return 429, {"object": "error", "code": "rate_limited", "message": "Slow down"}, {"Retry-After": "1"}
+                return 500, {"object": "error", "code": "internal_server_error", "message": "Fake failure"}, {}
+            return 200, self._create_page(body), {}
+
+        if len(parts) >= 3 and parts[-3] == "databases" and parts[-1] == "query":
+            with self._lock:
+                self.counts["query"] += 1
+            return 200, self._query(parts[-2], body), {}
+
+        return 404, {"object": "error", "code": "object_not_found", "message": path}, {}
+
+    def _create_page(self, body):
+        page_id = str(uuid.uuid4())
+        page = {
+            "object": "page",
+            "id": page_id,
+            "parent": body.get("parent", {}),
+            "properties": body.get("properties", {}),
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "last_edited_time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z"),
+            "archived": False
+        }
+        with self._lock:
+            self._pages.append(page)
+        return page
+
+    def _query(self, db_id, body):
+        page_size = int(body.get("page_size") or 100)
+        start = int(body.get("start_cursor") or 0)
+        wanted = db_id.replace("-", "")
+        with self._lock:
+            pages = [page for page in self._pages
+                     if (page["parent"].get("database_id") or "").replace("-", "") == wanted]
+        batch = pages[start:start + page_size]
+        has_more = start + page_size < len(pages)
+        return {
+            "object": "list",
+            "results": batch,
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Notion API for benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeNotion(args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake Notion at {fake.start(args.port)}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The backend keeps its data files in ~ and works the paths out at import time, so HOME
+# has to point somewhere disposable before any backend module is imported.
+_home = tempfile.mkdtemp(prefix="gobbla-tests-")
+os.environ["HOME"] = _home
+os.environ["USERPROFILE"] = _home
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "mighty_gobbla", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture(autouse=True)
+def scratch_settings(tmp_path, monkeypatch):
+    """Every test starts from an empty settings file."""
+    import settings
+    monkeypatch.setattr(settings, "SETTINGS_FILE", str(tmp_path / "settings.json"))
+    monkeypatch.setattr(settings, "_cache", None)
+    monkeypatch.setattr(settings, "_cache_mtime", None)
+    return settings
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """fresh_db(module, "HISTORY_DB") points a module's SQLite file at tmp_path and drops its connection."""
+    def use(module, path_attr):
+        monkeypatch.setattr(module, path_attr, str(tmp_path / f"{module.__name__}.db"))
+        monkeypatch.setattr(module, "_conn", None)
+        return module
+    return use
@@ -0,0 +1,43 @@
+import hashlib
+import pytest
+import blobstore
+
+@pytest.fixture
+def store(fresh_db, tmp_path, monkeypatch):
+    blobs_dir = tmp_path / "blobs"
+    monkeypatch.setattr(blobstore, "BLOBS_DIR", str(blobs_dir))
+    monkeypatch.setattr(blobstore, "INCOMING_DIR", str(blobs_dir / "incoming"))
+    return fresh_db(blobstore, "BLOBS_DB")
+
+def upload(store, name, data):
+    path = store.incoming_path(name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_stored_by_content_hash(store):
+    digest = hashlib.sha256(b"receipt").hexdigest()
+    path = store.put(upload(store, "IMG_1.JPG", b"receipt"))
+    assert path == store.blob_path(digest, ".jpg")
+    assert path.endswith(f"{digest[:2]}/{digest[2:4]}/{digest}.jpg".replace("/", blobstore.os.sep))
+    assert store.is_blob(path)
+    assert store.find(digest) == path
+
+def test_identical_uploads_share_a_file(store):
+    first_upload = upload(store, "a.jpg", b"receipt")
+    first = store.put(first_upload)
+    second_upload = upload(store, "b.jpg", b"receipt")
+    second = store.put(second_upload, hashlib.sha256(b"receipt").hexdigest())
+    assert first == second
+    assert not blobstore.os.path.exists(first_upload)
+    assert not blobstore.os.path.exists(second_upload)
+
+def test_names_are_metadata(store):
+    path = store.put(upload(store, "a.jpg", b"receipt"))
+    name = store.add_name(path, "241109-Kroger-Cash", original="a.jpg")
+    assert name == "241109-Kroger-Cash.jpg"
+    assert store.url_path(path, "241109 Kroger.jpg") == f"/uploads/{blobstore.blob_hash(path)}/241109%20Kroger.jpg"
+
+def test_unknown_hash(store, tmp_path):
+    assert store.find("0" * 64) is None
+    assert not store.is_blob(str(tmp_path / "a.jpg"))
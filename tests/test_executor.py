@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import pytest
+from executor import MeteredExecutor, run_blocking
+
+def test_stats_count_tasks():
+    pool = MeteredExecutor(2, "test-pool")
+    release = threading.Event()
+    futures = [pool.submit(release.wait, 5) for _ in range(3)]
+    failing = pool.submit(lambda: 1 / 0)
+
+    stats = pool.stats()
+    assert stats["submitted"] == 4
+    assert stats["active"] == 2
+    assert stats["queued"] == 2
+    assert stats["saturation"] == 1.0
+
+    release.set()
+    for future in futures:
+        assert future.result(5)
+    with pytest.raises(ZeroDivisionError):
+        failing.result(5)
+
+    stats = pool.stats()
+    assert stats["completed"] == 4
+    assert stats["failed"] == 1
+    assert stats["active"] == stats["queued"] == 0
+
+def test_cancelled_task_leaves_the_queue():
+    pool = MeteredExecutor(1, "test-pool")
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    waiting = pool.submit(lambda: None)
+    assert waiting.cancel()
+    release.set()
+    running.result(5)
+    assert pool.stats()["queued"] == 0
+
+def test_run_blocking():
+    assert asyncio.run(run_blocking(sum, [1, 2, 3])) == 6
@@ -0,0 +1,44 @@
+import time
+import pytest
+import extraction_cache
+
+@pytest.fixture
+def cache(fresh_db, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "_stats", {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+    return fresh_db(extraction_cache, "CACHE_FILE")
+
+RECEIPT = {"date": "241109", "store": "Kroger", "payment": "Cash", "amount": 12.5, "raw_text_debug": "Gemini Success"}
+
+def test_hit_only_for_same_prompt_version(cache):
+    cache.store("hash", "2", RECEIPT)
+    assert cache.get_cached("hash", "2") == {"date": "241109", "store": "Kroger", "payment": "Cash", "amount": 12.5}
+    assert cache.get_cached("hash", "1") is None
+    assert cache.get_cached("other", "2") is None
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+    assert stats["hit_rate"] == 0.333
+
+def test_expired_entries_miss(cache, scratch_settings):
+    cache.store("hash", "2", RECEIPT)
+    with extraction_cache._lock:
+        extraction_cache._get_conn().execute("UPDATE extractions SET created_at = ?", (time.time() - 2 * 86400,))
+    scratch_settings.set_setting("extraction_cache_max_age_days", 1)
+    assert cache.get_cached("hash", "2") is None
+
+def test_least_recently_used_evicted(cache, scratch_settings):
+    scratch_settings.set_setting("extraction_cache_max_entries", 2)
+    cache.store("a", "2", RECEIPT)
+    cache.store("b", "2", RECEIPT)
+    with extraction_cache._lock:
+        extraction_cache._get_conn().execute("UPDATE extractions SET last_used_at = 0 WHERE key = '2:b'")
+    cache.store("c", "2", RECEIPT)
+
+    assert cache.get_cached("b", "2") is None
+    assert cache.get_cached("a", "2") and cache.get_cached("c", "2")
+    assert cache.get_stats()["evictions"] == 1
+
+def test_clear(cache):
+    cache.store("a", "2", RECEIPT)
+    cache.clear()
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,25 @@
+import pytest
+import extraction_stats
+
+@pytest.fixture(autouse=True)
+def empty_stats(monkeypatch):
+    monkeypatch.setattr(extraction_stats, "_stats", {})
+
+def test_hit_rates_and_shares():
+    extraction_stats.record("cache", False, 0.001)
+    extraction_stats.record("local", True, 0.2)
+    extraction_stats.record("gemini", True, 1.0)
+    extraction_stats.record("gemini_batch", 3, 2.0, attempts=4)
+
+    stats = extraction_stats.get_stats()
+    assert stats["receipts_extracted"] == 5
+    tiers = stats["tiers"]
+    assert (tiers["cache"]["attempts"], tiers["cache"]["hit_rate"]) == (1, 0.0)
+    assert tiers["gemini_batch"]["hit_rate"] == 0.75
+    assert tiers["gemini_batch"]["share"] == 0.6
+    assert tiers["local"]["p95_ms"] == 200.0
+
+def test_empty():
+    stats = extraction_stats.get_stats()
+    assert stats["receipts_extracted"] == 0
+    assert set(stats["tiers"]) == set(extraction_stats.TIERS)
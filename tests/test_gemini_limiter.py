@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+import gemini_limiter
+from gemini_limiter import GeminiLimiter
+
+class QuotaError(Exception):
+    code = 429
+
+def test_is_rate_limited():
+    assert gemini_limiter.is_rate_limited(QuotaError("quota"))
+    assert gemini_limiter.is_rate_limited(Exception("429 Resource has been exhausted"))
+    assert gemini_limiter.is_rate_limited(Exception("RESOURCE_EXHAUSTED"))
+    assert not gemini_limiter.is_rate_limited(ValueError("blocked"))
+
+def test_retry_after_from_message():
+    assert gemini_limiter.retry_after_seconds(Exception("Please retry in 12.5s.")) == 12.5
+    assert gemini_limiter.retry_after_seconds(Exception("retry_delay { seconds: 7 }")) == 7.0
+    assert gemini_limiter.retry_after_seconds(Exception("quota")) is None
+
+def test_429_is_waited_out_and_retried():
+    limiter = GeminiLimiter(2, 0, rate_limit_retries=2)
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise QuotaError("quota, retry in 0.05s")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.04
+    stats = limiter.stats()
+    assert stats["rate_limited"] == 2
+    assert stats["in_flight"] == 0
+
+def test_429_raised_after_retries():
+    limiter = GeminiLimiter(1, 0, rate_limit_retries=1)
+    attempts = []
+
+    def always_limited():
+        attempts.append(1)
+        raise QuotaError("retry in 0.01s")
+
+    with pytest.raises(QuotaError):
+        limiter.call(always_limited)
+    assert len(attempts) == 2
+
+def test_other_errors_not_retried():
+    limiter = GeminiLimiter(1, 0)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("blocked")
+
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert len(attempts) == 1
+    assert limiter.stats()["in_flight"] == 0
+
+def test_concurrency_cap():
+    limiter = GeminiLimiter(2, 0)
+    lock = threading.Lock()
+    running = [0, 0] # now, most at once
+
+    def work():
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert running[1] == 2
+
+def test_rate_limit_spaces_calls():
+    # 600/min is one every 0.1s once the burst (max_concurrent tokens) is used up
+    limiter = GeminiLimiter(1, 600)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.call(lambda: None)
+    assert time.monotonic() - started >= 0.18
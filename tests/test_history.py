@@ -0,0 +1,85 @@
+import json
+import pytest
+import history
+
+@pytest.fixture
+def db(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "LEGACY_HISTORY_FILE", str(tmp_path / "history.json"))
+    return fresh_db(history, "HISTORY_DB")
+
+def receipt(store, date="241109", amount=10.0, payment="Cash"):
+    return {"store": store, "date": date, "amount": amount, "payment": payment}
+
+def test_delete_and_clear(db):
+    db.add_history_entry("a.jpg", receipt("Kroger"))
+    db.add_history_entry("b.jpg", receipt("Shell"))
+    first_id = db.query_history()["items"][-1]["id"]
+    db.delete_entry(first_id)
+    assert [item["filename"] for item in db.query_history()["items"]] == ["b.jpg"]
+    db.clear_history()
+    assert db.query_history()["items"] == []
+
+def test_legacy_json_imported_once(db):
+    legacy = [
+        {"id": 7, "timestamp": "2024-11-09T10:00:00", "filename": "old.jpg", "directory": "Upload", "details": receipt("Kroger")},
+        {"id": 3, "timestamp": "2024-11-08T10:00:00", "filename": "older.jpg", "details": receipt("Shell")}
+    ]
+    with open(history.LEGACY_HISTORY_FILE, "w") as f:
+        json.dump(legacy, f)
+
+    items = db.query_history()["items"]
+    assert [(item["id"], item["filename"]) for item in items] == [(7, "old.jpg"), (3, "older.jpg")]
+    assert db.query_history(store="shell")["items"][0]["filename"] == "older.jpg"
+
+    # New entries continue after the highest imported id, and the file isn't read again
+    db.add_history_entry("new.jpg", receipt("Kroger"))
+    assert db.query_history(limit=1)["items"][0]["id"] == 8
+    assert not (history.os.path.exists(history.LEGACY_HISTORY_FILE))
+    assert history.os.path.exists(history.LEGACY_HISTORY_FILE + ".migrated")
+
+def test_retention(db, scratch_settings):
+    db.add_history_entry("a.jpg", receipt("Kroger"))
+    with history._lock:
+        history._get_conn().execute("UPDATE history SET timestamp = '2000-01-01T00:00:00'")
+    scratch_settings.set_setting("history_retention_days", 30)
+    db.add_history_entry("b.jpg", receipt("Shell"))
+    assert [item["filename"] for item in db.query_history()["items"]] == ["b.jpg"]
+
+def test_newest_first_with_keyset_pages(db):
+    for i in range(5):
+        db.add_history_entry(f"{i}.jpg", receipt("Kroger", amount=i))
+
+    first = db.query_history(limit=2)
+    assert [item["filename"] for item in first["items"]] == ["4.jpg", "3.jpg"]
+    second = db.query_history(limit=2, cursor=first["next_cursor"])
+    assert [item["filename"] for item in second["items"]] == ["2.jpg", "1.jpg"]
+    last = db.query_history(limit=2, cursor=second["next_cursor"])
+    assert [item["filename"] for item in last["items"]] == ["0.jpg"]
+    assert last["next_cursor"] is None
+
+def test_filters(db):
+    db.add_history_entry("a.jpg", receipt("Kroger", "241101", 5.0, "Visa-1234"), directory="C:/Receipts/2024")
+    db.add_history_entry("b.jpg", receipt("Shell", "241115", 40.0, "Cash"))
+    db.add_history_entry("c.jpg", receipt("kroger", "241201", 25.0, "Visa-9999"))
+
+    def names(**filters):
+        return [item["filename"] for item in db.query_history(**filters)["items"]]
+
+    assert names(store="KROGER") == ["c.jpg", "a.jpg"]
+    assert names(payment="visa") == ["c.jpg", "a.jpg"]
+    assert names(directory="c:/receipts") == ["a.jpg"]
+    assert names(date_from="2024-11-10", date_to="2024-11-30") == ["b.jpg"]
+    assert names(amount_min=10, amount_max=30) == ["c.jpg"]
+
+def test_prefix_filters_are_literal(db):
+    db.add_history_entry("a.jpg", receipt("Kroger", payment="Card_1"))
+    db.add_history_entry("b.jpg", receipt("Kroger", payment="CardX1"))
+    assert [item["filename"] for item in db.query_history(payment="Card_")["items"]] == ["a.jpg"]
+
+def test_page_size_is_capped(db):
+    assert db.query_history(limit=10000)["limit"] == history.MAX_PAGE_SIZE
+
+def test_known_stores_most_used_first(db):
+    for store in ("Shell", "Kroger", "Kroger", "Error", "Unknown"):
+        db.add_history_entry("x.jpg", receipt(store))
+    assert db.get_known_stores() == ["Kroger", "Shell"]
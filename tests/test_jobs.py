@@ -0,0 +1,41 @@
+import time
+import jobs
+
+def wait_for(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+def test_job_result():
+    job_id = jobs.submit_job("receipt.jpg", lambda name: {"original": name, "status": "success"}, "receipt.jpg")
+    job = wait_for(job_id)
+    assert job["status"] == "done"
+    assert job["original"] == "receipt.jpg"
+    assert job["result"]["status"] == "success"
+    assert job["finished_at"] >= job["started_at"]
+
+def test_error_result():
+    job = wait_for(jobs.submit_job("a.jpg", lambda: {"status": "error", "message": "nope"}))
+    assert job["status"] == "error"
+
+def test_crash_becomes_error():
+    def crash():
+        raise RuntimeError("boom")
+
+    job = wait_for(jobs.submit_job("b.jpg", crash))
+    assert job["status"] == "error"
+    assert job["result"] == {"original": "b.jpg", "status": "error", "message": "boom"}
+
+def test_unknown_job():
+    assert jobs.get_job("nope") is None
+
+def test_finished_jobs_expire(monkeypatch):
+    job_id = jobs.submit_job("c.jpg", lambda: {"status": "success"})
+    wait_for(job_id)
+    monkeypatch.setattr(jobs, "JOB_TTL_SECONDS", -1)
+    wait_for(jobs.submit_job("d.jpg", lambda: {"status": "success"}))
+    assert jobs.get_job(job_id) is None
@@ -0,0 +1,70 @@
+import pytest
+import local_ocr
+
+@pytest.fixture(autouse=True)
+def known_stores(monkeypatch):
+    """The built-in store list only, not whatever is in the test run's history."""
+    stores = [(name, local_ocr._store_pattern(name)) for name in local_ocr.KNOWN_STORES]
+    monkeypatch.setattr(local_ocr, "_known_stores", stores)
+    monkeypatch.setattr(local_ocr, "_known_stores_at", float("inf"))
+
+RECEIPT = [
+    "KROGER",
+    "123 Main St",
+    "11/09/2024 10:32",
+    "MILK 3.49",
+    "BREAD 2.99",
+    "SUBTOTAL 6.48",
+    "TAX 0.52",
+    "TOTAL 7.00",
+    "VISA ************1234 7.00",
+]
+
+def test_parse_clean_receipt():
+    result = local_ocr.parse_receipt(RECEIPT)
+    assert {key: result[key] for key in ("date", "store", "payment", "amount")} == \
+        {"date": "241109", "store": "Kroger", "payment": "Card-1234", "amount": 7.0}
+    assert result["confidence"] == 1.0
+
+def test_no_total_or_date_means_no_confidence():
+    assert local_ocr.parse_receipt(["KROGER", "TOTAL 7.00"])["confidence"] == 0.0
+
+def test_total_skips_subtotal_tax_and_savings():
+    lines = ["SUBTOTAL 20.00", "YOU SAVED 50.00", "TAX 1.60", "BALANCE DUE", "21.60", "CASH 30.00", "CHANGE 8.40"]
+    assert local_ocr.find_total(lines) == (21.6, 1.0)
+
+def test_decimal_comma_total():
+    assert local_ocr.find_total(["TOTAL 12,34"])[0] == 12.34
+
+def test_total_guess_without_a_total_line():
+    assert local_ocr.find_total(["MILK 3.49", "BREAD 12.99"]) == (12.99, 0.3)
+
+@pytest.mark.parametrize("line, expected", [
+    ("11/09/2024", "241109"),
+    ("25/12/2024", "241225"),
+    ("2024-11-09", "241109"),
+    ("Nov 9, 2024", "241109"),
+    ("9 Nov 2024", "241109"),
+])
+def test_find_date(line, expected):
+    assert local_ocr.find_date([line])[0] == expected
+
+def test_implausible_dates_ignored():
+    assert local_ocr.find_date(["01/01/1990"]) == (None, 0.0)
+
+def test_store_only_from_the_header():
+    lines = ["JOE'S HARDWARE", "42 Elm St", "", "Springfield", "555-0100", "HAMMER 12.99",
+             "TARGET GIFT CARD 25.00", "BP FUEL CARD", "TOTAL 37.99"]
+    assert local_ocr.find_store(lines) == ("Joe's Hardware", 0.5)
+
+def test_known_store_in_the_header():
+    assert local_ocr.find_store(["", "Welcome to", "TRADER JOES #552", "TOTAL 3.00"]) == ("Trader Joe's", 1.0)
+
+@pytest.mark.parametrize("lines, expected", [
+    (["AMEX xxxx1002"], ("Amex-1002", 1.0)),
+    (["DEBIT"], ("Card", 0.6)),
+    (["CASH 20.00"], ("Cash", 0.9)),
+    (["nothing here"], ("Unknown", 0.0)),
+])
+def test_find_payment(lines, expected):
+    assert local_ocr.find_payment(lines) == expected
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+import blobstore
+import history
+import main
+import pipeline
+
+@pytest.fixture
+def client(tmp_path, fresh_db, scratch_settings, monkeypatch):
+    fresh_db(history, "HISTORY_DB")
+    fresh_db(blobstore, "BLOBS_DB")
+    monkeypatch.setattr(history, "LEGACY_HISTORY_FILE", str(tmp_path / "history.json"))
+    monkeypatch.setattr(blobstore, "BLOBS_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(blobstore, "INCOMING_DIR", str(tmp_path / "blobs" / "incoming"))
+    monkeypatch.setattr(pipeline, "process_document", lambda file_path, content_hash=None:
+                        {"date": "241109", "store": "Kroger", "payment": "Cash", "amount": 9.99})
+    scratch_settings.set_setting("previews_enabled", False)
+    # No startup events: the watcher stays off
+    return TestClient(main.app)
+
+def wait_for_job(client, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = client.get(f"/jobs/{job_id}")
+        if response.json()["status"] in ("done", "error"):
+            return response
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+def test_upload_is_queued_as_a_job(client):
+    response = client.post("/upload_files", files=[("files", ("image.jpg", b"receipt", "image/jpeg"))])
+    job = response.json()["jobs"][0]
+    assert job["status"] == "queued"
+
+    result = wait_for_job(client, job["job_id"]).json()["result"]
+    assert result["new"] == "241109-Kroger-Cash.jpg"
+    assert history.query_history()["items"][0]["filename"] == "241109-Kroger-Cash.jpg"
+
+def test_unknown_job(client):
+    assert client.get("/jobs/nope").status_code == 404
+
+def test_oversized_request_rejected_up_front(client, scratch_settings):
+    scratch_settings.set_setting("max_request_mb", 0.001)
+    response = client.post("/upload_files", files=[("files", ("big.jpg", b"x" * 4096, "image/jpeg"))])
+    assert response.status_code == 413
+
+def test_oversized_file_rejected_while_streaming(client, scratch_settings, tmp_path):
+    scratch_settings.set_setting("max_upload_mb", 0.001)
+    response = client.post("/upload_files", files=[("files", ("small.jpg", b"receipt", "image/jpeg")),
+                                                    ("files", ("big.jpg", b"x" * 4096, "image/jpeg"))])
+    assert response.status_code == 413
+    assert "big.jpg" in response.json()["detail"]
+    # Nothing from the request is kept, not even the file that fit
+    assert os.listdir(tmp_path / "blobs" / "incoming") == []
+
+def test_upload_without_files(client):
+    assert client.post("/upload_files", data={"note": "hi"}).status_code == 400
+    assert client.post("/upload_files", json={}).status_code == 400
+
+def test_metrics_endpoint(client):
+    client.get("/jobs/nope")
+    text = client.get("/metrics").text
+    assert 'gobbla_http_requests_total{method="GET",route="/jobs/{job_id}",status="404"}' in text
+
+def test_debug_timings_with_a_unicode_name(client):
+    response = client.post("/upload_files?debug=1", files=[("files", ("收据.jpg", b"another receipt", "image/jpeg"))])
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("upload_save;dur=")
+
+    job = wait_for_job(client, response.json()["jobs"][0]["job_id"])
+    stages = [entry["stage"] for entry in job.json()["result"]["timings"]]
+    assert "rename" in stages and "history_write" in stages
+    assert "server-timing" in job.headers
+
+def test_uploads_are_served_immutable(client):
+    response = client.post("/upload_files", files=[("files", ("image.jpg", b"receipt", "image/jpeg"))])
+    wait_for_job(client, response.json()["jobs"][0]["job_id"])
+
+    digest = hashlib.sha256(b"receipt").hexdigest()
+    receipt = client.get(f"/uploads/{digest}/241109-Kroger-Cash.jpg")
+    assert receipt.content == b"receipt"
+    assert "immutable" in receipt.headers["cache-control"]
+    revalidated = client.get(f"/uploads/{digest}/x.jpg", headers={"If-None-Match": receipt.headers["etag"]})
+    assert revalidated.status_code == 304
+
+def test_unknown_receipt(client):
+    assert client.get("/uploads/abc/x.jpg").status_code == 404
+    assert client.get(f"/uploads/{'0' * 64}/x.jpg").status_code == 404
+
+def test_force_add_takes_the_gobbled_fields(client):
+    # What app.js sends after a duplicate warning; no Notion settings here, so it says so
+    response = client.post("/notion/force_add", data={"filename": "241109-Kroger-Cash.jpg", "date": "241109",
+                                                      "store": "Kroger", "payment": "Cash", "amount": "9.99"})
+    assert response.json() == {"status": "error", "message": "Notion Token or Database ID missing in settings."}
+    assert client.post("/notion/force_add", data={"filename": "241109-Kroger-Cash.jpg"}).status_code == 422
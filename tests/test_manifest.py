@@ -0,0 +1,53 @@
+import os
+import pytest
+import manifest
+
+@pytest.fixture
+def db(fresh_db):
+    return fresh_db(manifest, "MANIFEST_DB")
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "receipts"
+    path.mkdir()
+    return path
+
+def write(path, data=b"receipt"):
+    path.write_bytes(data)
+    return str(path)
+
+def test_unchanged_until_modified(db, folder):
+    path = write(folder / "a.jpg")
+    assert not db.is_unchanged(path, os.stat(path))
+    db.record(str(folder), path, sha256="abc")
+    assert db.is_unchanged(path, os.stat(path))
+
+    write(folder / "a.jpg", b"another receipt")
+    assert not db.is_unchanged(path, os.stat(path))
+
+def test_find_by_hash_only_gobbled(db, folder):
+    db.record(str(folder), write(folder / "a.jpg"), sha256="same", status="error")
+    assert db.find_by_hash("same") is None
+    db.record(str(folder), write(folder / "b.jpg"), sha256="same")
+    assert db.find_by_hash("same")["path"] == manifest.normalize_path(str(folder / "b.jpg"))
+
+def test_record_missing_file(db, folder):
+    db.record(str(folder), str(folder / "gone.jpg"))
+    assert db.get_entry(str(folder / "gone.jpg")) is None
+
+def test_tree_entries_leave_out_failed_files(db, folder):
+    gobbled = write(folder / "a.jpg")
+    failed = write(folder / "b.jpg")
+    nested = folder / "sub"
+    nested.mkdir()
+    deeper = write(nested / "c.jpg")
+    outside = write(folder.parent / "receipts2.jpg")
+    db.record(str(folder), gobbled)
+    db.record(str(folder), failed, status="failed")
+    db.record(str(folder), deeper)
+    db.record(str(folder.parent), outside)
+
+    entries = db.get_tree_entries(str(folder))
+    assert set(entries) == {manifest.normalize_path(gobbled), manifest.normalize_path(deeper)}
+    # The watcher still sees a failed file as handled until it changes
+    assert db.is_unchanged(failed, os.stat(failed))
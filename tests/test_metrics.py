@@ -0,0 +1,54 @@
+import metrics
+
+def test_counter_and_histogram_render():
+    counter = metrics.Counter("test_things_total", "Things.", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind='b"\n')
+    histogram = metrics.Histogram("test_seconds", "Latency.", buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+
+    text = metrics.render()
+    assert 'test_things_total{kind="a"} 1' in text
+    assert 'test_things_total{kind="b\\"\\n"} 2' in text
+    assert 'test_seconds_bucket{le="0.1"} 0' in text
+    assert 'test_seconds_bucket{le="1.0"} 1' in text
+    assert 'test_seconds_bucket{le="+Inf"} 1' in text
+    assert "test_seconds_count 1" in text
+
+def test_collectors_are_scraped():
+    metrics.register_collector(lambda: [("test_pool_size", "gauge", "Pool size.", [({"pool": "x"}, 3)])])
+    assert 'test_pool_size{pool="x"} 3' in metrics.render()
+
+def test_stages_outside_a_trace_are_only_counted():
+    assert not metrics.tracing()
+    metrics.observe_stage("rename", 0.1)
+    assert not metrics.tracing()
+
+def test_sources_label_pool_threads():
+    seen = []
+    metrics.with_source("watch", lambda: seen.append(metrics.current_source()))()
+    assert seen == ["watch"]
+    assert metrics.current_source() == "other"
+
+def test_server_timing_encodes_details():
+    header = metrics.server_timing([
+        {"stage": "file_read", "ms": 1.5},
+        {"stage": "model_attempt", "ms": 800.0, "detail": "models/gemini-2.0-flash"},
+        {"stage": "rename", "ms": 2.0, "detail": '收据 "1".jpg'},
+    ])
+    assert header.startswith('file_read;dur=1.5, model_attempt;dur=800.0;desc="models/gemini-2.0-flash", rename;dur=2.0;desc="')
+    # Headers are latin-1; nothing outside ASCII (or a stray quote) may get through
+    header.encode("ascii")
+    assert header.count('"') == 4
+
+def test_traced_results_get_timings():
+    def work():
+        with metrics.stage("cache_lookup"):
+            pass
+        metrics.observe_stage("rename", 0.25)
+        return {"status": "gobbled"}
+
+    result = metrics.traced(work)()
+    assert [entry["stage"] for entry in result["timings"]] == ["cache_lookup", "rename"]
+    assert result["timings"][1]["ms"] == 250.0
+    assert result["total_ms"] >= 0
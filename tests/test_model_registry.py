@@ -0,0 +1,39 @@
+import time
+import model_registry
+from model_registry import ModelRegistry
+
+MODELS = ["gemini-a", "models/gemini-b", "models/gemini-a", "gemini-c"]
+
+def registry(available=None):
+    return ModelRegistry(MODELS, lambda: available if available is not None else MODELS, probe_interval=3600)
+
+def test_names_normalized_and_deduplicated():
+    assert registry().ordered_candidates() == ["models/gemini-a", "models/gemini-b", "models/gemini-c"]
+
+def test_last_working_model_goes_first():
+    models = registry()
+    models.record_success("models/gemini-c")
+    assert models.ordered_candidates()[0] == "models/gemini-c"
+    models.record_failure("models/gemini-c", "boom")
+    assert models.ordered_candidates()[0] == "models/gemini-a"
+
+def test_circuit_opens_after_repeated_failures(monkeypatch):
+    models = registry()
+    for _ in range(model_registry.FAILURE_THRESHOLD):
+        models.record_failure("models/gemini-a", "500")
+    assert "models/gemini-a" not in models.ordered_candidates()
+    assert models.snapshot()["models"]["models/gemini-a"]["circuit"] == "open"
+
+    opened_at = time.time()
+    monkeypatch.setattr(model_registry.time, "time", lambda: opened_at + model_registry.OPEN_SECONDS + 1)
+    assert "models/gemini-a" in models.ordered_candidates()
+
+def test_unlisted_models_dropped():
+    models = registry(available=["gemini-b"])
+    models.probe()
+    assert models.ordered_candidates() == ["models/gemini-b"]
+
+def test_everything_broken_still_tries_everything():
+    models = registry(available=["something-else"])
+    models.probe()
+    assert models.ordered_candidates() == ["models/gemini-a", "models/gemini-b", "models/gemini-c"]
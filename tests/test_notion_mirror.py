@@ -0,0 +1,115 @@
+import pytest
+import notion_mirror
+import notion_outbox
+import notion_integration
+
+DB_ID = "db-123"
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+def page(page_id, date, vendor, subtotal, edited="2024-11-09T10:00:00.000Z"):
+    return {
+        "id": page_id,
+        "url": f"https://notion.so/{page_id}",
+        "last_edited_time": edited,
+        "properties": {
+            "Date Paid": {"date": {"start": date}},
+            "Vendor/Supplier": {"rich_text": [{"plain_text": vendor}]},
+            "Expense Description": {"title": [{"plain_text": f"{date}-{vendor}"}]},
+            "Subtotal": {"number": subtotal},
+            "Tax Amount": {"number": None}
+        }
+    }
+
+@pytest.fixture
+def mirror(fresh_db, monkeypatch):
+    fresh_db(notion_mirror, "MIRROR_DB")
+    monkeypatch.setattr(notion_mirror, "_initial_sync_failures", {})
+    return notion_mirror
+
+@pytest.fixture
+def notion(monkeypatch):
+    """Fake Notion query endpoint: set .pages (or .fail) and read .queries."""
+    class Notion:
+        pages = []
+        fail = False
+        queries = []
+
+    def post(url, headers=None, json=None, timeout=None):
+        Notion.queries.append(json)
+        if Notion.fail:
+            return FakeResponse({"message": "down"}, 503)
+        start = int(json.get("start_cursor") or 0)
+        results = Notion.pages[start:start + 2]
+        more = start + 2 < len(Notion.pages)
+        return FakeResponse({"results": results, "has_more": more, "next_cursor": str(start + 2) if more else None})
+
+    Notion.queries = []
+    monkeypatch.setattr(notion_mirror.requests, "post", post)
+    return Notion
+
+def test_first_sync_follows_pagination(mirror, notion):
+    notion.pages = [page(f"p{i}", "2024-11-09", "Kroger", float(i)) for i in range(5)]
+    assert mirror.ensure_fresh("token", DB_ID)
+    assert len(notion.queries) == 3
+    assert sorted(row["subtotal"] for row in mirror.find_by_date(DB_ID, "2024-11-09")) == [0, 1, 2, 3, 4]
+    assert mirror.get_stats(DB_ID)["pages"] == 5
+
+def test_incremental_refresh_asks_for_recent_edits(mirror, notion):
+    notion.pages = [page("p1", "2024-11-09", "Kroger", 5.0)]
+    mirror.refresh("token", DB_ID)
+    notion.pages = [page("p1", "2024-11-09", "Kroger", 6.0, edited="2024-11-10T10:00:00.000Z")]
+    mirror.refresh("token", DB_ID)
+    assert notion.queries[-1]["filter"]["last_edited_time"] == {"on_or_after": "2024-11-09T10:00:00.000Z"}
+    assert [row["subtotal"] for row in mirror.find_by_date(DB_ID, "2024-11-09")] == [6.0]
+
+def test_full_sync_drops_deleted_pages(mirror, notion):
+    notion.pages = [page("p1", "2024-11-09", "Kroger", 5.0), page("p2", "2024-11-09", "Shell", 9.0)]
+    mirror.refresh("token", DB_ID)
+    notion.pages = [page("p2", "2024-11-09", "Shell", 9.0)]
+    mirror.refresh("token", DB_ID, full=True)
+    assert [row["vendor"] for row in mirror.find_by_date(DB_ID, "2024-11-09")] == ["Shell"]
+
+def test_record_page(mirror):
+    created = page("p9", "2024-11-09", "Target", 3.0)
+    created["parent"] = {"database_id": DB_ID}
+    mirror.record_page(created)
+    assert [row["id"] for row in mirror.find_by_date(DB_ID.replace("-", ""), "2024-11-09")] == ["p9"]
+
+def test_failed_first_sync_backs_off(mirror, notion, monkeypatch):
+    notion.fail = True
+    assert not mirror.ensure_fresh("token", DB_ID)
+    assert not mirror.ensure_fresh("token", DB_ID)
+    # The second call is inside the backoff, so Notion was only asked once
+    assert len(notion.queries) == 1
+
+    monkeypatch.setattr(notion_mirror, "INITIAL_SYNC_RETRY_SECONDS", 0)
+    notion.fail = False
+    assert mirror.ensure_fresh("token", DB_ID)
+
+def test_fetch_by_date_queries_notion(mirror, notion):
+    notion.pages = [page("p1", "2024-11-09", "Kroger", 5.0)]
+    rows = mirror.fetch_by_date("token", DB_ID, "2024-11-09")
+    assert notion.queries[0]["filter"] == {"property": "Date Paid", "date": {"equals": "2024-11-09"}}
+    assert [(row["vendor"], row["subtotal"]) for row in rows] == [("Kroger", 5.0)]
+
+def test_duplicate_check_falls_back_to_live_query(mirror, notion, fresh_db, scratch_settings, monkeypatch):
+    fresh_db(notion_outbox, "OUTBOX_DB")
+    monkeypatch.setattr(notion_outbox, "start", lambda: None)
+    scratch_settings.set_setting("notion_token", "token")
+    scratch_settings.set_setting("notion_db_id", DB_ID)
+    monkeypatch.setattr(notion_mirror, "ensure_fresh", lambda token, db_id: False)
+    notion.pages = [page("p1", "2024-11-09", "Kroger", 12.5)]
+
+    result = notion_integration.add_to_notion_expenses(
+        {"date": "241109", "store": "Kroger", "amount": 12.5, "payment": "Cash", "filename": "241109-Kroger-Cash"})
+
+    assert result["status"] == "duplicate_suspected"
+    assert result["existing_url"] == "https://notion.so/p1"
@@ -0,0 +1,147 @@
+import time
+import pytest
+import history
+import notion_outbox
+import notion_integration
+import notion_mirror
+
+DB_ID = "db123"
+
+# The fixture swaps these out; the drainer test runs the real ones
+REAL_START = notion_outbox.start
+REAL_SEND = notion_outbox._send
+
+@pytest.fixture
+def outbox(fresh_db, monkeypatch):
+    fresh_db(notion_outbox, "OUTBOX_DB")
+    # Tests drive the drainer by hand unless they start it themselves
+    monkeypatch.setattr(notion_outbox, "start", lambda: None)
+    monkeypatch.setattr(notion_outbox, "_paused_until", 0.0)
+    monkeypatch.setattr(notion_outbox, "_last_sent_at", 0.0)
+    return notion_outbox
+
+@pytest.fixture
+def written_history(monkeypatch):
+    written = []
+    monkeypatch.setattr(history, "add_history_entry",
+                        lambda filename, details, directory=None: written.append((filename, details, directory)))
+    return written
+
+def payload(title="241109-Kroger-Cash", store="Kroger", amount=12.5):
+    return notion_integration.build_expense_payload(DB_ID, title, store, "2024-11-09", amount, "Cash")
+
+def reply(monkeypatch, *results):
+    """create_expense_page answers with results in turn (an exception is raised)."""
+    results = list(results)
+    sent = []
+
+    def create(headers, body):
+        sent.append(body)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(notion_integration, "create_expense_page", create)
+    return sent
+
+def entry(outbox_id):
+    with notion_outbox._lock:
+        return dict(notion_outbox._get_conn().execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone())
+
+def test_queued_pages_count_for_duplicates(outbox):
+    outbox.enqueue(payload())
+    pending = outbox.pending_for_date(DB_ID, "2024-11-09")
+    assert [(row["title"], row["vendor"], row["subtotal"]) for row in pending] == [("241109-Kroger-Cash", "Kroger", 12.5)]
+    assert outbox.pending_for_date(DB_ID, "2024-11-10") == []
+
+def test_sent_page_writes_history(outbox, scratch_settings, monkeypatch, written_history):
+    scratch_settings.set_setting("notion_token", "secret")
+    outbox_id = outbox.enqueue(payload(), {"filename": "a.jpg", "details": {"store": "Kroger"}, "directory": "Upload"})
+    sent = reply(monkeypatch, {"status": "success", "url": "https://notion.so/page"})
+
+    outbox._send(entry(outbox_id))
+
+    assert sent == [payload()]
+    assert entry(outbox_id)["status"] == "done"
+    assert written_history == [("a.jpg", {"store": "Kroger", "notion_url": "https://notion.so/page"}, "Upload")]
+    assert outbox.get_stats()["done"] == 1
+
+def test_429_backs_off_and_pauses_the_queue(outbox, scratch_settings, monkeypatch):
+    scratch_settings.set_setting("notion_token", "secret")
+    outbox_id = outbox.enqueue(payload())
+    reply(monkeypatch, {"status": "error", "message": "slow down", "code": 429, "retry_after": "30"})
+
+    outbox._send(entry(outbox_id))
+
+    row = entry(outbox_id)
+    assert (row["status"], row["attempts"]) == ("pending", 1)
+    assert row["next_attempt_at"] >= time.time() + 29
+    assert outbox.get_stats()["paused_for_seconds"] > 29
+
+def test_bad_request_gives_up(outbox, scratch_settings, monkeypatch):
+    scratch_settings.set_setting("notion_token", "secret")
+    outbox_id = outbox.enqueue(payload())
+    reply(monkeypatch, {"status": "error", "message": "validation_error", "code": 400})
+
+    outbox._send(entry(outbox_id))
+
+    assert entry(outbox_id)["status"] == "failed"
+    assert outbox.get_stats()["recent_failures"][0]["last_error"] == "validation_error"
+    assert outbox.retry_failed() == 1
+    assert entry(outbox_id)["status"] == "pending"
+
+def test_gives_up_after_max_attempts(outbox, scratch_settings, monkeypatch):
+    scratch_settings.set_setting("notion_token", "secret")
+    scratch_settings.set_setting("notion_outbox_max_attempts", 2)
+    outbox_id = outbox.enqueue(payload())
+    reply(monkeypatch, ConnectionError("down"), ConnectionError("still down"))
+
+    outbox._send(entry(outbox_id))
+    assert entry(outbox_id)["status"] == "pending"
+    outbox._send(entry(outbox_id))
+    assert entry(outbox_id)["status"] == "failed"
+
+def test_drainer_survives_unexpected_errors(outbox, scratch_settings, monkeypatch, written_history):
+    scratch_settings.set_setting("notion_token", "secret")
+    calls = []
+
+    def send(row):
+        calls.append(row["id"])
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        REAL_SEND(row)
+
+    monkeypatch.setattr(notion_outbox, "_send", send)
+    monkeypatch.setattr(notion_outbox, "BASE_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(notion_outbox, "_thread", None)
+    reply(monkeypatch, {"status": "success", "url": "https://notion.so/page"})
+    outbox_id = outbox.enqueue(payload())
+
+    REAL_START()
+    try:
+        deadline = time.time() + 5
+        while entry(outbox_id)["status"] != "done" and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        notion_outbox.stop()
+        notion_outbox._thread.join(5)
+
+    row = entry(outbox_id)
+    assert row["status"] == "done"
+    assert row["attempts"] == 2
+    assert calls == [outbox_id, outbox_id]
+
+def test_queued_page_is_a_duplicate(outbox, scratch_settings, monkeypatch):
+    scratch_settings.set_setting("notion_token", "secret")
+    scratch_settings.set_setting("notion_db_id", DB_ID)
+    monkeypatch.setattr(notion_mirror, "ensure_fresh", lambda token, db_id: True)
+    monkeypatch.setattr(notion_mirror, "find_by_date", lambda db_id, iso_date: [])
+    receipt = {"date": "241109", "store": "Kroger", "amount": 12.5, "payment": "Cash", "filename": "241109-Kroger-Cash"}
+
+    assert notion_integration.add_to_notion_expenses(receipt)["status"] == "queued"
+    assert notion_integration.add_to_notion_expenses(receipt)["status"] == "duplicate_suspected"
+
+def test_force_add_needs_settings(outbox):
+    result = notion_integration.force_add_expense("a", "241109", "Kroger", "Cash", 1.0)
+    assert result == {"status": "error", "message": "Notion Token or Database ID missing in settings."}
@@ -0,0 +1,41 @@
+import pytest
+from pypdf import PdfReader, PdfWriter
+import pdf_split
+
+@pytest.fixture
+def pdf(tmp_path):
+    def make(pages, name="statement.pdf"):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=200, height=400)
+        path = tmp_path / name
+        with open(path, "wb") as f:
+            writer.write(f)
+        return str(path)
+    return make
+
+def test_should_split(pdf, scratch_settings):
+    assert pdf_split.should_split(pdf(3))
+    assert not pdf_split.should_split(pdf(2, "two.pdf"))
+    scratch_settings.set_setting("pdf_split_enabled", False)
+    assert not pdf_split.should_split(pdf(3))
+
+def test_page_groups(scratch_settings):
+    assert pdf_split.page_groups(3) == [[0], [1], [2]]
+    scratch_settings.set_setting("pdf_pages_per_receipt", 2)
+    assert pdf_split.page_groups(5) == [[0, 1], [2, 3], [4]]
+
+def test_write_pages(pdf, tmp_path):
+    reader = PdfReader(pdf(4))
+    out = pdf_split.write_pages(reader, [1, 2], str(tmp_path / "p2-3.pdf"))
+    assert pdf_split.count_pages(out) == 2
+    assert pdf_split.page_label([1, 2]) == "p2-3"
+    assert pdf_split.page_label([0]) == "p1"
+
+def test_receipts_running_over_a_page_break_are_joined():
+    kroger = {"date": "241109", "store": "Kroger", "amount": 12.5}
+    failed = {"date": "241109", "store": "Error", "amount": 0.0}
+    merged = pdf_split.merge_continued_receipts(
+        [[0], [1], [2], [3], [4]],
+        [kroger, dict(kroger, store="KROGER"), {"date": "241110", "store": "Shell", "amount": 40.0}, failed, dict(failed)])
+    assert [pages for pages, _ in merged] == [[0, 1], [2], [3], [4]]
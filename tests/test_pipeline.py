@@ -0,0 +1,110 @@
+import os
+import pytest
+import history
+import manifest
+import pipeline
+
+def extraction(store, amount=9.99):
+    return {"date": "241109", "store": store, "payment": "Cash", "amount": amount}
+
+@pytest.fixture
+def folder(tmp_path, fresh_db, scratch_settings, monkeypatch):
+    fresh_db(manifest, "MANIFEST_DB")
+    fresh_db(history, "HISTORY_DB")
+    monkeypatch.setattr(history, "LEGACY_HISTORY_FILE", str(tmp_path / "history.json"))
+    scratch_settings.set_setting("previews_enabled", False)
+    path = tmp_path / "receipts"
+    path.mkdir()
+    return path
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stands in for extraction: answers per file name, and remembers what it was asked."""
+    class Model:
+        answers = {}
+        asked = []
+
+    def process_documents(file_paths, content_hashes=None):
+        Model.asked += [path.rsplit("/", 1)[-1].rsplit("\\", 1)[-1] for path in file_paths]
+        return [dict(Model.answers[Model.asked[-len(file_paths) + i]]) for i in range(len(file_paths))]
+
+    Model.asked = []
+    monkeypatch.setattr(pipeline, "process_documents", process_documents)
+    return Model
+
+def run(folder, **kwargs):
+    summary = {}
+    results = list(pipeline.gobble_folder(str(folder), summary=summary, **kwargs))
+    return sorted(results, key=lambda result: result["original"]), summary
+
+def test_every_file_comes_back_with_a_summary(folder, model):
+    (folder / "a.jpg").write_bytes(b"receipt a")
+    (folder / "b.png").write_bytes(b"receipt b")
+    (folder / "notes.txt").write_text("not a receipt")
+    model.answers = {"a.jpg": extraction("Kroger"), "b.png": extraction("Shell", 40.0)}
+
+    results, summary = run(folder, concurrency=2)
+    assert [(result["original"], result["new"]) for result in results] == \
+        [("a.jpg", "241109-Kroger-Cash.jpg"), ("b.png", "241109-Shell-Cash.png")]
+    assert summary["gobbled"] == 2 and summary["errors"] == 0
+    assert sorted(entry["filename"] for entry in history.query_history()["items"]) == \
+        ["241109-Kroger-Cash.jpg", "241109-Shell-Cash.png"]
+
+def test_only_new_files_are_gobbled(folder, model):
+    (folder / "a.jpg").write_bytes(b"receipt a")
+    (folder / "b.png").write_bytes(b"receipt b")
+    (folder / "notes.txt").write_text("not a receipt")
+    model.answers = {"a.jpg": extraction("Kroger"), "b.png": extraction("Shell", 40.0)}
+
+    results, summary = run(folder)
+    assert [(result["original"], result["new"]) for result in results] == \
+        [("a.jpg", "241109-Kroger-Cash.jpg"), ("b.png", "241109-Shell-Cash.png")]
+    assert summary == {"seen": 2, "unchanged": 0, "skipped": 0, "gobbled": 2, "errors": 0}
+    assert len(history.query_history()["items"]) == 2
+
+    (folder / "c.jpg").write_bytes(b"receipt c")
+    (folder / "copy.jpg").write_bytes(b"receipt a")
+    model.answers["c.jpg"] = extraction("Target", 5.0)
+    results, summary = run(folder)
+    assert [(result["original"], result["status"]) for result in results] == [("c.jpg", "gobbled"), ("copy.jpg", "skipped")]
+    assert summary["unchanged"] == 2
+    assert sorted(model.asked) == ["a.jpg", "b.png", "c.jpg"]
+
+def test_force_redoes_everything(folder, model):
+    (folder / "a.jpg").write_bytes(b"receipt a")
+    model.answers = {"a.jpg": extraction("Kroger"), "241109-Kroger-Cash.jpg": extraction("Kroger")}
+    run(folder)
+    results, summary = run(folder, force=True)
+    assert summary["gobbled"] == 1
+    assert model.asked == ["a.jpg", "241109-Kroger-Cash.jpg"]
+
+def test_extraction_failed():
+    assert pipeline.extraction_failed({"store": "Error"})
+    assert pipeline.extraction_failed({"store": "FileError"})
+    assert not pipeline.extraction_failed({"store": "Kroger"})
+    assert not pipeline.extraction_failed(None)
+
+def test_failed_extraction_is_retried(folder, model):
+    (folder / "a.jpg").write_bytes(b"receipt a")
+    model.answers = {"a.jpg": extraction("Error", 0.0)}
+    results, summary = run(folder)
+    assert results[0]["status"] == "error" and summary["errors"] == 1
+    # Not renamed, not in history: only the retry that works leaves a trace
+    assert os.listdir(folder) == ["a.jpg"]
+    assert manifest.get_entry(str(folder / "a.jpg"))["status"] == "failed"
+    assert history.query_history()["items"] == []
+
+    model.answers["a.jpg"] = extraction("Kroger")
+    results, summary = run(folder)
+    assert results[0]["new"] == "241109-Kroger-Cash.jpg"
+    assert summary["gobbled"] == 1
+    assert [entry["filename"] for entry in history.query_history()["items"]] == ["241109-Kroger-Cash.jpg"]
+
+def test_batches(folder, model):
+    model.answers = {}
+    for i in range(5):
+        (folder / f"{i}.jpg").write_bytes(f"receipt {i}".encode())
+        model.answers[f"{i}.jpg"] = extraction(f"Store{i}", float(i))
+    results, summary = run(folder, batch_size=2, concurrency=2)
+    assert summary["gobbled"] == 5
+    assert sorted(result["new"] for result in results) == [f"241109-Store{i}-Cash.jpg" for i in range(5)]
@@ -0,0 +1,29 @@
+import io
+from PIL import Image, ImageDraw
+import preprocess
+
+def photo_of_a_receipt():
+    """A white receipt on a dark table, as a big colour JPEG."""
+    image = Image.new("RGB", (3000, 4000), (40, 30, 20))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((900, 600, 2100, 3400), fill="white")
+    for y in range(700, 3300, 60):
+        draw.line((1000, y, 2000, y), fill="black", width=8)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=95)
+    return out.getvalue()
+
+def test_cropped_grayscale_and_downscaled():
+    parts = preprocess.prepare_parts(photo_of_a_receipt(), "image/jpeg")
+    assert parts[0]["mime_type"] == "image/jpeg"
+    with Image.open(io.BytesIO(parts[0]["data"])) as image:
+        assert image.mode == "L"
+        assert max(image.size) <= preprocess.DEFAULT_MAX_DIMENSION
+        # Cropped to the receipt, so it's much taller than wide
+        assert image.size[1] > 2 * image.size[0]
+
+def test_original_sent_when_off_or_unreadable(scratch_settings):
+    assert preprocess.prepare_parts(b"not an image", "image/jpeg") == [{"mime_type": "image/jpeg", "data": b"not an image"}]
+    data = photo_of_a_receipt()
+    scratch_settings.set_setting("preprocess_enabled", False)
+    assert preprocess.prepare_parts(data, "image/jpeg")[0]["data"] == data
@@ -0,0 +1,43 @@
+import os
+import threading
+import pytest
+from PIL import Image
+import previews
+
+@pytest.fixture
+def receipt(tmp_path, monkeypatch):
+    monkeypatch.setattr(previews, "PREVIEWS_DIR", str(tmp_path / "previews"))
+    path = tmp_path / "receipt.jpg"
+    Image.new("RGB", (2000, 3000), "white").save(path, format="JPEG")
+    return str(path)
+
+def test_thumb_and_display(receipt):
+    urls = previews.generate(receipt)
+    thumb_name = urls["thumb"].rsplit("/", 1)[1]
+    assert urls["display"].endswith("_display.jpg")
+    with Image.open(previews.preview_path(thumb_name)) as thumb:
+        assert max(thumb.size) == 320
+    with Image.open(previews.preview_path(urls["display"].rsplit("/", 1)[1])) as display:
+        assert max(display.size) == 1280
+
+def test_concurrent_copies_of_one_receipt(receipt):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(previews.generate(receipt))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and all(results)
+    shard = os.path.dirname(previews.preview_path(results[0]["thumb"].rsplit("/", 1)[1]))
+    assert not [name for name in os.listdir(shard) if name.endswith(".tmp")]
+
+def test_off_or_unreadable(receipt, tmp_path, scratch_settings):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    assert previews.generate(str(broken)) is None
+    scratch_settings.set_setting("previews_enabled", False)
+    assert previews.generate(receipt) is None
+
+@pytest.mark.parametrize("name", ["../settings.json", "abc_thumb.jpg", "a" * 64 + "_huge.jpg"])
+def test_only_preview_names_resolve(name):
+    assert previews.preview_path(name) is None
@@ -0,0 +1,93 @@
+import pytest
+import extraction_cache
+import processor
+import pipeline
+from model_registry import ModelRegistry
+
+MODELS = ["models/first", "models/second"]
+
+class Answer:
+    def __init__(self, text=None, error=None):
+        self._text = text
+        self._error = error
+
+    @property
+    def text(self):
+        # The SDK raises here when the answer was blocked or empty
+        if self._error:
+            raise self._error
+        return self._text
+
+@pytest.fixture
+def gemini(fresh_db, monkeypatch):
+    """Fake models: queue answers per model in .answers, read the prompts from .calls."""
+    fresh_db(extraction_cache, "CACHE_FILE")
+
+    class Gemini:
+        answers = {name: [] for name in MODELS}
+        calls = []
+
+    def generate(model_name, contents, schema):
+        Gemini.calls.append((model_name, contents[-1], schema))
+        answer = Gemini.answers[model_name].pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    Gemini.calls = []
+    monkeypatch.setattr(processor, "registry", ModelRegistry(MODELS, lambda: MODELS))
+    monkeypatch.setattr(processor, "generate", generate)
+    return Gemini
+
+GOOD = '{"date": "241109", "store": "Kroger", "payment": "Visa 1234", "amount": "$12.50"}'
+
+def test_answer_is_coerced_and_cached(gemini):
+    gemini.answers["models/first"] = [Answer(GOOD)]
+    data = processor.extract_with_gemini("a.jpg", [], "hash")
+    assert {key: data[key] for key in ("date", "store", "payment", "amount")} == \
+        {"date": "241109", "store": "Kroger", "payment": "Card-1234", "amount": 12.5}
+    assert extraction_cache.get_cached("hash", processor.PROMPT_VERSION)["amount"] == 12.5
+
+def test_blocked_answer_moves_on_to_the_next_model(gemini):
+    gemini.answers["models/first"] = [Answer(error=ValueError("response was blocked"))]
+    gemini.answers["models/second"] = [Answer(GOOD)]
+    data = processor.extract_with_gemini("a.jpg", [], "hash")
+    assert data["store"] == "Kroger"
+    assert "models/second" in data["raw_text_debug"]
+    health = processor.registry.snapshot()
+    assert health["models"]["models/first"]["failures"] == 1
+    assert health["preferred"] == "models/second"
+
+def test_only_bad_fields_are_asked_again(gemini):
+    gemini.answers["models/first"] = [
+        Answer('{"date": "241109", "store": "Kroger", "payment": "Cash", "amount": "twelve"}'),
+        Answer('{"amount": 12.0}')
+    ]
+    data = processor.extract_with_gemini("a.jpg", [], "hash")
+    assert data["amount"] == 12.0
+    retry_schema = gemini.calls[1][2]
+    assert retry_schema["required"] == ["amount"]
+    assert extraction_cache.get_cached("hash", processor.PROMPT_VERSION) is not None
+
+def test_incomplete_answer_is_not_cached(gemini):
+    gemini.answers["models/first"] = [
+        Answer('{"date": "241109", "store": "Kroger", "payment": "Cash"}'),
+        Answer('{"amount": "no idea"}')
+    ]
+    data = processor.extract_with_gemini("a.jpg", [], "hash")
+    assert data["amount"] == 0.0
+    assert extraction_cache.get_cached("hash", processor.PROMPT_VERSION) is None
+
+def test_every_model_failing(gemini):
+    gemini.answers = {name: [RuntimeError("500")] for name in MODELS}
+    data = processor.extract_with_gemini("a.jpg", [], "hash")
+    assert data["store"] == "Error"
+    assert pipeline.extraction_failed(data)
+
+def test_batch_answers_mapped_by_index():
+    answer = [{"index": 1, "store": "B"}, {"index": 0, "store": "A"}, {"index": 9, "store": "?"}]
+    assert processor._map_batch_answer(answer, 2) == [{"index": 0, "store": "A"}, {"index": 1, "store": "B"}]
+
+def test_batch_answers_without_indexes():
+    assert processor._map_batch_answer({"receipts": [{"store": "A"}, {"store": "B"}]}, 2) == [{"store": "A"}, {"store": "B"}]
+    assert processor._map_batch_answer([{"store": "A"}], 2) == [None, None]
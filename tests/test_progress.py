@@ -0,0 +1,40 @@
+import asyncio
+import progress
+
+def collect(run_id, last_event_id=None):
+    async def read():
+        return [chunk async for chunk in progress.stream(run_id, last_event_id)]
+    return asyncio.run(read())
+
+def test_late_subscriber_catches_up():
+    progress.publish("run-1", "started", file="a.jpg")
+    progress.finish("run-1", {"gobbled": 1})
+    chunks = collect("run-1")
+    assert [chunk.split("\n")[1] for chunk in chunks] == ["event: started", "event: summary", "event: done"]
+    assert chunks[0] == 'id: 1\nevent: started\ndata: {"file": "a.jpg"}\n\n'
+
+def test_reconnect_skips_seen_events():
+    for name in ("a.jpg", "b.jpg"):
+        progress.publish("run-2", "result", file=name)
+    progress.finish("run-2")
+    assert [chunk.split("\n")[0] for chunk in collect("run-2", last_event_id=1)] == ["id: 2", "id: 3"]
+
+def test_live_events_from_pool_threads():
+    async def run():
+        chunks = []
+        async def subscribe():
+            async for chunk in progress.stream("run-3"):
+                chunks.append(chunk)
+        task = asyncio.create_task(subscribe())
+        await asyncio.sleep(0.05)
+        emit = progress.bind("run-3", lambda: (progress.emit("extracted", "a.jpg", store="Kroger"), progress.finish("run-3")))
+        await asyncio.get_running_loop().run_in_executor(None, emit)
+        await asyncio.wait_for(task, 5)
+        return chunks
+
+    chunks = asyncio.run(run())
+    assert chunks[0] == 'id: 1\nevent: extracted\ndata: {"file": "a.jpg", "store": "Kroger"}\n\n'
+    assert progress.current_run() is None
+
+def test_emit_without_a_run_does_nothing():
+    progress.emit("extracted", "a.jpg")
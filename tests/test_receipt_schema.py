@@ -0,0 +1,69 @@
+import pytest
+import receipt_schema
+
+@pytest.mark.parametrize("raw, expected", [
+    ("$1,234.56", 1234.56),
+    ("1,234", 1234.0),
+    ("12,34", 12.34),
+    ("0,5", 0.5),
+    ("(3.50)", -3.5),
+    ("(3,50)", -3.5),
+    ("23.45 USD", 23.45),
+    (7, 7.0),
+])
+def test_coerce_amount(raw, expected):
+    assert receipt_schema.coerce_amount(raw) == expected
+
+@pytest.mark.parametrize("raw", [None, True, "", "abc", "nan", float("inf")])
+def test_coerce_amount_rejects(raw):
+    with pytest.raises(ValueError):
+        receipt_schema.coerce_amount(raw)
+
+@pytest.mark.parametrize("raw", ["241109", "2024-11-09", "11/09/2024", "Nov 9, 2024", 241109.0, "2024-11-09T10:00:00"])
+def test_coerce_date(raw):
+    assert receipt_schema.coerce_date(raw) == "241109"
+
+@pytest.mark.parametrize("raw", ["not a date", "1999-01-01", "2099-01-01"])
+def test_coerce_date_rejects(raw):
+    with pytest.raises(ValueError):
+        receipt_schema.coerce_date(raw)
+
+@pytest.mark.parametrize("raw, expected", [
+    ("VISA ending 1234", "Card-1234"),
+    ("AMEX x1002", "Amex-1002"),
+    ("****5678", "Card-5678"),
+    ("credit card", "Card"),
+    ("Check #101", "Check-101"),
+    ("CASH", "Cash"),
+    ("Pay Pal", "PayPal"),
+    (None, "Unknown"),
+    ("n/a", "Unknown"),
+])
+def test_coerce_payment(raw, expected):
+    assert receipt_schema.coerce_payment(raw) == expected
+
+def test_validate_reports_bad_fields_only():
+    values, problems = receipt_schema.validate({"date": "2024-11-09", "store": "  Kroger ", "payment": "cash"})
+    assert values == {"date": "241109", "store": "Kroger", "payment": "Cash"}
+    assert set(problems) == {"amount"}
+
+def test_validate_non_dict():
+    values, problems = receipt_schema.validate(["nope"])
+    assert values == {"payment": "Unknown"}
+    assert set(problems) == {"date", "store", "amount"}
+
+def test_parse_json_copes_with_fences_and_trailing_commas():
+    raw = 'Sure! ```json\n{"store": "Shell", "amount": 40.0,}\n``` hope that helps'
+    assert receipt_schema.parse_json(raw) == {"store": "Shell", "amount": 40.0}
+
+def test_parse_json_array():
+    assert receipt_schema.parse_json('here: [{"index": 1}, {"index": 2},]') == [{"index": 1}, {"index": 2}]
+
+def test_parse_json_without_json():
+    with pytest.raises(ValueError):
+        receipt_schema.parse_json("I can't read this receipt")
+
+def test_batch_schema_asks_for_index():
+    item = receipt_schema.BATCH_RECEIPT_SCHEMA["items"]
+    assert item["required"][0] == "index"
+    assert set(item["required"]) == {"index"} | set(receipt_schema.FIELDS)
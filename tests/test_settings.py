@@ -0,0 +1,26 @@
+import json
+import os
+
+def test_defaults_without_a_file(scratch_settings):
+    assert scratch_settings.load_settings() == {"notion_enabled": False}
+    assert scratch_settings.get_setting("missing", 3) == 3
+
+def test_set_setting_round_trip(scratch_settings):
+    scratch_settings.set_setting("blocking_workers", 4)
+    with open(scratch_settings.SETTINGS_FILE) as f:
+        assert json.load(f)["blocking_workers"] == 4
+    assert scratch_settings.get_setting("blocking_workers") == 4
+    assert not os.path.exists(scratch_settings.SETTINGS_FILE + ".tmp")
+
+def test_hand_edits_are_picked_up(scratch_settings):
+    scratch_settings.set_setting("folder_concurrency", 4)
+    with open(scratch_settings.SETTINGS_FILE, "w") as f:
+        json.dump({"folder_concurrency": 8}, f)
+    # Make sure the mtime moves even on coarse filesystem clocks
+    stat = os.stat(scratch_settings.SETTINGS_FILE)
+    os.utime(scratch_settings.SETTINGS_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert scratch_settings.get_setting("folder_concurrency") == 8
+
+def test_load_settings_returns_a_copy(scratch_settings):
+    scratch_settings.load_settings()["notion_enabled"] = True
+    assert scratch_settings.get_setting("notion_enabled") is False
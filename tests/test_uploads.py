@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import os
+import pytest
+import uploads
+
+MB = 1024 * 1024
+BOUNDARY = "gobbla-test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+def body(*parts):
+    """A multipart body; parts are (field, filename or None, bytes)."""
+    data = b""
+    for field, filename, content in parts:
+        disposition = f'form-data; name="{field}"' + (f'; filename="{filename}"' if filename is not None else "")
+        data += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return data + f"--{BOUNDARY}--\r\n".encode()
+
+class Stream:
+    """The request body in 64 KB chunks, counting how many were read."""
+    def __init__(self, data, chunk_size=64 * 1024):
+        self.chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        self.read = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+@pytest.fixture
+def incoming(tmp_path):
+    path = tmp_path / "incoming"
+    path.mkdir()
+    return path
+
+def receive(incoming, stream, content_type=CONTENT_TYPE):
+    return asyncio.run(uploads.receive_uploads(content_type, stream, lambda filename: str(incoming / filename)))
+
+def test_saves_and_hashes(incoming):
+    a, b = os.urandom(int(2.5 * MB)), os.urandom(1000)
+    saved = receive(incoming, Stream(body(("files", "a.jpg", a), ("note", None, b"hi"), ("files", "b.png", b))))
+    assert [(upload["filename"], upload["size"], upload["sha256"]) for upload in saved] == \
+        [("a.jpg", len(a), hashlib.sha256(a).hexdigest()), ("b.png", len(b), hashlib.sha256(b).hexdigest())]
+    assert (incoming / "a.jpg").read_bytes() == a
+    assert (incoming / "b.png").read_bytes() == b
+
+def test_file_cap_stops_reading(incoming, scratch_settings):
+    scratch_settings.set_setting("max_upload_mb", 1.5)
+    stream = Stream(body(("files", "a.jpg", b"x" * MB), ("files", "big.jpg", b"x" * (10 * MB))))
+    with pytest.raises(uploads.UploadTooLarge, match=r"big.jpg is larger than 1.5 MB"):
+        receive(incoming, stream)
+    # Gave up a little past 2.5 MB, and the file that did fit is gone too
+    assert stream.read < len(stream.chunks) // 2
+    assert os.listdir(incoming) == []
+
+def test_request_cap(incoming, scratch_settings):
+    scratch_settings.set_setting("max_request_mb", 3)
+    stream = Stream(body(("files", "a.jpg", b"x" * (2 * MB)), ("files", "b.jpg", b"x" * (2 * MB))))
+    with pytest.raises(uploads.UploadTooLarge, match=r"larger than the 3 MB limit for one request"):
+        receive(incoming, stream)
+    assert stream.read < len(stream.chunks)
+    assert os.listdir(incoming) == []
+
+def test_not_multipart(incoming):
+    with pytest.raises(uploads.BadUpload):
+        receive(incoming, Stream(b"{}"), "application/json")
+
+def test_cut_short(incoming):
+    data = body(("files", "a.jpg", b"x" * MB))
+    with pytest.raises(uploads.BadUpload, match="a.jpg"):
+        receive(incoming, Stream(data[:MB // 2]))
+    assert os.listdir(incoming) == []
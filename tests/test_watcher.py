@@ -0,0 +1,81 @@
+import os
+import time
+import pytest
+import history
+import manifest
+import pipeline
+import watcher
+
+@pytest.fixture
+def folder(tmp_path, fresh_db, scratch_settings, monkeypatch):
+    fresh_db(manifest, "MANIFEST_DB")
+    fresh_db(history, "HISTORY_DB")
+    monkeypatch.setattr(history, "LEGACY_HISTORY_FILE", str(tmp_path / "history.json"))
+    scratch_settings.set_setting("previews_enabled", False)
+    path = tmp_path / "inbox"
+    path.mkdir()
+    return path
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """What extraction returns for every file; the list of files it was asked about."""
+    asked = []
+    answer = {"date": "241109", "store": "Kroger", "payment": "Cash", "amount": 9.99}
+
+    def process_document(file_path, content_hash=None):
+        asked.append(os.path.basename(file_path))
+        return dict(answer)
+
+    monkeypatch.setattr(pipeline, "process_document", process_document)
+    return answer, asked
+
+def settle(files_watcher, timeout=5):
+    """Two checks (size seen, then unchanged) and wait for the gobbles they started."""
+    files_watcher._dispatch_settled()
+    files_watcher._dispatch_settled()
+    deadline = time.time() + timeout
+    while files_watcher.status()["in_flight"] and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_is_candidate():
+    assert watcher.is_candidate("/in/IMG_1.JPG")
+    assert watcher.is_candidate("/in/scan.pdf")
+    assert not watcher.is_candidate("/in/.IMG_1.jpg")
+    assert not watcher.is_candidate("/in/notes.txt")
+
+def test_gobbles_new_files_once(folder, extracted):
+    _, asked = extracted
+    files_watcher = watcher.FolderWatcher([str(folder)], settle_seconds=0)
+    (folder / "IMG_1.jpg").write_bytes(b"receipt")
+    files_watcher._scan()
+    settle(files_watcher)
+
+    assert os.listdir(folder) == ["241109-Kroger-Cash.jpg"]
+    assert files_watcher.status()["gobbled"] == 1
+
+    # Its own renamed file turns up as a new file event: nothing to do
+    files_watcher.notice(str(folder / "241109-Kroger-Cash.jpg"), str(folder))
+    settle(files_watcher)
+    assert asked == ["IMG_1.jpg"]
+    assert files_watcher.status()["pending"] == 0
+
+def test_empty_files_wait(folder, extracted):
+    files_watcher = watcher.FolderWatcher([str(folder)], settle_seconds=0)
+    (folder / "IMG_2.jpg").write_bytes(b"")
+    files_watcher._scan()
+    settle(files_watcher)
+    assert files_watcher.status()["pending"] == 1
+
+def test_failed_extraction_does_not_loop(folder, extracted):
+    answer, asked = extracted
+    answer["store"] = "Error"
+    files_watcher = watcher.FolderWatcher([str(folder)], settle_seconds=0)
+    (folder / "IMG_3.jpg").write_bytes(b"receipt")
+    files_watcher._scan()
+    settle(files_watcher)
+
+    files_watcher._scan()
+    settle(files_watcher)
+    assert asked == ["IMG_3.jpg"]
+    assert os.listdir(folder) == ["IMG_3.jpg"]
+    assert manifest.get_entry(str(folder / "IMG_3.jpg"))["status"] == "failed"